@@ -1,5 +1,6 @@
 from __future__ import absolute_import, unicode_literals
 import os
+from datetime import timedelta
 from celery import Celery
 
 # Set the default Django settings module for the 'celery' program.
@@ -10,5 +11,33 @@ app = Celery('Django')
 # Using a string here means the worker doesn't have to serialize the configuration object to child processes.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
-# Load task modules from all registered Django app configs.
-app.autodiscover_tasks()
+# Load task modules from all registered Django app configs; myaccounts keeps its tasks in task.py.
+app.autodiscover_tasks(related_name='task')
+
+# Periodic jobs run by `celery -A Django beat`.
+app.conf.beat_schedule = {
+    'expire-pending-bookings': {
+        'task': 'myaccounts.task.expire_pending_bookings',
+        'schedule': timedelta(minutes=15),
+    },
+    'escalate-unanswered-notifications': {
+        'task': 'myaccounts.task.escalate_unanswered_notifications',
+        'schedule': timedelta(hours=1),
+    },
+    'send-outbox-emails': {
+        'task': 'myaccounts.task.send_outbox_emails',
+        'schedule': timedelta(minutes=1),
+    },
+    'purge-expired-tokens': {
+        'task': 'myaccounts.task.purge_expired_tokens',
+        'schedule': timedelta(hours=6),
+    },
+    'purge-abandoned-portfolio-uploads': {
+        'task': 'myaccounts.task.purge_abandoned_portfolio_uploads',
+        'schedule': timedelta(hours=1),
+    },
+    'sweep-unreferenced-blobs': {
+        'task': 'myaccounts.task.sweep_unreferenced_blobs',
+        'schedule': timedelta(hours=1),
+    },
+}
@@ -0,0 +1,140 @@
+"""Compare the throughput of the sync and async read endpoints under uvicorn.
+
+Starts uvicorn on Django.asgi with one worker, unless --url points at a
+running server, then fires the same requests at each sync endpoint and its
+async/ counterpart from many concurrent keep-alive connections and prints
+requests per second and latency percentiles.
+
+    python benchmarks/async_vs_sync.py --token <access token> --photographer 2 --profile 2
+
+The token is a JWT access token for any active user. Run it against a
+database with realistic data; with an empty table the numbers mostly
+measure the HTTP stack.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def endpoints(args):
+    pairs = [
+        ('notifications', 'notifications/', 'async/notifications/'),
+        ('job posts', 'job-posts/', 'async/job-posts/'),
+    ]
+    if args.photographer:
+        pairs.append((
+            'photographer detail',
+            f'users/photographer/{args.photographer}/',
+            f'async/users/photographer/{args.photographer}/',
+        ))
+    if args.profile:
+        pairs.append(('profile detail', f'profiles/{args.profile}/', f'async/profiles/{args.profile}/'))
+    return pairs
+
+
+def start_server(port):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'Django.asgi:application', '--port', str(port),
+         '--workers', '1', '--log-level', 'warning'],
+        cwd=API_DIR,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit('uvicorn did not start')
+
+
+def run(url, path, token, concurrency, duration):
+    """Hit `path` from `concurrency` threads for `duration` seconds; return (latencies, errors)."""
+    target = urlsplit(url)
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        local, failed = [], 0
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', f'{target.path.rstrip("/")}/{path}', headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - started)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors)
+
+
+def report(name, latencies, errors, duration):
+    if not latencies:
+        print(f'  {name:6} no successful requests ({errors} errors)')
+        return
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f'  {name:6} {len(latencies) / duration:8.1f} req/s   p50 {p50:7.1f} ms   p99 {p99:7.1f} ms   errors {errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--token', default=os.environ.get('BENCH_TOKEN'), required='BENCH_TOKEN' not in os.environ)
+    parser.add_argument('--url', help='Base URL of a running server; by default uvicorn is started here.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per endpoint.')
+    parser.add_argument('--photographer', type=int, help='A photographer user id for the detail endpoint.')
+    parser.add_argument('--profile', type=int, help='A profile id for the detail endpoint.')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = start_server(args.port)
+        url = f'http://127.0.0.1:{args.port}/'
+    try:
+        print(f'{args.concurrency} concurrent connections, {args.duration:g}s per endpoint')
+        for name, sync_path, async_path in endpoints(args):
+            print(name)
+            for label, path in (('sync', sync_path), ('async', async_path)):
+                latencies, errors = run(url, path, args.token, args.concurrency, args.duration)
+                report(label, latencies, errors, args.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Compare full and sparse (?fields=) responses of the list endpoints.
+
+Requests each endpoint of a running server with every field and with a
+handful of them, then prints the payload size and latency percentiles of
+both.
+
+    python benchmarks/sparse_fields.py --url http://127.0.0.1:8000/ --token <access token>
+
+The token is a JWT access token for any active user. Run it against a
+database with realistic data; with an empty table the payloads are empty.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import time
+from urllib.parse import urlencode, urlsplit
+
+ENDPOINTS = [
+    ('users', 'users/', 'id,username,user_type'),
+    ('photographers', 'photographers/', 'id,user'),
+    ('clients', 'clients/', 'id,user'),
+    ('job posts', 'job-posts/', 'id,title,event_date'),
+    ('notifications', 'notifications/', 'id,booking,is_read'),
+]
+
+
+def measure(url, path, query, token, requests):
+    """GET `path` `requests` times; return (latencies, response size)."""
+    target = urlsplit(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+    headers = {'Authorization': f'Bearer {token}'}
+    latencies = []
+    size = 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        connection.request('GET', f'{target.path.rstrip("/")}/{path}?{urlencode(query)}', headers=headers)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise SystemExit(f'{path} returned {response.status}: {body[:200]!r}')
+        latencies.append(time.perf_counter() - started)
+        size = len(body)
+    connection.close()
+    return latencies, size
+
+
+def report(name, latencies, size):
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f'  {name:6} {size:9,d} bytes   p50 {p50:7.1f} ms   p95 {p95:7.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000/')
+    parser.add_argument('--token', default=os.environ.get('BENCH_TOKEN'), required='BENCH_TOKEN' not in os.environ)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per variant.')
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    for name, path, fields in ENDPOINTS:
+        print(f'{name} (fields={fields})')
+        for label, query in (('full', {}), ('sparse', {'fields': fields})):
+            query['page_size'] = args.page_size
+            latencies, size = measure(args.url, path, query, args.token, args.requests)
+            report(label, latencies, size)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Staff, Photographer, Client, Bookings, BookingHistory, JobPost, JobApplication, WorkHistory, Profile, ProfileSwitch
+from .models import User, Staff, Photographer, Client, Bookings, BookingHistory, JobPost, JobApplication, WorkHistory, Profile, ProfileSwitch, OutboundEmail
 
 
 @admin.register(User)
@@ -99,4 +99,12 @@ class WorkHistoriesAdmin(admin.ModelAdmin):
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == 'photographer':
             kwargs['queryset'] = User.objects.filter(user_type=2) 
-        return super().formfield_for_foreignkey(db_field, request, **kwargs)
\ No newline at end of file
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to_email', 'subject')
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class MyAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myaccounts'
+
+    def ready(self):
+        # Connect the signal handlers for every entry point, not only the views.
+        from . import signals
@@ -0,0 +1,126 @@
+"""Async versions of the read-heavy endpoints.
+
+DRF 3.14 views are sync only, so these are plain Django async views served
+natively on the event loop under ASGI. They authenticate the same JWT
+access tokens, scope by the same role claims, return the same payloads as
+their views.py counterparts and share their cache entries. List endpoints
+page with pagination.apaginated_response.
+"""
+import functools
+
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from . import authentication, caching, events, querysets
+from .models import User, Profile, JobPost, Notification
+from .pagination import apaginated_response
+from .serializers import UserSerializer, ProfileSerializer, JobPostSerializer, NotificationSerializer
+from .utils import arole_claims
+
+_jwt = JWTAuthentication()
+
+
+async def authenticate(request, raw_token=None):
+    """Return (user, validated token) for the request's access token, or None without an active user.
+
+    The token comes from the Authorization header unless `raw_token` is
+    given. Users are read through the same cache as CachedJWTAuthentication.
+    """
+    if raw_token is None:
+        header = _jwt.get_header(request)
+        raw_token = _jwt.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        token = _jwt.get_validated_token(raw_token)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, KeyError):
+        return None
+    user = await authentication.aget_user(user_id)
+    return (user, token) if user is not None and user.is_active else None
+
+
+def async_api_view(view):
+    """Allow only GET and authenticated users, like @api_view(['GET']) with IsAuthenticated."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        auth = await authenticate(request)
+        if auth is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user, request.auth = auth
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@async_api_view
+async def photographer_detail(request, id):
+    fields = UserSerializer.requested_fields(request)
+
+    async def build():
+        return UserSerializer(await querysets.users(fields).aget(pk=id, user_type=2), fields=fields).data
+
+    try:
+        data = await caching.aread_through(
+            [f'user:{id}'], caching.fields_key(f'photographer_detail:{id}', fields), build
+        )
+    except User.DoesNotExist:
+        return JsonResponse({}, status=404)
+    return JsonResponse(data)
+
+
+@async_api_view
+async def profile_detail(request, id):
+    fields = ProfileSerializer.requested_fields(request)
+
+    async def build():
+        return ProfileSerializer(await querysets.narrow(Profile.objects.all(), fields).aget(pk=id), fields=fields).data
+
+    try:
+        data = await caching.aread_through(
+            [f'profile:{id}'], caching.fields_key(f'profile_detail:{id}', fields), build
+        )
+    except Profile.DoesNotExist:
+        return JsonResponse({}, status=404)
+    return JsonResponse(data)
+
+
+@async_api_view
+async def notification_list(request):
+    _, photographer_id, _ = await arole_claims(request)
+    if photographer_id is None:
+        return JsonResponse({'message': 'Only photographers have notifications'}, status=403)
+    notifications = Notification.objects.filter(photographer_id=photographer_id)
+    return await apaginated_response(request, notifications, NotificationSerializer)
+
+
+@async_api_view
+async def job_post_list(request):
+    return await apaginated_response(request, JobPost.objects.all(), JobPostSerializer)
+
+
+async def event_stream(request):
+    """The photographer's events as server-sent events; see events.py.
+
+    EventSource cannot send headers, so the access token may also come as
+    the access_token query parameter.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    token = request.GET.get('access_token')
+    auth = await authenticate(request, token.encode() if token else None)
+    if auth is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    photographer = getattr(auth[0], 'photographer_profile', None)
+    if photographer is None:
+        return JsonResponse({'message': 'Only photographers have events'}, status=403)
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(events.stream(photographer.pk, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
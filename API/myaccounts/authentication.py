@@ -0,0 +1,136 @@
+"""JWT authentication that resolves the user from a cache.
+
+simplejwt's JWTAuthentication loads the User row on every request, and
+many views then load the user's Staff, Photographer or Client row as well.
+CachedJWTAuthentication loads the user with those rows joined once and
+keeps the result in two layers:
+
+- a process-local copy, valid for MYACCOUNTS_AUTH_LOCAL_TIMEOUT seconds
+  (default 5) and capped at MYACCOUNTS_AUTH_LOCAL_MAX_USERS entries
+  (default 10000), and
+- the shared Django cache (Redis in production), valid for
+  MYACCOUNTS_AUTH_CACHE_TIMEOUT seconds (default 300).
+
+Users are cached by primary key, the claim simplejwt puts in tokens by
+default. A warm request therefore makes no auth-related queries. The signal
+handlers in signals.py drop both layers when a user or one of its role rows
+is saved or deleted, which covers password changes. Other processes may
+keep their local copy for up to MYACCOUNTS_AUTH_LOCAL_TIMEOUT seconds; bulk
+updates that skip signals are bounded by the shared timeout.
+
+Enable it in settings:
+
+    REST_FRAMEWORK = {
+        'DEFAULT_AUTHENTICATION_CLASSES': ('myaccounts.authentication.CachedJWTAuthentication',),
+    }
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+CACHE_TIMEOUT = getattr(settings, 'MYACCOUNTS_AUTH_CACHE_TIMEOUT', 300)
+LOCAL_TIMEOUT = getattr(settings, 'MYACCOUNTS_AUTH_LOCAL_TIMEOUT', 5)
+LOCAL_MAX_USERS = getattr(settings, 'MYACCOUNTS_AUTH_LOCAL_MAX_USERS', 10000)
+
+# str(user id) -> (expiry, pickled user). Tokens may carry the id as a
+# string. Users are stored pickled so every request gets its own instance.
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _cache_key(user_id):
+    return f'myaccounts:auth-user:{user_id}'
+
+
+def _users():
+    return User.objects.select_related('staff', 'photographer_profile', 'client_profile')
+
+
+def _get_local(user_id):
+    with _local_lock:
+        entry = _local.get(str(user_id))
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _local[str(user_id)]
+            return None
+        return entry[1]
+
+
+def _set_local(user_id, data):
+    with _local_lock:
+        _local[str(user_id)] = (time.monotonic() + LOCAL_TIMEOUT, data)
+        _local.move_to_end(str(user_id))
+        while len(_local) > LOCAL_MAX_USERS:
+            _local.popitem(last=False)
+
+
+def get_user(user_id):
+    """Return the user with `user_id` and its role rows joined, or None."""
+    data = _get_local(user_id)
+    if data is None:
+        data = cache.get(_cache_key(user_id))
+        if data is None:
+            user = _users().filter(pk=user_id).first()
+            if user is None:
+                return None
+            data = pickle.dumps(user)
+            cache.set(_cache_key(user_id), data, CACHE_TIMEOUT)
+        _set_local(user_id, data)
+    return pickle.loads(data)
+
+
+async def aget_user(user_id):
+    """Async counterpart of get_user."""
+    data = _get_local(user_id)
+    if data is None:
+        data = await cache.aget(_cache_key(user_id))
+        if data is None:
+            user = await _users().filter(pk=user_id).afirst()
+            if user is None:
+                return None
+            data = pickle.dumps(user)
+            await cache.aset(_cache_key(user_id), data, CACHE_TIMEOUT)
+        _set_local(user_id, data)
+    return pickle.loads(data)
+
+
+def invalidate_user(user_id):
+    with _local_lock:
+        _local.pop(str(user_id), None)
+    cache.delete(_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that reads the user through get_user's cache."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = get_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
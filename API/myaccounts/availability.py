@@ -0,0 +1,128 @@
+"""Photographer availability calendars.
+
+Every photographer has one PhotographerCalendar row per year with a 46 byte
+bitmap of the days that hold an accepted booking. The booking signal
+handlers in signals.py keep the bitmaps current, one day at a time, and
+rebuild_availability_index recreates them all in one pass over the
+accepted bookings.
+
+"Who is free" queries walk photographers in id order and test their bits in
+Python. Each step loads one chunk of photographers and their calendars, and
+the walk stops as soon as a page is full.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+
+from .exports import iter_rows
+from .models import Bookings, Photographer, PhotographerCalendar
+from .pagination import encode_cursor
+
+CALENDAR_BYTES = 46  # 366 days, one bit each
+SCAN_CHUNK = 500
+
+
+def _day_bit(day):
+    offset = day.timetuple().tm_yday - 1
+    return offset >> 3, 1 << (offset & 7)
+
+
+def empty_calendar():
+    return bytearray(CALENDAR_BYTES)
+
+
+def mark(calendar, day, booked=True):
+    """Set or clear `day`'s bit in a bytearray calendar."""
+    index, bit = _day_bit(day)
+    if booked:
+        calendar[index] |= bit
+    else:
+        calendar[index] &= ~bit
+
+
+def is_booked(calendar, day):
+    index, bit = _day_bit(day)
+    return bool(calendar and calendar[index] & bit)
+
+
+def refresh_day(photographer_id, day):
+    """Recompute one photographer's bit for `day` from the accepted bookings."""
+    with transaction.atomic():
+        calendar, created = PhotographerCalendar.objects.select_for_update().get_or_create(
+            photographer_id=photographer_id,
+            year=day.year,
+            defaults={'booked_days': bytes(CALENDAR_BYTES)},
+        )
+        # Read under the calendar lock: a refresh that read the bookings before
+        # another one committed could otherwise write its stale bit last.
+        booked = Bookings.objects.filter(
+            photographer_profile_id=photographer_id,
+            event_date=day,
+            status='Accepted',
+        ).exists()
+        days = bytearray(calendar.booked_days)
+        mark(days, day, booked)
+        if bytes(days) != bytes(calendar.booked_days):
+            calendar.booked_days = bytes(days)
+            calendar.save(update_fields=['booked_days'])
+
+
+def _days(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def free_photographers(start, end, limit, after_id=0):
+    """Return (photographer ids free on every day from start to end, next cursor or None)."""
+    years = list(range(start.year, end.year + 1))
+    days = list(_days(start, end))
+    free = []
+
+    while len(free) < limit:
+        chunk = list(
+            Photographer.objects
+            .filter(id__gt=after_id, is_suspended=False)
+            .order_by('id')
+            .values_list('id', flat=True)[:SCAN_CHUNK]
+        )
+        if not chunk:
+            return free, None
+
+        calendars = {
+            (photographer_id, year): booked_days
+            for photographer_id, year, booked_days in PhotographerCalendar.objects
+            .filter(photographer_id__in=chunk, year__in=years)
+            .values_list('photographer_id', 'year', 'booked_days')
+        }
+        for photographer_id in chunk:
+            after_id = photographer_id
+            if not any(is_booked(calendars.get((photographer_id, day.year)), day) for day in days):
+                free.append(photographer_id)
+                if len(free) == limit:
+                    break
+
+    return free, encode_cursor(after_id)
+
+
+def rebuild(chunk_size=2000):
+    """Recreate every calendar from the accepted bookings in one keyset-chunked pass."""
+    calendars = {}
+    accepted = Bookings.objects.filter(status='Accepted')
+    for _, photographer_id, day in iter_rows(accepted, ['id', 'photographer_profile_id', 'event_date'], chunk_size):
+        calendar = calendars.get((photographer_id, day.year))
+        if calendar is None:
+            calendar = calendars[photographer_id, day.year] = empty_calendar()
+        mark(calendar, day)
+
+    with transaction.atomic():
+        PhotographerCalendar.objects.all().delete()
+        PhotographerCalendar.objects.bulk_create(
+            [
+                PhotographerCalendar(photographer_id=photographer_id, year=year, booked_days=bytes(calendar))
+                for (photographer_id, year), calendar in calendars.items()
+            ],
+            batch_size=1000,
+        )
+    return len(calendars)
@@ -0,0 +1,308 @@
+"""Bloom filter in front of simplejwt's token blacklist.
+
+Every token refresh checks its jti against BlacklistedToken. Almost no
+refresh token presented is blacklisted, so the filter answers that case
+without a query: a jti the filter has never seen is certainly not
+blacklisted, and only the rare "maybe" is confirmed in the database.
+
+The filter never forgets a blacklisted jti, which makes two backends
+possible:
+
+- With django-redis, the bits live in a Redis bitmap shared by every
+  process. New blacklist entries set their bits once committed. The bitmap
+  only ever comes into being whole, built from the table; while it is
+  missing (never built, or evicted) the first check builds it, and new
+  entries do not create a partial one.
+- Otherwise each process keeps its own bitmap and catches up with entries
+  added elsewhere by loading BlacklistedToken rows above the highest id it
+  has seen, whenever their version in the cache moved (see caching.py).
+  Ids skipped on the way may belong to transactions that commit later, so
+  they are looked up again for a while.
+
+Either way the filter is rebuilt from the table after purge_expired_tokens
+drops expired rows, which keeps its false-positive rate near
+BLACKLIST_FILTER_ERROR_RATE for up to BLACKLIST_FILTER_CAPACITY entries.
+Checks, confirmed hits and false positives are counted in each process
+and added to totals in the cache every METRICS_FLUSH_INTERVAL seconds;
+metrics() reports them with the table sizes.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from . import caching
+
+CAPACITY = getattr(settings, 'BLACKLIST_FILTER_CAPACITY', 1_000_000)
+ERROR_RATE = getattr(settings, 'BLACKLIST_FILTER_ERROR_RATE', 0.001)
+
+# Optimal size in bits and number of hashes for CAPACITY entries at ERROR_RATE.
+SIZE = int(math.ceil(-CAPACITY * math.log(ERROR_RATE) / math.log(2) ** 2))
+HASHES = max(1, round(SIZE / CAPACITY * math.log(2)))
+
+KEY_PREFIX = 'myaccounts:blacklist'
+REBUILD_CHUNK = 10000
+
+# Ids skipped by a catch-up, at most GAP_WINDOW below the highest id seen,
+# are looked up again on later catch-ups for GAP_TIMEOUT seconds; one still
+# missing by then was a rolled-back insert.
+GAP_WINDOW = 1000
+GAP_TIMEOUT = 10 * 60
+
+METRICS = ('checks', 'confirmed', 'false_positives')
+# Counts of a process that exits between flushes are lost.
+METRICS_FLUSH_INTERVAL = getattr(settings, 'BLACKLIST_METRICS_FLUSH_INTERVAL', 10)
+
+
+def positions(jti):
+    """The HASHES bit positions of `jti`, by double hashing one digest."""
+    digest = hashlib.blake2b(jti.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:], 'big') | 1
+    return [(h1 + i * h2) % SIZE for i in range(HASHES)]
+
+
+def _set_bits(bits, jti):
+    # Bit 0 is the high bit of byte 0, as in Redis bitmaps.
+    for position in positions(jti):
+        bits[position >> 3] |= 0x80 >> (position & 7)
+
+
+def _has_bits(bits, jti):
+    return all(bits[position >> 3] & (0x80 >> (position & 7)) for position in positions(jti))
+
+
+def _blacklisted_jtis(last_id=0):
+    """Yield (id, jti) of the blacklisted tokens after `last_id` in id order, one chunk at a time."""
+    while True:
+        chunk = list(
+            BlacklistedToken.objects
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'token__jti')[:REBUILD_CHUNK]
+        )
+        yield from chunk
+        if len(chunk) < REBUILD_CHUNK:
+            return
+        last_id = chunk[-1][0]
+
+
+def _incr(name, delta=1):
+    key = f'{KEY_PREFIX}:{name}'
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+class _Counters:
+    """Per-process counts, so a check costs no cache write; flush() adds them to the shared totals."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(METRICS, 0)
+        self.flushed_at = time.monotonic()
+
+    def incr(self, name):
+        with self.lock:
+            self.counts[name] += 1
+            due = time.monotonic() - self.flushed_at >= METRICS_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, dict.fromkeys(METRICS, 0)
+            self.flushed_at = time.monotonic()
+        for name, delta in counts.items():
+            if delta:
+                _incr(name, delta)
+
+
+_counters = _Counters()
+
+
+class LocalFilter:
+    """A per-process bitmap kept in step through shared cache versions.
+
+    The 'blacklist' version moves whenever entries are added anywhere, and
+    the process then loads the rows above the highest id it has seen. The
+    'blacklist:epoch' version moves on rebuild, and the process then
+    reloads the whole table.
+
+    Rows do not commit in id order: id 10 may commit after id 11 was
+    loaded. Skipped ids are kept in `gaps` and looked up again on the
+    catch-ups that follow, which the late commit's own version bump
+    triggers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bits = None
+        self.versions = None
+        self.last_id = 0
+        self.gaps = {}  # id -> monotonic time it was first skipped
+
+    def _catch_up(self):
+        versions = caching.get_versions('blacklist', 'blacklist:epoch')
+        if self.bits is not None and versions == self.versions:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if self.bits is None or versions[1] != self.versions[1]:
+                self.bits, self.last_id, self.gaps = bytearray(SIZE // 8 + 1), 0, {}
+            elif self.gaps:
+                late = BlacklistedToken.objects.filter(id__in=list(self.gaps)).values_list('id', 'token__jti')
+                for token_id, jti in late:
+                    _set_bits(self.bits, jti)
+                    del self.gaps[token_id]
+            for token_id, jti in _blacklisted_jtis(self.last_id):
+                _set_bits(self.bits, jti)
+                for skipped in range(max(self.last_id + 1, token_id - GAP_WINDOW), token_id):
+                    self.gaps[skipped] = now
+                self.last_id = token_id
+            self.gaps = {
+                token_id: skipped_at for token_id, skipped_at in self.gaps.items()
+                if token_id > self.last_id - GAP_WINDOW and now - skipped_at < GAP_TIMEOUT
+            }
+            self.versions = versions
+
+    def might_contain(self, jti):
+        self._catch_up()
+        return _has_bits(self.bits, jti)
+
+    def add(self, jtis):
+        if self.bits is not None:
+            with self.lock:
+                for jti in jtis:
+                    _set_bits(self.bits, jti)
+        caching.bump_versions('blacklist')
+
+    def rebuild(self):
+        caching.bump_versions('blacklist:epoch')
+        self._catch_up()
+
+
+class RedisFilter:
+    """A bitmap in Redis shared by every process."""
+
+    key = f'{KEY_PREFIX}:bits'
+    # Bits set while a rebuild runs are also written here and merged into its result.
+    next_key = f'{KEY_PREFIX}:bits:next'
+    build_key = f'{KEY_PREFIX}:bits:build'
+    lock_key = f'{KEY_PREFIX}:bits:lock'
+    lock_timeout = 10 * 60
+
+    # SETBIT on a missing key would create a bitmap holding only the new
+    # entries, and every older one would read as certainly not blacklisted.
+    add_script = """
+        if redis.call('EXISTS', KEYS[1]) == 1 then
+            for i = 1, #ARGV do redis.call('SETBIT', KEYS[1], ARGV[i], 1) end
+        end
+        for i = 1, #ARGV do redis.call('SETBIT', KEYS[2], ARGV[i], 1) end
+        redis.call('EXPIRE', KEYS[2], 86400)
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._add = client.register_script(self.add_script)
+
+    def _check(self, jti):
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.exists(self.key)
+        for position in positions(jti):
+            pipeline.getbit(self.key, position)
+        exists, *bits = pipeline.execute()
+        return exists, all(bits)
+
+    def might_contain(self, jti):
+        exists, found = self._check(jti)
+        if exists:
+            return found
+        # Never built or evicted: build it from the table. Meanwhile, and in
+        # the processes that did not get the lock, every jti is a "maybe".
+        if not self.client.set(self.lock_key, 1, nx=True, ex=self.lock_timeout):
+            return True
+        try:
+            self.rebuild()
+        finally:
+            self.client.delete(self.lock_key)
+        exists, found = self._check(jti)
+        return not exists or found
+
+    def add(self, jtis):
+        self._add(keys=[self.key, self.next_key], args=[position for jti in jtis for position in positions(jti)])
+
+    def rebuild(self):
+        self.client.delete(self.next_key)
+        bits = bytearray(SIZE // 8 + 1)
+        for _, jti in _blacklisted_jtis():
+            _set_bits(bits, jti)
+        pipeline = self.client.pipeline()
+        pipeline.set(self.build_key, bytes(bits))
+        pipeline.bitop('OR', self.next_key, self.next_key, self.build_key)
+        pipeline.rename(self.next_key, self.key)
+        pipeline.delete(self.build_key)
+        pipeline.execute()
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_filter():
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                try:
+                    from django_redis import get_redis_connection
+                    _filter = RedisFilter(get_redis_connection('default'))
+                except (ImportError, NotImplementedError):
+                    _filter = LocalFilter()
+    return _filter
+
+
+def is_blacklisted(jti):
+    """Whether `jti` is blacklisted, querying the database only when the filter says maybe."""
+    _counters.incr('checks')
+    if not get_filter().might_contain(jti):
+        return False
+    blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+    _counters.incr('confirmed' if blacklisted else 'false_positives')
+    return blacklisted
+
+
+def add(jtis):
+    """Add newly blacklisted jtis to the filter once the current transaction commits."""
+    jtis = list(jtis)
+    if jtis:
+        transaction.on_commit(lambda: get_filter().add(jtis))
+
+
+def rebuild():
+    get_filter().rebuild()
+
+
+def metrics():
+    _counters.flush()
+    counters = cache.get_many([f'{KEY_PREFIX}:{name}' for name in METRICS])
+    checks, confirmed, false_positives = (counters.get(f'{KEY_PREFIX}:{name}', 0) for name in METRICS)
+    negatives = checks - confirmed
+    return {
+        'outstanding_tokens': OutstandingToken.objects.count(),
+        'blacklisted_tokens': BlacklistedToken.objects.count(),
+        'filter_bits': SIZE,
+        'filter_hashes': HASHES,
+        'filter_capacity': CAPACITY,
+        'checks': checks,
+        'confirmed': confirmed,
+        'false_positives': false_positives,
+        'false_positive_rate': false_positives / negatives if negatives else 0.0,
+    }
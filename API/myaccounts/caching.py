@@ -0,0 +1,165 @@
+"""Versioned read-through cache for serialized API payloads.
+
+Every cached payload is stored under a key that embeds the current version
+of each namespace it depends on (for example ``photographer`` for the whole
+table, or ``user:42`` for one row). The signal handlers in signals.py bump
+those versions on save and delete, so stale entries are never read again
+and simply age out of the cache.
+
+The same versions make strong ETags: conditional() answers a matching
+If-None-Match with 304 Not Modified after a single cache read, before the
+view runs any query.
+"""
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+KEY_PREFIX = 'myaccounts'
+DEFAULT_TIMEOUT = getattr(settings, 'MYACCOUNTS_CACHE_TIMEOUT', 300)
+
+# Only one worker rebuilds a missing entry; the others poll for its result
+# for at most LOCK_RETRIES * LOCK_WAIT seconds before building it themselves.
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.05
+LOCK_RETRIES = 40
+
+_MISSING = object()
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:version:{namespace}'
+
+
+def get_versions(*namespaces):
+    """Return the current version of each namespace, creating missing ones.
+
+    New versions start from the current time in nanoseconds rather than 1,
+    so a version that was evicted never comes back with a value an old
+    entry was already stored under.
+    """
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        versions.update(cache.get_many(missing))
+    return tuple(versions.get(key, 0) for key in keys)
+
+
+async def aget_versions(*namespaces):
+    """Async counterpart of get_versions."""
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, time.time_ns(), None)
+        versions.update(await cache.aget_many(missing))
+    return tuple(versions.get(key, 0) for key in keys)
+
+
+def bump_versions(*namespaces):
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def model_namespaces(instance):
+    """The table and row namespaces a model instance belongs to."""
+    name = instance._meta.model_name
+    return name, f'{name}:{instance.pk}'
+
+
+def _entry_key(versions, key):
+    digest = hashlib.md5(key.encode()).hexdigest()
+    return f'{KEY_PREFIX}:{digest}:{".".join(str(version) for version in versions)}'
+
+
+def entry_key(namespaces, key):
+    return _entry_key(get_versions(*namespaces), key)
+
+
+def fields_key(key, fields):
+    """`key` for a payload that renders only `fields`, or `key` itself when all fields are rendered."""
+    return key if fields is None else f'{key}:{",".join(fields)}'
+
+
+def etag(namespaces, key):
+    """A strong ETag for the payload named `key`; it changes whenever one of `namespaces` is bumped."""
+    return hashlib.md5(entry_key(namespaces, key).encode()).hexdigest()
+
+
+def conditional(*namespaces):
+    """Decorate a view so GET and HEAD carry an ETag and honour If-None-Match.
+
+    Namespaces are formatted with the view's keyword arguments, so
+    'profile:{id}' names the requested row. The requesting user's own row
+    is always included, and so is the user in the key: the payload a view
+    returns may depend on who asks and in which role. Place it below
+    @permission_classes, so requests are authenticated first.
+    """
+    def etag_func(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        names = [namespace.format(**kwargs) for namespace in namespaces]
+        names.append(f'user:{request.user.pk}')
+        return etag(names, f'{request.user.pk}:{request.get_full_path()}')
+    return condition(etag_func=etag_func)
+
+
+def read_through(namespaces, key, builder, timeout=DEFAULT_TIMEOUT):
+    """Return the cached value for `key`, calling `builder` to fill a miss."""
+    cache_key = entry_key(namespaces, key)
+    value = cache.get(cache_key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{cache_key}:lock'
+    for _ in range(LOCK_RETRIES):
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                value = builder()
+                cache.set(cache_key, value, timeout)
+                return value
+            finally:
+                cache.delete(lock_key)
+
+        time.sleep(LOCK_WAIT)
+        value = cache.get(cache_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+    return builder()
+
+
+async def aread_through(namespaces, key, builder, timeout=DEFAULT_TIMEOUT):
+    """Async counterpart of read_through; `builder` is a coroutine function."""
+    cache_key = _entry_key(await aget_versions(*namespaces), key)
+    value = await cache.aget(cache_key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f'{cache_key}:lock'
+    for _ in range(LOCK_RETRIES):
+        if await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                value = await builder()
+                await cache.aset(cache_key, value, timeout)
+                return value
+            finally:
+                await cache.adelete(lock_key)
+
+        await asyncio.sleep(LOCK_WAIT)
+        value = await cache.aget(cache_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+    return await builder()
@@ -0,0 +1,230 @@
+"""Push channel for photographer events, streamed as server-sent events.
+
+Photographers used to learn about new bookings by polling the notification
+feed. async_views.event_stream instead holds one text/event-stream response
+open per dashboard and writes each event as it happens:
+
+- ``notification`` when a notification is created for the photographer;
+- ``booking_status`` when one of their bookings changes status.
+
+Signal handlers and bulk paths call publish(), which hands the events to
+the broker once the transaction commits. Events fan out through a broker:
+
+- With django-redis, every event is appended to a capped Redis stream per
+  photographer (the replay history) and announced on one pub/sub channel.
+  Each process holds a single subscription for all of its connections and
+  hands events to them through in-memory queues, so an idle connection
+  costs one suspended task and no Redis connection of its own.
+- Otherwise events stay in process memory, which is enough for tests and a
+  single-process server.
+
+Every event carries an id. A client that reconnects sends the last id it
+saw as Last-Event-ID, as EventSource does by itself, and first receives the
+events it missed from the history (the last EVENTS_HISTORY events, kept
+for EVENTS_HISTORY_TTL seconds).
+
+Django 4.2 does not tell a streaming response that its client went away,
+so streams end after EVENTS_STREAM_TIMEOUT seconds and EventSource
+reconnects on its own, resuming from its last id.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+HISTORY = getattr(settings, 'EVENTS_HISTORY', 100)
+HISTORY_TTL = getattr(settings, 'EVENTS_HISTORY_TTL', 24 * 60 * 60)
+HEARTBEAT = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+STREAM_TIMEOUT = getattr(settings, 'EVENTS_STREAM_TIMEOUT', 5 * 60)
+
+KEY_PREFIX = 'myaccounts:events'
+CHANNEL = f'{KEY_PREFIX}:channel'
+
+
+class LocalBroker:
+    """Events kept in this process; publish() may run on any thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.history = defaultdict(lambda: deque(maxlen=HISTORY))
+        self.subscribers = defaultdict(set)
+
+    def publish(self, events):
+        for photographer_id, event in events:
+            with self.lock:
+                event = dict(event, id=str(next(self.ids)))
+                self.history[photographer_id].append(event)
+                subscribers = list(self.subscribers[photographer_id])
+            for loop, queue in subscribers:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    async def replay(self, photographer_id, last_id):
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            return []
+        with self.lock:
+            return [event for event in self.history[photographer_id] if int(event['id']) > last_id]
+
+    def subscribe(self, photographer_id):
+        queue = asyncio.Queue()
+        with self.lock:
+            self.subscribers[photographer_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, photographer_id, queue):
+        with self.lock:
+            self.subscribers[photographer_id] = {
+                subscriber for subscriber in self.subscribers[photographer_id] if subscriber[1] is not queue
+            }
+
+
+class RedisBroker:
+    """A capped Redis stream per photographer and one pub/sub channel for all of them."""
+
+    def __init__(self, client):
+        import redis.asyncio
+
+        self.client = client
+        self.async_client = redis.asyncio.Redis(**client.connection_pool.connection_kwargs)
+        self.subscribers = defaultdict(set)
+        self.listener = None
+
+    def _key(self, photographer_id):
+        return f'{KEY_PREFIX}:{photographer_id}'
+
+    def publish(self, events):
+        # The stream ids are needed for the announcements, hence two round trips.
+        payloads = [(photographer_id, json.dumps(event, cls=DjangoJSONEncoder)) for photographer_id, event in events]
+        pipeline = self.client.pipeline(transaction=False)
+        for photographer_id, payload in payloads:
+            pipeline.xadd(self._key(photographer_id), {'event': payload}, maxlen=HISTORY, approximate=True)
+        event_ids = pipeline.execute()
+        for photographer_id in {photographer_id for photographer_id, _ in payloads}:
+            pipeline.expire(self._key(photographer_id), HISTORY_TTL)
+        for (photographer_id, payload), event_id in zip(payloads, event_ids):
+            pipeline.publish(CHANNEL, json.dumps([photographer_id, event_id.decode(), payload]))
+        pipeline.execute()
+
+    async def replay(self, photographer_id, last_id):
+        from redis.exceptions import ResponseError
+
+        try:
+            # '(' makes the range exclusive of the last id seen.
+            entries = await self.async_client.xrange(self._key(photographer_id), min=f'({last_id}')
+        except ResponseError:
+            # Not a stream id, e.g. a mangled Last-Event-ID header.
+            return []
+        return [dict(json.loads(fields[b'event']), id=entry_id.decode()) for entry_id, fields in entries]
+
+    async def _listen(self):
+        pubsub = self.async_client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(CHANNEL)
+        async for message in pubsub.listen():
+            photographer_id, event_id, payload = json.loads(message['data'])
+            subscribers = self.subscribers.get(photographer_id)
+            if subscribers:
+                event = dict(json.loads(payload), id=event_id)
+                for queue in subscribers:
+                    queue.put_nowait(event)
+
+    def subscribe(self, photographer_id):
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.get_running_loop().create_task(self._listen())
+        queue = asyncio.Queue()
+        self.subscribers[photographer_id].add(queue)
+        return queue
+
+    def unsubscribe(self, photographer_id, queue):
+        self.subscribers[photographer_id].discard(queue)
+        if not self.subscribers[photographer_id]:
+            del self.subscribers[photographer_id]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                try:
+                    from django_redis import get_redis_connection
+                    _broker = RedisBroker(get_redis_connection('default'))
+                except (ImportError, NotImplementedError):
+                    _broker = LocalBroker()
+    return _broker
+
+
+def publish(events):
+    """Push (photographer id, event type, data) events to open streams once the current transaction commits."""
+    events = [(photographer_id, {'event': event_type, 'data': data}) for photographer_id, event_type, data in events]
+    if events:
+        transaction.on_commit(lambda: get_broker().publish(events))
+
+
+def notifications_created(notifications):
+    publish([
+        (notification.photographer_id, 'notification', {
+            'id': notification.pk,
+            'booking': notification.booking_id,
+            'created_at': notification.created_at,
+        })
+        for notification in notifications
+    ])
+
+
+def booking_statuses_changed(bookings):
+    """`bookings` are (id, photographer profile id, status, reason for denial) tuples."""
+    publish([
+        (photographer_id, 'booking_status', {
+            'booking': booking_id,
+            'status': booking_status,
+            'reason_for_denial': reason_for_denial,
+        })
+        for booking_id, photographer_id, booking_status, reason_for_denial in bookings
+    ])
+
+
+def format_event(event):
+    data = json.dumps(event['data'], cls=DjangoJSONEncoder)
+    return f'id: {event["id"]}\nevent: {event["event"]}\ndata: {data}\n\n'
+
+
+async def stream(photographer_id, last_id=None):
+    """Yield the photographer's events as text/event-stream chunks.
+
+    Events after `last_id` are replayed first. Live events are subscribed
+    to before the replay is read, so none is lost in between, and the
+    replayed ones are not sent twice.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_TIMEOUT
+    broker = get_broker()
+    queue = broker.subscribe(photographer_id)
+    try:
+        yield f'retry: {HEARTBEAT * 1000}\n\n'
+        sent = set()
+        if last_id:
+            for event in await broker.replay(photographer_id, last_id):
+                sent.add(event['id'])
+                yield format_event(event)
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(HEARTBEAT, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                # A comment line keeps proxies from closing an idle connection.
+                yield ': keep-alive\n\n'
+                continue
+            if event['id'] not in sent:
+                yield format_event(event)
+    finally:
+        broker.unsubscribe(photographer_id, queue)
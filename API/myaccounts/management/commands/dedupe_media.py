@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.core.files.storage import default_storage
+
+from myaccounts import caching
+from myaccounts.models import Photographer, Profile, StoredBlob
+from myaccounts.storage import BLOB_DIRECTORY, blob_storage
+
+
+class Command(BaseCommand):
+    help = 'Move profile images and portfolios stored before deduplication into the blob storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-originals', action='store_true', help='Delete each original once it is moved.')
+
+    def handle(self, *args, **options):
+        storage = blob_storage()
+        moved = missing = 0
+        for model, field in ((Profile, 'image'), (Photographer, 'portfolio')):
+            rows = (
+                model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .exclude(**{f'{field}__startswith': f'{BLOB_DIRECTORY}/'})
+            )
+            for pk, original in rows.values_list('pk', field).iterator():
+                if not default_storage.exists(original):
+                    missing += 1
+                    continue
+                with default_storage.open(original, 'rb') as f:
+                    name = storage.save(original, f)
+                # UPDATE skips the signals, so the reference is counted here; a
+                # row changed meanwhile keeps its new file and the blob is swept.
+                if model.objects.filter(pk=pk, **{field: original}).update(**{field: name}):
+                    StoredBlob.add_references([(name, 1)])
+                    moved += 1
+                    if options['delete_originals']:
+                        default_storage.delete(original)
+
+        caching.bump_versions('profile', 'photographer')
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} files into the blob storage, {missing} missing'))
@@ -0,0 +1,161 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from myaccounts import caching
+from myaccounts.models import User, Staff, Photographer, Client, Profile
+
+USER_TYPES = {'1': 1, '2': 2, '3': 3, 'staff': 1, 'photographer': 2, 'client': 3}
+
+
+def read_records(path, fmt):
+    """Yield the records of a CSV or NDJSON file one at a time."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        'Create users, with their role and profile rows, from a CSV or NDJSON file. '
+        'Passwords are hashed in a process pool and rows are bulk inserted one batch '
+        'at a time. Every committed batch is recorded in a checkpoint file, and '
+        'running the command again resumes after the last one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File with email, username, password and user_type columns, '
+                                         'and optionally first_name and last_name.')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--checkpoint', help='Defaults to PATH.checkpoint.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        batch_size = options['batch_size']
+
+        done = self.read_checkpoint(checkpoint)
+        if done:
+            self.stdout.write(f'Resuming after record {done}')
+
+        records = read_records(path, fmt)
+        try:
+            # Records of batches committed before a failure are skipped.
+            for _ in islice(records, done):
+                pass
+        except (ValueError, csv.Error) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        imported = skipped = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            while True:
+                try:
+                    batch = list(islice(records, batch_size))
+                except (ValueError, csv.Error) as e:
+                    raise CommandError(f'Could not read {path} after record {done}: {e}')
+                if not batch:
+                    break
+
+                users = self.build_users(batch, done)
+                passwords = pool.map(make_password, [password for _, password in users], chunksize=16)
+                for (user, _), password in zip(users, passwords):
+                    user.password = password
+                created = self.insert([user for user, _ in users])
+
+                done += len(batch)
+                imported += created
+                skipped += len(batch) - created
+                self.write_checkpoint(checkpoint, done)
+                self.stdout.write(f'{done} records read, {imported} users imported, {skipped} skipped')
+
+        # Bulk inserts skip the signals that invalidate cached reads.
+        caching.bump_versions('user', 'profile', 'staff', 'photographer', 'client')
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} users, skipped {skipped}'))
+
+    def build_users(self, batch, offset):
+        """Unsaved users for the valid records of `batch` that do not exist yet, with their plain passwords."""
+        users = []
+        seen = set()
+        for number, record in enumerate(batch, start=offset + 1):
+            email = User.objects.normalize_email((record.get('email') or '').strip())
+            username = (record.get('username') or '').strip()
+            password = record.get('password') or ''
+            user_type = USER_TYPES.get(str(record.get('user_type', '')).strip().lower())
+            if not email or not username or len(password) < 8 or user_type is None:
+                self.stderr.write(f'Record {number}: needs an email, a username, a password of '
+                                  f'at least 8 characters and a valid user_type')
+                continue
+            if email.lower() in seen or username.lower() in seen:
+                self.stderr.write(f'Record {number}: duplicate of an earlier record')
+                continue
+            seen.update([email.lower(), username.lower()])
+            user = User(
+                email=email,
+                username=username,
+                user_type=user_type,
+                first_name=record.get('first_name') or '',
+                last_name=record.get('last_name') or '',
+            )
+            users.append((user, password))
+
+        # Existing users are skipped rather than reported, so a batch that
+        # committed before its checkpoint was written imports cleanly again.
+        emails = set(User.objects.filter(email__in=[user.email for user, _ in users]).values_list('email', flat=True))
+        usernames = set(
+            User.objects.filter(username__in=[user.username for user, _ in users]).values_list('username', flat=True)
+        )
+        return [
+            (user, password) for user, password in users
+            if user.email not in emails and user.username not in usernames
+        ]
+
+    def insert(self, users):
+        """Insert `users` with their role and profile rows in one transaction."""
+        if not users:
+            return 0
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            # MySQL does not return ids from a multi-row INSERT, so read them back.
+            ids = dict(User.objects.filter(email__in=[user.email for user in users]).values_list('email', 'id'))
+            for user in users:
+                user.pk = ids[user.email]
+
+            with_profile = [user for user in users if user.user_type in (2, 3)]
+            Profile.objects.bulk_create([Profile(user=user, profile_type=user.user_type) for user in with_profile])
+            profiles = dict(Profile.objects.filter(user__in=with_profile).values_list('user', 'id'))
+
+            Staff.objects.bulk_create([Staff(user=user) for user in users if user.user_type == 1])
+            Photographer.objects.bulk_create([
+                Photographer(user=user, profile_id=profiles[user.pk]) for user in users if user.user_type == 2
+            ])
+            Client.objects.bulk_create([
+                Client(user=user, profile_id=profiles[user.pk]) for user in users if user.user_type == 3
+            ])
+        return len(users)
+
+    def read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, checkpoint, done):
+        # Written to a temporary file and renamed, so a crash never leaves half a number.
+        with open(f'{checkpoint}.tmp', 'w') as f:
+            f.write(str(done))
+        os.replace(f'{checkpoint}.tmp', checkpoint)
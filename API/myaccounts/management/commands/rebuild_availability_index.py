@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myaccounts.availability import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every photographer availability calendar from the accepted bookings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        calendars = rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {calendars} photographer calendars'))
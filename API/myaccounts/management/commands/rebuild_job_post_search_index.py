@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from myaccounts.models import JobPost
+from myaccounts.search import index_job_posts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the job post search index from scratch, one batch of posts at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        indexed = 0
+        while True:
+            batch = list(
+                JobPost.objects
+                .filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'title', 'description', 'location')[:batch_size]
+            )
+            if not batch:
+                break
+            index_job_posts(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'Indexed {indexed} job posts')
+
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt for {indexed} job posts'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from myaccounts.models import Profile
+from myaccounts.task import generate_profile_renditions
+
+
+class Command(BaseCommand):
+    help = 'Queue the renditions of every profile image that has none, e.g. images uploaded before renditions existed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Render every profile image again.')
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            profiles = profiles.filter(image_renditions={})
+        queued = 0
+        for profile_id, image in profiles.values_list('id', 'image').iterator():
+            generate_profile_renditions.delay(profile_id, image)
+            queued += 1
+        self.stdout.write(self.style.SUCCESS(f'Queued renditions for {queued} profile images'))
@@ -0,0 +1,384 @@
+"""Suggested photographers for a job post, and suggested job posts for a photographer.
+
+Both directions score a (job post, photographer) pair the same way, as the
+MATCH_WEIGHTS-weighted sum of three features between 0 and 1:
+
+- location: the share of the job post's location words that appear in the
+  photographer's profile location;
+- experience: the years of WorkHistory on a log scale, 1 from
+  EXPERIENCE_CAP years on;
+- acceptance: the share of decided bookings the photographer accepted,
+  smoothed so that a single booking does not make a perfect record.
+
+Suspended photographers, and photographers with an accepted booking on the
+event date (see availability.py), are never suggested.
+
+The features live in NumPy arrays in each process, one row per
+photographer and per upcoming job post, so a job post is scored against
+every photographer in a few vector operations. The arrays are built on
+first use and then refreshed incrementally. Signal handlers append the ids
+of the photographers, users and job posts they change to a dirty log in
+the cache, which every process shares. Before each match the index reloads
+only the rows logged since it last looked. It is rebuilt from scratch when
+it falls more than DIRTY_LOG_LIMIT entries behind or an entry is lost, and
+every MATCH_INDEX_MAX_AGE seconds, which also picks up bulk updates that
+bypass the signals.
+"""
+import threading
+import time
+import zlib
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .availability import CALENDAR_BYTES, _day_bit
+from .models import Bookings, JobPost, Photographer, PhotographerCalendar, WorkHistory
+from .search import tokenize
+
+MATCH_WEIGHTS = getattr(settings, 'MATCH_WEIGHTS', {'location': 0.5, 'experience': 0.25, 'acceptance': 0.25})
+EXPERIENCE_CAP = 10  # years
+# Words of a location that are compared; later ones rarely narrow it further.
+LOCATION_TERMS = 4
+
+MAX_AGE = getattr(settings, 'MATCH_INDEX_MAX_AGE', 60 * 60)
+DIRTY_LOG_TTL = getattr(settings, 'MATCH_DIRTY_LOG_TTL', 60 * 60)
+# Further behind than this, a rebuild is cheaper than replaying the log.
+DIRTY_LOG_LIMIT = 1000
+# How long a log entry may be missing before it counts as lost. A writer
+# takes its sequence number before it stores the entry.
+DIRTY_LOG_WAIT = 5
+
+KEY_PREFIX = 'myaccounts:matching'
+SEQUENCE_KEY = f'{KEY_PREFIX}:sequence'
+
+
+def _entry_key(sequence):
+    return f'{KEY_PREFIX}:dirty:{sequence}'
+
+
+def _sequence():
+    sequence = cache.get(SEQUENCE_KEY)
+    if sequence is None:
+        # Like cache versions, a lost sequence restarts from the clock, so no number is reused.
+        cache.add(SEQUENCE_KEY, time.time_ns(), None)
+        sequence = cache.get(SEQUENCE_KEY)
+    return sequence
+
+
+def _log(entry):
+    _sequence()
+    try:
+        sequence = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        # Evicted meanwhile; every index rebuilds on the new sequence.
+        cache.set(SEQUENCE_KEY, time.time_ns(), None)
+        return
+    cache.set(_entry_key(sequence), entry, DIRTY_LOG_TTL)
+
+
+def mark_dirty(photographers=(), users=(), job_posts=()):
+    """Log changed rows for every process's index once the current transaction commits."""
+    entry = (list(photographers), list(users), list(job_posts))
+    if any(entry):
+        transaction.on_commit(lambda: _log(entry))
+
+
+def location_terms(location):
+    """Hashes of the first LOCATION_TERMS words of `location`, padded with -1."""
+    terms = np.full(LOCATION_TERMS, -1, dtype=np.int64)
+    words = list(dict.fromkeys(tokenize(location)))[:LOCATION_TERMS]
+    terms[:len(words)] = [zlib.crc32(word.encode()) for word in words]
+    return terms
+
+
+class Rows:
+    """Feature columns with one row per id.
+
+    Rows are appended for new ids and deactivated for deleted ones; they
+    are only dropped by a rebuild.
+    """
+
+    def __init__(self, **columns):
+        # name -> (dtype, shape of one row)
+        self.layout = columns
+        self.ids = np.empty(0, dtype=np.int64)
+        self.row = {}
+        self.columns = {name: np.zeros((0, *shape), dtype=dtype) for name, (dtype, shape) in columns.items()}
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def _grow(self, count):
+        self.columns = {
+            name: np.concatenate([column, np.zeros((count, *self.layout[name][1]), dtype=self.layout[name][0])])
+            for name, column in self.columns.items()
+        }
+
+    def update(self, ids, values):
+        """Set the rows of `ids` to `values`, a column name -> array of one value per id."""
+        new = [pk for pk in ids if pk not in self.row]
+        if new:
+            self._grow(len(new))
+            self.row.update((pk, len(self.ids) + i) for i, pk in enumerate(new))
+            self.ids = np.concatenate([self.ids, np.array(new, dtype=np.int64)])
+        rows = np.array([self.row[pk] for pk in ids], dtype=np.int64)
+        for name, column in values.items():
+            self.columns[name][rows] = column
+        return rows
+
+    def deactivate(self, ids):
+        self.columns['active'][[self.row[pk] for pk in ids if pk in self.row]] = False
+
+
+class PhotographerRows(Rows):
+
+    def __init__(self):
+        super().__init__(
+            active=(np.bool_, ()),
+            location=(np.int64, (LOCATION_TERMS,)),
+            experience=(np.float32, ()),
+            acceptance=(np.float32, ()),
+        )
+        # year -> (rows, CALENDAR_BYTES) bitmaps, loaded when a date in that year is first matched
+        self.calendars = {}
+
+    def _grow(self, count):
+        super()._grow(count)
+        for year, calendar in self.calendars.items():
+            self.calendars[year] = np.concatenate([calendar, np.zeros((count, CALENDAR_BYTES), dtype=np.uint8)])
+
+    def load(self, ids=None, user_ids=()):
+        """(Re)load the given photographers, or all of them."""
+        photographers = Photographer.objects.order_by('id')
+        work = WorkHistory.objects.filter(photographer__isnull=False)
+        bookings = Bookings.objects.exclude(status='Pending')
+        if ids is not None:
+            photographers = photographers.filter(Q(id__in=ids) | Q(user_id__in=user_ids))
+        rows = list(photographers.values_list('id', 'user_id', 'is_suspended', 'profile__location'))
+        loaded = [pk for pk, _, _, _ in rows]
+        if ids is not None:
+            work = work.filter(photographer_id__in=[user_id for _, user_id, _, _ in rows])
+            bookings = bookings.filter(photographer_profile_id__in=loaded)
+
+        today = timezone.localdate()
+        years = defaultdict(float)
+        for user_id, start, end in work.values_list('photographer_id', 'start_date', 'end_date').iterator():
+            years[user_id] += max(((end or today) - start).days, 0) / 365.25
+        decided = {
+            photographer_id: (accepted, total)
+            for photographer_id, accepted, total in bookings.order_by().values('photographer_profile_id').annotate(
+                accepted=Count('id', filter=Q(status='Accepted')), total=Count('id'),
+            ).values_list('photographer_profile_id', 'accepted', 'total')
+        }
+
+        experience = np.array([years[user_id] for _, user_id, _, _ in rows], dtype=np.float32)
+        accepted, total = np.array([decided.get(pk, (0, 0)) for pk in loaded], dtype=np.float32).reshape(-1, 2).T
+        updated = self.update(loaded, {
+            'active': [not is_suspended for _, _, is_suspended, _ in rows],
+            'location': np.array([location_terms(location) for _, _, _, location in rows]).reshape(-1, LOCATION_TERMS),
+            'experience': np.minimum(np.log1p(experience) / np.log1p(EXPERIENCE_CAP), 1),
+            'acceptance': (accepted + 1) / (total + 2),
+        })
+        if ids is not None:
+            self.deactivate(set(ids) - set(loaded))
+            for year in self.calendars:
+                self._load_calendars(year, loaded, updated)
+
+    def _load_calendars(self, year, ids=None, rows=None):
+        calendar = self.calendars.get(year)
+        if calendar is None:
+            calendar = self.calendars[year] = np.zeros((len(self.ids), CALENDAR_BYTES), dtype=np.uint8)
+        calendars = PhotographerCalendar.objects.filter(year=year)
+        if ids is not None:
+            calendar[rows] = 0
+            calendars = calendars.filter(photographer_id__in=ids)
+        for photographer_id, booked_days in calendars.values_list('photographer_id', 'booked_days').iterator():
+            row = self.row.get(photographer_id)
+            if row is not None:
+                calendar[row] = np.frombuffer(bytes(booked_days), dtype=np.uint8)
+
+    def calendar(self, year):
+        if year not in self.calendars:
+            self._load_calendars(year)
+        return self.calendars[year]
+
+    def booked_on(self, day):
+        """Whether each photographer has an accepted booking on `day`."""
+        index, bit = _day_bit(day)
+        return (self.calendar(day.year)[:, index] & bit) != 0
+
+
+class JobPostRows(Rows):
+
+    def __init__(self):
+        super().__init__(
+            active=(np.bool_, ()),
+            location=(np.int64, (LOCATION_TERMS,)),
+            day=(np.int32, ()),  # event date ordinal
+        )
+
+    def load(self, ids=None):
+        """(Re)load the given job posts, or all upcoming ones."""
+        job_posts = JobPost.objects.order_by('id')
+        if ids is None:
+            job_posts = job_posts.filter(event_date__gte=timezone.localdate())
+        else:
+            job_posts = job_posts.filter(id__in=ids)
+        rows = list(job_posts.values_list('id', 'location', 'event_date'))
+        loaded = [pk for pk, _, _ in rows]
+        self.update(loaded, {
+            'active': True,
+            'location': np.array([location_terms(location) for _, location, _ in rows]).reshape(-1, LOCATION_TERMS),
+            'day': [event_date.toordinal() for _, _, event_date in rows],
+        })
+        if ids is not None:
+            self.deactivate(set(ids) - set(loaded))
+
+
+def _top(ids, scores, eligible, limit, tiebreak):
+    """(id, score) of the `limit` best eligible rows, best first, ties by `tiebreak` ascending."""
+    candidates = np.flatnonzero(eligible)
+    if limit <= 0:
+        return []
+    if len(candidates) > limit:
+        candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+    candidates = candidates[np.lexsort((tiebreak[candidates], -scores[candidates]))]
+    return [(int(ids[row]), round(float(scores[row]), 4)) for row in candidates]
+
+
+class MatchIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_at = None
+
+    def rebuild(self, sequence):
+        self.photographers = PhotographerRows()
+        self.photographers.load()
+        self.job_posts = JobPostRows()
+        self.job_posts.load()
+        self.sequence = sequence
+        self.waiting = None
+        self.built_at = time.monotonic()
+
+    def refresh(self):
+        """Catch up with the dirty log; call with the lock held."""
+        now = time.monotonic()
+        sequence = _sequence()
+        if self.built_at is None or now - self.built_at > MAX_AGE or not (
+            self.sequence <= sequence <= self.sequence + DIRTY_LOG_LIMIT
+        ):
+            self.rebuild(sequence)
+            return
+        if sequence == self.sequence:
+            return
+
+        numbers = range(self.sequence + 1, sequence + 1)
+        entries = cache.get_many([_entry_key(number) for number in numbers])
+        photographers, users, job_posts = set(), set(), set()
+        caught_up = self.sequence
+        for number in numbers:
+            entry = entries.get(_entry_key(number))
+            if entry is None:
+                if self.waiting is None or self.waiting[0] != number:
+                    self.waiting = (number, now)
+                elif now - self.waiting[1] > DIRTY_LOG_WAIT:
+                    self.rebuild(sequence)
+                    return
+                break
+            photographers.update(entry[0])
+            users.update(entry[1])
+            job_posts.update(entry[2])
+            caught_up = number
+
+        if photographers or users:
+            self.photographers.load(photographers, users)
+        if job_posts:
+            self.job_posts.load(job_posts)
+        self.sequence = caught_up
+
+    def suggest_photographers(self, job_post, limit):
+        photographers = self.photographers
+        location = np.zeros(len(photographers.ids), dtype=np.float32)
+        terms = [term for term in location_terms(job_post.location) if term >= 0]
+        for term in terms:
+            location += (photographers.location == term).any(axis=1)
+        if terms:
+            location /= len(terms)
+        scores = (
+            MATCH_WEIGHTS['location'] * location
+            + MATCH_WEIGHTS['experience'] * photographers.experience
+            + MATCH_WEIGHTS['acceptance'] * photographers.acceptance
+        )
+        eligible = photographers.active & ~photographers.booked_on(job_post.event_date)
+        return _top(photographers.ids, scores, eligible, limit, photographers.ids)
+
+    def suggest_job_posts(self, photographer_id, limit, exclude=()):
+        photographers, job_posts = self.photographers, self.job_posts
+        row = photographers.row.get(photographer_id)
+        if row is None or not photographers.active[row]:
+            return []
+
+        terms = photographers.location[row]
+        terms = terms[terms >= 0]
+        words = (job_posts.location >= 0).sum(axis=1)
+        matched = np.isin(job_posts.location, terms).sum(axis=1)
+        location = np.divide(matched, words, out=np.zeros(len(job_posts.ids)), where=words > 0)
+        scores = (
+            MATCH_WEIGHTS['location'] * location
+            + MATCH_WEIGHTS['experience'] * photographers.experience[row]
+            + MATCH_WEIGHTS['acceptance'] * photographers.acceptance[row]
+        )
+
+        eligible = job_posts.active & (job_posts.day >= timezone.localdate().toordinal())
+        if len(exclude):
+            eligible &= ~np.isin(job_posts.ids, np.fromiter(exclude, dtype=np.int64))
+        days = job_posts.day.astype(np.int64)
+        for year in {date.fromordinal(int(day)).year for day in np.unique(days[eligible])}:
+            start = date(year, 1, 1).toordinal()
+            in_year = eligible & (days >= start) & (days < date(year + 1, 1, 1).toordinal())
+            offsets = days[in_year] - start
+            calendar = photographers.calendar(year)[row]
+            eligible[in_year] = (calendar[offsets >> 3] & (1 << (offsets & 7))) == 0
+        # Sooner events first among equal scores.
+        return _top(job_posts.ids, scores, eligible, limit, days)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = MatchIndex()
+    return _index
+
+
+def suggest_photographers(job_post, limit=20):
+    """Return up to `limit` (photographer id, score) pairs for `job_post`, best match first."""
+    index = get_index()
+    with index.lock:
+        index.refresh()
+        return index.suggest_photographers(job_post, limit)
+
+
+def suggest_job_posts(photographer_id, limit=20, exclude=()):
+    """Return up to `limit` (job post id, score) pairs of upcoming job posts for a photographer,
+    best match first, leaving out the ids in `exclude`.
+    """
+    index = get_index()
+    with index.lock:
+        index.refresh()
+        return index.suggest_job_posts(photographer_id, limit, exclude)
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myaccounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookings',
+            index=models.Index(fields=['photographer_profile', 'status', 'event_date'], name='booking_photog_status_date'),
+        ),
+        migrations.AddIndex(
+            model_name='jobpost',
+            index=models.Index(fields=['event_date', 'created_at'], name='jobpost_event_created'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['photographer', 'is_read', '-created_at'], name='notif_photog_read_created'),
+        ),
+        migrations.AddIndex(
+            model_name='workhistory',
+            index=models.Index(fields=['photographer', 'start_date'], name='workhistory_photog_start'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myaccounts', '0002_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookings',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='bookings',
+            index=models.Index(fields=['status', 'created_at'], name='booking_status_created'),
+        ),
+    ]
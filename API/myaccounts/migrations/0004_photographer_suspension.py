@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:57
+
+from django.db import migrations, models
+import myaccounts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myaccounts', '0003_bookings_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='escalate_at',
+            field=models.DateTimeField(default=myaccounts.models.next_notification_escalation),
+        ),
+        migrations.AddField(
+            model_name='photographer',
+            name='is_suspended',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='photographer',
+            name='suspended_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['is_read', 'escalate_at'], name='notif_read_escalate'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myaccounts', '0005_outbound_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobPostSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('text', 'Title and description'), ('location', 'Location')], max_length=10)),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('job_post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='myaccounts.jobpost')),
+            ],
+            options={
+                'verbose_name': 'Job Post Search Term',
+                'verbose_name_plural': 'Job Post Search Terms',
+                'indexes': [models.Index(fields=['field', 'term', '-weight'], name='searchterm_field_term_weight')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='jobpostsearchterm',
+            constraint=models.UniqueConstraint(fields=('job_post', 'field', 'term'), name='unique_job_post_search_term'),
+        ),
+    ]
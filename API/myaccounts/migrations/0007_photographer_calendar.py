@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myaccounts', '0006_job_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotographerCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('booked_days', models.BinaryField(max_length=46)),
+                ('photographer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='calendars', to='myaccounts.photographer')),
+            ],
+            options={
+                'verbose_name': 'Photographer Calendar',
+                'verbose_name_plural': 'Photographer Calendars',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='photographercalendar',
+            constraint=models.UniqueConstraint(fields=('photographer', 'year'), name='unique_photographer_calendar_year'),
+        ),
+    ]
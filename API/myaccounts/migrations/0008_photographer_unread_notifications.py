@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread_notifications(apps, schema_editor):
+    Photographer = apps.get_model('myaccounts', 'Photographer')
+    Notification = apps.get_model('myaccounts', 'Notification')
+    unread = (
+        Notification.objects
+        .filter(photographer=OuterRef('pk'), is_read=False)
+        .order_by()
+        .values('photographer')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Photographer.objects.update(unread_notifications=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myaccounts', '0007_photographer_calendar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photographer',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_unread_notifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myaccounts', '0008_photographer_unread_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
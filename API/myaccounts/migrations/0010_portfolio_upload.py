@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myaccounts', '0009_profile_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('offset', models.PositiveBigIntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(choices=[('Uploading', 'Uploading'), ('Complete', 'Complete')], default='Uploading', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('photographer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='portfolio_uploads', to='myaccounts.photographer')),
+            ],
+            options={
+                'verbose_name': 'Portfolio Upload',
+                'verbose_name_plural': 'Portfolio Uploads',
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='portfolio_upload_status_upd')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:36
+
+from django.db import migrations, models
+import myaccounts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myaccounts', '0010_portfolio_upload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='photographer',
+            name='portfolio',
+            field=models.FileField(blank=True, null=True, storage=myaccounts.storage.blob_storage, upload_to='photographer_portfolios/'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=myaccounts.storage.blob_storage, upload_to='profile_images/'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(max_length=64)),
+                ('size', models.PositiveBigIntegerField()),
+                ('references', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Stored Blob',
+                'verbose_name_plural': 'Stored Blobs',
+                'indexes': [models.Index(fields=['references', 'updated_at'], name='storedblob_refs_updated')],
+            },
+        ),
+    ]
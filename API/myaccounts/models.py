@@ -1,7 +1,27 @@
-from django.db import models
+import uuid
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils import timezone
 
+from . import caching, events
+from .storage import blob_storage, is_blob
+
+
+# How long a photographer has to read a booking notification before it counts as unanswered.
+NOTIFICATION_RESPONSE_WINDOW = getattr(settings, 'NOTIFICATION_RESPONSE_WINDOW', timedelta(hours=24))
+
+# How many bookings one bulk request may create.
+BULK_BOOKING_LIMIT = getattr(settings, 'BULK_BOOKING_LIMIT', 100)
+
+
+def next_notification_escalation():
+    return timezone.now() + NOTIFICATION_RESPONSE_WINDOW
+
 
 class CustomUserManager(BaseUserManager):
 
@@ -62,17 +82,24 @@ class User(AbstractUser):
 
     def save(self, *args, **kwargs):
         created = not self.pk  # Check if instance is being created or updated
-        super().save(*args, **kwargs)
+        if not created:
+            return super().save(*args, **kwargs)
+
+        # A new user and its role rows are written together or not at all,
+        # with one INSERT per row.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
-        if created:  
             if self.user_type == 1: 
                 Staff.objects.create(user=self)
 
             elif self.user_type == 2:  
-                Photographer.objects.create(user=self)
+                profile = Profile.objects.create(user=self, profile_type=self.user_type)
+                Photographer.objects.create(user=self, profile=profile)
 
             elif self.user_type == 3:  
-                Client.objects.create(user=self)
+                profile = Profile.objects.create(user=self, profile_type=self.user_type)
+                Client.objects.create(user=self, profile=profile)
 
     def __str__(self):
         return self.username
@@ -88,7 +115,16 @@ class Profile(models.Model):
     profile_type = models.IntegerField(choices=PROFILE_CHOICES)
     phone = models.CharField(max_length=20, blank=True, null=True)
     location = models.CharField(max_length=50, null=True)
-    image = models.ImageField(null=True, blank=True, upload_to='profile_images/')
+    image = models.ImageField(null=True, blank=True, upload_to='profile_images/', storage=blob_storage)
+    # Storage names of the resized copies of image, filled in by a Celery task; see renditions.py.
+    image_renditions = models.JSONField(default=dict, blank=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded image so a save can tell whether a new one was uploaded.
+        instance._loaded_file = instance.__dict__.get('image') or None
+        return instance
 
     def __str__(self):
         return self.user.username 
@@ -132,15 +168,38 @@ class Photographer(models.Model):
     profile_switch = models.OneToOneField(ProfileSwitch, on_delete=models.CASCADE, related_name='photographer_switch', null=True, blank=True)
     age = models.PositiveIntegerField(null=True)
     bio = models.TextField(help_text="The bio of the photographer")
-    portfolio = models.FileField(upload_to='photographer_portfolios/', blank=True, null=True)
+    portfolio = models.FileField(upload_to='photographer_portfolios/', blank=True, null=True, storage=blob_storage)
     portfolio_url = models.URLField(max_length=200, blank=True, null=True)
     social_link = models.URLField(max_length=200, blank=True, null=True)
     account_number = models.CharField(max_length=20, null=False)
     bank_name = models.CharField(max_length=100, null=False)
+    is_suspended = models.BooleanField(default=False)
+    suspended_at = models.DateTimeField(blank=True, null=True)
+    # Maintained with F() updates alongside every change to the photographer's
+    # unread notifications, so reading the badge count is a primary key lookup.
+    unread_notifications = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded portfolio so a save can tell whether a new one was uploaded.
+        instance._loaded_file = instance.__dict__.get('portfolio') or None
+        return instance
 
     def __str__(self):
         return self.user.username
 
+    @classmethod
+    def add_unread_notifications(cls, counts):
+        """ Add counts[photographer_id] to each photographer's unread counter in one UPDATE. """
+        counts = {photographer_id: count for photographer_id, count in counts.items() if count}
+        if not counts:
+            return
+        cls.objects.filter(pk__in=counts).update(unread_notifications=F('unread_notifications') + Case(
+            *[When(pk=photographer_id, then=Value(count)) for photographer_id, count in counts.items()],
+            output_field=models.PositiveIntegerField(),
+        ))
+
     class Meta:
         verbose_name = "Photographer"
         verbose_name_plural = "Photographers"
@@ -177,7 +236,20 @@ class Bookings(models.Model):
     is_confirmed = models.BooleanField(default=False)
     status = models.CharField(choices=STATUS_CHOICES, default='Pending', max_length=20)
     reason_for_denial = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded calendar slot so a save can tell which availability days it changed.
+        instance._loaded_slot = instance.calendar_slot()
+        return instance
+
+    def calendar_slot(self):
+        """(photographer profile id, event date, status), without loading deferred fields."""
+        values = self.__dict__
+        event_date = self._meta.get_field('event_date').to_python(values.get('event_date'))
+        return values.get('photographer_profile_id'), event_date, values.get('status')
 
     def review_booking(self, status, reason_for_denial=None):
         if status == 'Accepted':
@@ -204,12 +276,48 @@ class Bookings(models.Model):
         """ Create a notification for the photographer """
         Notification.objects.create(photographer=photographer, booking=booking)
 
+    @classmethod
+    def bulk_create_and_notify_photographers(cls, bookings):
+        """ Insert `bookings` and an unread notification for each in one transaction.
+            Bulk inserts skip post_save, so the caller emails the photographers
+            itself, once per batch (see task.notify_photographers_of_bookings).
+        """
+        with transaction.atomic():
+            if connections[cls.objects.db].features.can_return_rows_from_bulk_insert:
+                cls.objects.bulk_create(bookings)
+            else:
+                # MySQL does not return the new ids from a multi-row INSERT, and
+                # the notifications need them.
+                for booking in bookings:
+                    booking.save(force_insert=True)
+            notifications = Notification.objects.bulk_create([
+                Notification(photographer_id=booking.photographer_profile_id, booking=booking)
+                for booking in bookings
+            ])
+            Photographer.add_unread_notifications(Counter(booking.photographer_profile_id for booking in bookings))
+            # Bulk inserts also skip the signals that invalidate cached reads.
+            transaction.on_commit(lambda: caching.bump_versions('bookings', 'notification'))
+            if notifications and notifications[0].pk is None:
+                notifications = Notification.objects.filter(booking__in=bookings)
+            events.notifications_created(notifications)
+        return bookings
+
     def __str__(self):
         return f"{self.client.username} booking {self.photographer.username} for {self.event_date}"
     
     class Meta:
         verbose_name = "Booking"
         verbose_name_plural = "Bookings"
+        # MySQL, the production database, has no partial indexes, and Django
+        # skips an Index with a condition there. Status therefore leads or
+        # follows the filter columns of a plain composite index instead of
+        # becoming a condition=Q(status='Pending').
+        indexes = [
+            # A photographer's bookings in a given status, by event date.
+            models.Index(fields=['photographer_profile', 'status', 'event_date'], name='booking_photog_status_date'),
+            # Pending bookings past the review window, for the expiry sweep.
+            models.Index(fields=['status', 'created_at'], name='booking_status_created'),
+        ]
 
 
 class Notification(models.Model):
@@ -218,10 +326,62 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     unanswered_count = models.IntegerField(default=0)
+    escalate_at = models.DateTimeField(default=next_notification_escalation)
 
     def __str__(self):
         return f"{self.photographer.username} - {self.booking.event_date}"
 
+    @classmethod
+    def mark_read(cls, photographer_id, ids=None):
+        """ Mark the photographer's unread notifications, or those of them in `ids`, as read.
+            One UPDATE flips the rows and one F() UPDATE takes the number it
+            changed off the unread counter. Returns that number.
+        """
+        unread = cls.objects.filter(photographer_id=photographer_id, is_read=False)
+        if ids is not None:
+            unread = unread.filter(id__in=ids)
+        with transaction.atomic():
+            marked = unread.update(is_read=True)
+            if marked:
+                Photographer.objects.filter(pk=photographer_id).update(
+                    unread_notifications=Greatest(F('unread_notifications') - marked, 0)
+                )
+        if marked:
+            # The UPDATE skips the signals that invalidate cached reads.
+            transaction.on_commit(lambda: caching.bump_versions('notification'))
+        return marked
+
+    class Meta:
+        # Like the Bookings indexes, plain composites rather than condition=Q(is_read=False),
+        # which MySQL cannot build; is_read is a key column instead.
+        indexes = [
+            # A photographer's unread notifications, newest first.
+            models.Index(fields=['photographer', 'is_read', '-created_at'], name='notif_photog_read_created'),
+            # Unread notifications due for escalation.
+            models.Index(fields=['is_read', 'escalate_at'], name='notif_read_escalate'),
+        ]
+
+
+class PhotographerCalendar(models.Model):
+    """The days of one year on which a photographer has an accepted booking.
+
+    booked_days is a bitmap with bit (day of year - 1) set for every booked
+    day, 46 bytes per photographer and year. See availability.py.
+    """
+    photographer = models.ForeignKey(Photographer, on_delete=models.CASCADE, related_name='calendars')
+    year = models.PositiveSmallIntegerField()
+    booked_days = models.BinaryField(max_length=46)
+
+    def __str__(self):
+        return f"{self.photographer_id} - {self.year}"
+
+    class Meta:
+        verbose_name = "Photographer Calendar"
+        verbose_name_plural = "Photographer Calendars"
+        constraints = [
+            models.UniqueConstraint(fields=['photographer', 'year'], name='unique_photographer_calendar_year'),
+        ]
+
 
 class BookingHistory(models.Model):
     client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='client_booking_history', null=True)
@@ -252,6 +412,38 @@ class JobPost(models.Model):
     class Meta:
         verbose_name = "Job Post"
         verbose_name_plural = "Job Posts"
+        indexes = [
+            # Upcoming job posts by event date, newest post first within a day.
+            models.Index(fields=['event_date', 'created_at'], name='jobpost_event_created'),
+        ]
+
+
+
+class JobPostSearchTerm(models.Model):
+    """One posting of the job post search index, see search.py."""
+    FIELD_CHOICES = [
+        ('text', 'Title and description'),
+        ('location', 'Location'),
+    ]
+
+    job_post = models.ForeignKey(JobPost, on_delete=models.CASCADE, related_name='search_terms')
+    field = models.CharField(choices=FIELD_CHOICES, max_length=10)
+    term = models.CharField(max_length=64)
+    weight = models.FloatField()
+
+    def __str__(self):
+        return f"{self.field}:{self.term} -> {self.job_post_id}"
+
+    class Meta:
+        verbose_name = "Job Post Search Term"
+        verbose_name_plural = "Job Post Search Terms"
+        constraints = [
+            models.UniqueConstraint(fields=['job_post', 'field', 'term'], name='unique_job_post_search_term'),
+        ]
+        indexes = [
+            # Highest weighted postings of a term first; prefix scans for location.
+            models.Index(fields=['field', 'term', '-weight'], name='searchterm_field_term_weight'),
+        ]
 
 
 
@@ -285,3 +477,116 @@ class WorkHistory(models.Model):
     class Meta:
         verbose_name = "Work History"
         verbose_name_plural = "Work Histories"
+        indexes = [
+            models.Index(fields=['photographer', 'start_date'], name='workhistory_photog_start'),
+        ]
+
+
+class OutboundEmail(models.Model):
+    """An email waiting in the transactional outbox.
+
+    Rows are written in the same transaction as the change that triggers
+    them and delivered later by the send_outbox_emails task.
+    """
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Sent', 'Sent'),
+        ('Dead', 'Dead'),
+    ]
+
+    to_email = models.EmailField(max_length=254)
+    from_email = models.EmailField(max_length=254)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(choices=STATUS_CHOICES, default='Pending', max_length=20)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
+
+    class Meta:
+        verbose_name = "Outbound Email"
+        verbose_name_plural = "Outbound Emails"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_attempt'),
+        ]
+
+
+class PortfolioUpload(models.Model):
+    """A portfolio file being uploaded in chunks; see uploads.py.
+
+    Chunks are written into a part file at `offset`, which only moves once
+    a chunk was written whole and matched its checksum. Finalizing moves
+    the part file into Photographer.portfolio.
+    """
+    STATUS_CHOICES = [
+        ('Uploading', 'Uploading'),
+        ('Complete', 'Complete'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    photographer = models.ForeignKey(Photographer, on_delete=models.CASCADE, related_name='portfolio_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # SHA-256 of the whole file, checked on finalize when the client sent one.
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(choices=STATUS_CHOICES, default='Uploading', max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size} bytes, {self.status})"
+
+    class Meta:
+        verbose_name = "Portfolio Upload"
+        verbose_name_plural = "Portfolio Uploads"
+        indexes = [
+            # Abandoned uploads, for the garbage collector.
+            models.Index(fields=['status', 'updated_at'], name='portfolio_upload_status_upd'),
+        ]
+
+
+class StoredBlob(models.Model):
+    """A file kept once by DeduplicatingStorage, with the number of fields pointing at it."""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    references = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.references} references)"
+
+    @classmethod
+    def add_references(cls, deltas):
+        """ Add deltas[name] to the reference count of each blob in one UPDATE.
+            Names outside the blob layout, and None, are ignored.
+        """
+        counts = Counter()
+        for name, delta in deltas:
+            if is_blob(name):
+                counts[name] += delta
+        counts = {name: delta for name, delta in counts.items() if delta}
+        if not counts:
+            return
+        cls.objects.filter(name__in=counts).update(
+            references=F('references') + Case(
+                *[When(name=name, then=Value(delta)) for name, delta in counts.items()],
+                output_field=models.IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+
+    class Meta:
+        verbose_name = "Stored Blob"
+        verbose_name_plural = "Stored Blobs"
+        indexes = [
+            # Unreferenced blobs, for the sweep.
+            models.Index(fields=['references', 'updated_at'], name='storedblob_refs_updated'),
+        ]
@@ -0,0 +1,157 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.request import Request
+
+from .querysets import narrow
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination that seeks on the primary key.
+
+    The id is unique and always indexed, so every page is a
+    `WHERE id < <cursor> ORDER BY id DESC LIMIT n` query and deep pages
+    cost the same as the first one. Cursors are opaque, base64 encoded
+    positions generated by DRF.
+
+    paginate_queryset is DRF's, split around the query so that
+    apaginate_queryset can run the same steps with the async ORM.
+    """
+    ordering = '-id'
+    page_size = getattr(settings, 'MYACCOUNTS_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'MYACCOUNTS_MAX_PAGE_SIZE', 100)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views; `request` is a DRF Request wrapping the Django one."""
+        queryset = self._page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._set_page([row async for row in queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        """The query for the page the cursor points at, plus one row; None when paging is off."""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        # Cursor pagination always enforces an ordering.
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # If we have a cursor with a fixed position then filter by that.
+        if current_position is not None:
+            order = self.ordering[0]
+            is_reversed = order.startswith('-')
+            order_attr = order.lstrip('-')
+
+            # Test for: (cursor reversed) XOR (queryset reversed)
+            if self.cursor.reverse != is_reversed:
+                kwargs = {order_attr + '__lt': current_position}
+            else:
+                kwargs = {order_attr + '__gt': current_position}
+
+            queryset = queryset.filter(**kwargs)
+
+        self._offset, self._reverse, self._current_position = offset, reverse, current_position
+        # The extra row tells whether a page follows this one.
+        return queryset[offset:offset + self.page_size + 1]
+
+    def _set_page(self, results):
+        """Keep the page out of the rows _page_queryset read and work out the next and previous positions."""
+        offset, reverse, current_position = self._offset, self._reverse, self._current_position
+        self.page = list(results[:self.page_size])
+
+        # Determine the position of the final item following the page.
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # The query ran in reverse, so the rows go back into display order.
+            self.page = list(reversed(self.page))
+
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+
+def paginated_response(request, queryset, serializer_class):
+    """Serialize one keyset page of `queryset` and return the paginated Response.
+
+    Only the fields requested with ?fields= or ?exclude= are loaded and rendered.
+    """
+    fields = serializer_class.requested_fields(request)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(narrow(queryset, fields), request)
+    serializer = serializer_class(page, many=True, fields=fields)
+    return paginator.get_paginated_response(serializer.data)
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+async def apaginated_response(request, queryset, serializer_class):
+    """Async counterpart of paginated_response for plain Django async views.
+
+    Returns the same next/previous/results envelope, with the same cursors.
+    """
+    fields = serializer_class.requested_fields(request)
+    paginator = KeysetPagination()
+    try:
+        page = await paginator.apaginate_queryset(narrow(queryset, fields), Request(request))
+    except NotFound as e:
+        return JsonResponse({'detail': str(e.detail)}, status=404)
+    serializer = serializer_class(page, many=True, fields=fields)
+    return JsonResponse({
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'results': serializer.data,
+    })
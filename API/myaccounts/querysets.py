@@ -0,0 +1,65 @@
+"""Querysets used by the API views.
+
+Each function returns the base queryset for one serializer with the joins
+and prefetches that serializer walks, so rendering a page costs a fixed
+number of queries however many rows it holds. Serializers that only render
+foreign keys as ids need nothing extra and keep using `Model.objects`.
+
+When a request asks for some fields only (see DynamicFieldsMixin), narrow()
+drops the joins and prefetches of the fields left out and loads only the
+columns of the fields kept.
+"""
+from .models import User, Photographer, Client
+
+# Serializer field -> (select_related, prefetch_related) it needs, per model.
+RELATED = {
+    User: {
+        # UserSerializer renders the groups and user_permissions many-to-many ids.
+        'groups': ((), ('groups',)),
+        'user_permissions': ((), ('user_permissions',)),
+    },
+    Photographer: {
+        'work_history': (('user',), ('user__photographer_work_history',)),
+    },
+    Client: {
+        'bookings': (('user',), ('user__client_bookings',)),
+        'booking_history': (('user',), ('user__client_booking_history',)),
+    },
+}
+
+
+def narrow(queryset, fields=None):
+    """Return `queryset` with the relations and columns the serializer `fields` need.
+
+    With `fields=None` every field is rendered and every relation in
+    RELATED is loaded.
+    """
+    model = queryset.model
+    related = RELATED.get(model, {})
+    if fields is not None:
+        related = {name: related[name] for name in fields if name in related}
+    select = sorted({path for paths, _ in related.values() for path in paths})
+    prefetch = sorted({path for _, paths in related.values() for path in paths})
+
+    if model in RELATED:
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+    if fields is not None:
+        concrete = {field.name for field in model._meta.concrete_fields}
+        queryset = queryset.only(model._meta.pk.name, *select, *(name for name in fields if name in concrete))
+    return queryset
+
+
+def users(fields=None):
+    return narrow(User.objects.all(), fields)
+
+
+def photographers(fields=None):
+    return narrow(Photographer.objects.all(), fields)
+
+
+def clients(fields=None):
+    return narrow(Client.objects.all(), fields)
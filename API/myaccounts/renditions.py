@@ -0,0 +1,95 @@
+"""Resized, EXIF-free renditions of profile images.
+
+Profile.image keeps the upload as it came. Once the upload commits, the
+generate_profile_renditions task renders every size in RENDITIONS as JPEG
+and WebP, with the EXIF orientation applied and all metadata dropped. It
+then records their storage names in Profile.image_renditions:
+
+    {'small': {'jpeg': 'profile_images/renditions/7/3f2a...-small.jpg', 'webp': ...}, ...}
+
+File names embed a digest of the original, so a name never changes
+content. The rendition view can therefore let clients and proxies cache
+the files for CACHE_MAX_AGE without revalidating.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# name -> (longest side in pixels, crop to a square)
+RENDITIONS = {
+    'small': (128, True),
+    'medium': (512, True),
+    'large': (1600, False),
+}
+
+# format -> (Pillow format, file extension, content type, save options)
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 6}),
+}
+
+DIRECTORY = 'profile_images/renditions'
+CACHE_MAX_AGE = getattr(settings, 'PROFILE_RENDITION_MAX_AGE', 365 * 24 * 60 * 60)
+
+
+def render(image, size, crop, fmt):
+    """Encode `image` at `size` in `fmt` and return the bytes."""
+    if crop:
+        image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+    pillow_format, _, _, options = FORMATS[fmt]
+    if pillow_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    # Nothing is copied from the original but the pixels, so EXIF, GPS and ICC data are gone.
+    image.save(output, pillow_format, **options)
+    return output.getvalue()
+
+
+def generate(profile):
+    """Write the renditions of `profile.image` and return their storage names."""
+    with profile.image.open('rb') as f:
+        original = f.read()
+    digest = hashlib.sha256(original).hexdigest()[:16]
+    directory = f'{DIRECTORY}/{profile.pk}'
+
+    with Image.open(io.BytesIO(original)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    names = {}
+    for rendition, (size, crop) in RENDITIONS.items():
+        names[rendition] = {}
+        for fmt, (_, extension, _, _) in FORMATS.items():
+            name = f'{directory}/{digest}-{rendition}.{extension}'
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(render(image, size, crop, fmt)))
+            names[rendition][fmt] = name
+
+    return names
+
+
+def delete_stale(profile_id, names):
+    """Delete the profile's rendition files that are not in `names`."""
+    directory = f'{DIRECTORY}/{profile_id}'
+    keep = {name for formats in names.values() for name in formats.values()}
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for file in files:
+        if f'{directory}/{file}' not in keep:
+            default_storage.delete(f'{directory}/{file}')
+
+
+def content_type(name):
+    for _, extension, mime, _ in FORMATS.values():
+        if name.endswith(f'.{extension}'):
+            return mime
+    return None
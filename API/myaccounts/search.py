@@ -0,0 +1,143 @@
+"""Full-text search over job posts.
+
+The index is an inverted index stored in JobPostSearchTerm. Each job post
+has one row per distinct term, split into a 'text' field (title and
+description) and a 'location' field. Title terms weigh more than
+description terms. The signal handlers in signals.py re-index a post when
+it is saved, and its postings are deleted with it through the foreign key.
+
+A query reads a bounded number of postings through the (field, term,
+-weight) index: the best postings of its rarest term, then the weights of
+its other terms for those candidates only. Its cost therefore does not
+grow with the number of posts. The candidates are ranked by tf-idf.
+"""
+import math
+import re
+from collections import Counter
+
+from django.db import transaction
+
+from .models import JobPost, JobPostSearchTerm
+
+TITLE_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+
+# How many of the best postings of each query term are considered for ranking.
+CANDIDATES_PER_TERM = 1000
+# Document frequencies are counted up to this cap, beyond which a term is just "common".
+DF_CAP = 10000
+
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from in is it of on or the to with'.split()
+)
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Lowercase `text` and split it into index terms."""
+    return [
+        token[:64]
+        for token in _TOKEN.findall((text or '').lower())
+        if token not in STOP_WORDS
+    ]
+
+
+def _postings(job_post):
+    text = Counter()
+    for token in tokenize(job_post.title):
+        text[token] += TITLE_WEIGHT
+    for token in tokenize(job_post.description):
+        text[token] += DESCRIPTION_WEIGHT
+
+    postings = [
+        JobPostSearchTerm(job_post_id=job_post.pk, field='text', term=term, weight=weight)
+        for term, weight in text.items()
+    ]
+    postings += [
+        JobPostSearchTerm(job_post_id=job_post.pk, field='location', term=term, weight=1.0)
+        for term in set(tokenize(job_post.location))
+    ]
+    return postings
+
+
+def index_job_posts(job_posts):
+    """Replace the postings of `job_posts` with ones built from their current values."""
+    postings = [posting for job_post in job_posts for posting in _postings(job_post)]
+    with transaction.atomic():
+        JobPostSearchTerm.objects.filter(job_post__in=[job_post.pk for job_post in job_posts]).delete()
+        JobPostSearchTerm.objects.bulk_create(postings, batch_size=1000)
+
+
+def _location_matches(prefixes, job_post_ids=None):
+    """Ids of job posts whose location has a term starting with every prefix.
+
+    Without `job_post_ids` only the newest DF_CAP posts matching each prefix
+    are considered.
+    """
+    matches = None
+    for prefix in prefixes:
+        postings = JobPostSearchTerm.objects.filter(field='location', term__startswith=prefix)
+        if job_post_ids is not None:
+            postings = postings.filter(job_post__in=job_post_ids)
+        else:
+            postings = postings.order_by('-job_post')[:DF_CAP]
+        ids = set(postings.values_list('job_post', flat=True))
+        matches = ids if matches is None else matches & ids
+    return matches
+
+
+def search_job_posts(query, location=None, limit=20):
+    """Return up to `limit` (job post id, score) pairs, best match first.
+
+    Every term of `query` must appear in the title or description, and every
+    word of `location` must start a word of the post's location.
+    """
+    if limit < 1:
+        return []
+    terms = list(dict.fromkeys(tokenize(query)))
+    prefixes = list(dict.fromkeys(tokenize(location)))
+
+    if not terms:
+        if not prefixes:
+            return []
+        ids = sorted(_location_matches(prefixes), reverse=True)[:limit]
+        return [(job_post_id, 0.0) for job_post_id in ids]
+
+    # An approximate corpus size is enough for idf; the highest id is an index lookup.
+    total = JobPost.objects.order_by('-id').values_list('id', flat=True).first() or 1
+    idf = {}
+    for term in terms:
+        df = JobPostSearchTerm.objects.filter(field='text', term=term)[:DF_CAP].count()
+        if not df:
+            return []
+        idf[term] = math.log(1 + total / df)
+
+    # Start from the best postings of the rarest term, then fetch the weights
+    # of the other terms for those candidates only.
+    rarest = max(terms, key=idf.get)
+    candidates = list(
+        JobPostSearchTerm.objects
+        .filter(field='text', term=rarest)
+        .order_by('-weight')
+        .values_list('job_post', flat=True)[:CANDIDATES_PER_TERM]
+    )
+    weights = (
+        JobPostSearchTerm.objects
+        .filter(field='text', term__in=terms, job_post__in=candidates)
+        .values_list('job_post', 'term', 'weight')
+    )
+
+    scores = Counter()
+    matched = Counter()
+    for job_post_id, term, weight in weights:
+        scores[job_post_id] += idf[term] * weight
+        matched[job_post_id] += 1
+    ids = [job_post_id for job_post_id in scores if matched[job_post_id] == len(terms)]
+
+    if prefixes:
+        allowed = _location_matches(prefixes, ids)
+        ids = [job_post_id for job_post_id in ids if job_post_id in allowed]
+
+    ids.sort(key=lambda job_post_id: (-scores[job_post_id], -job_post_id))
+    return [(job_post_id, scores[job_post_id]) for job_post_id in ids[:limit]]
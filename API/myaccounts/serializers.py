@@ -11,72 +11,153 @@ from .models import (
     WorkHistory, 
     Notification,
     Profile, 
-    ProfileSwitch
+    ProfileSwitch,
+    PortfolioUpload
 )
-from rest_framework.authtoken.models import Token
-
-class NotificationSerializer(serializers.ModelSerializer):
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError
+from django.urls import reverse
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from . import uploads
+from .utils import FilteredRefreshToken, add_role_claims
+
+class DynamicFieldsMixin:
+    """Render only some fields, chosen with the `fields` argument.
+
+    Views read the choice from the ?fields= and ?exclude= query parameters
+    with requested_fields() and narrow their queryset to match with
+    querysets.narrow().
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        """The field names ?fields= and ?exclude= select, in declaration order, or None for all."""
+        only = request.GET.get('fields')
+        exclude = request.GET.get('exclude')
+        if not only and not exclude:
+            return None
+        names = list(cls().fields)
+        if only:
+            names = [name for name in names if name in only.split(',')]
+        if exclude:
+            names = [name for name in names if name not in exclude.split(',')]
+        return names
+
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Bookings
         fields = '__all__'
 
-class ProfileSerializer(serializers.ModelSerializer):
+class BulkBookingItemSerializer(serializers.ModelSerializer):
+    """One booking of a bulk request.
+
+    The photographers are looked up once for the whole request and passed in
+    the `photographers` context entry, keyed by id.
+    """
+    photographer_profile = serializers.IntegerField()
+
+    class Meta:
+        model = Bookings
+        fields = ['photographer_profile', 'event_date', 'location', 'description']
+
+    def validate_photographer_profile(self, value):
+        photographer = self.context['photographers'].get(value)
+        if photographer is None:
+            raise serializers.ValidationError('Photographer not found.')
+        if photographer.is_suspended:
+            raise serializers.ValidationError('This photographer is not taking bookings.')
+        return photographer
+
+class ProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    image_renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = Profile
         fields = '__all__'
 
-class ProfileSwitchSerializer(serializers.ModelSerializer):
+    def get_image_renditions(self, profile):
+        """URLs of the image's renditions by size and format, served with long-lived cache headers."""
+        return {
+            rendition: {fmt: reverse('profile_image_rendition', args=[name]) for fmt, name in formats.items()}
+            for rendition, formats in profile.image_renditions.items()
+        }
+
+class ProfileSwitchSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProfileSwitch
         fields = '__all__'
 
-class JobPostSerializer(serializers.ModelSerializer):
+class JobPostSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = JobPost
         fields = '__all__'
 
-class BookingHistorySerializer(serializers.ModelSerializer):
+class BookingHistorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = BookingHistory
         fields = '__all__'
 
-class JobApplicationSerializer(serializers.ModelSerializer):
+class JobApplicationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = JobApplication
         fields = '__all__'
 
-class WorkHistorySerializer(serializers.ModelSerializer):
+class WorkHistorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = WorkHistory
         fields = '__all__'
 
-class StaffSerializer(serializers.ModelSerializer):
+class StaffSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Staff
         fields = '__all__'
 
-class PhotographerSerializer(serializers.ModelSerializer):
-    work_history = WorkHistorySerializer(many=True, required=False)
+class PhotographerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    work_history = WorkHistorySerializer(source='user.photographer_work_history', many=True, read_only=True)
 
     class Meta:
         model = Photographer
-        fields = '__all__'
+        # Private to the photographer; see the notification_unread_count view.
+        exclude = ['unread_notifications']
 
-class ClientSerializer(serializers.ModelSerializer):
-    bookings = BookingSerializer(many=True, required=False)
-    booking_history = BookingHistorySerializer(many=True, required=False)
+class ClientSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    bookings = BookingSerializer(source='user.client_bookings', many=True, read_only=True)
+    booking_history = BookingHistorySerializer(source='user.client_booking_history', many=True, read_only=True)
 
     class Meta:
         model = Client
         fields = '__all__'
 
 
-class UserSerializer(serializers.ModelSerializer):
+class PortfolioUploadSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PortfolioUpload
+        exclude = ['photographer']
+        read_only_fields = ['offset', 'status']
+
+    def validate_size(self, size):
+        if not 0 < size <= uploads.MAX_SIZE:
+            raise serializers.ValidationError(f'Portfolios must be between 1 byte and {uploads.MAX_SIZE} bytes.')
+        return size
+
+    def validate_sha256(self, sha256):
+        sha256 = sha256.lower()
+        if sha256 and (len(sha256) != 64 or set(sha256) - set('0123456789abcdef')):
+            raise serializers.ValidationError('Send the SHA-256 as 64 hex digits.')
+        return sha256
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     
     email = serializers.EmailField(max_length=80)
     username = serializers.CharField(max_length=45)
@@ -86,19 +167,25 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = '__all__'
 
-   
-    def validate(self, attrs):
-        email_exists = User.objects.filter(email=attrs["email"]).exists()
-        if email_exists:
-            raise serializers.ValidationError("Email has already been used")
-        return attrs
 
     def create(self, validated_data):
-        password = validated_data.pop("password")
-        user=super().create(validated_data)
-        
-        user.set_password(password)
-        user.save()
-
-        Token.objects.create(user=user)
-        return user
+        # Hash before the INSERT so the user is written once, and let the
+        # unique indexes on email and username catch duplicates.
+        validated_data["password"] = make_password(validated_data["password"])
+        try:
+            return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError("Email or username has already been used")
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Issues token pairs carrying the user's role claims (see utils.add_role_claims)."""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_role_claims(super().get_token(user), user)
+
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    """Checks the refresh token against the blacklist through the Bloom filter in blacklist.py."""
+    token_class = FilteredRefreshToken
@@ -1,27 +1,169 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models import F
 from django.dispatch import receiver
-from .models import Notification, User, Profile, Bookings
-from .task import start_booking_timer
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .models import (
+    Notification, User, Profile, Staff, Photographer, Client, WorkHistory, JobPost, JobApplication, Bookings,
+    BookingHistory, PhotographerCalendar, StoredBlob,
+)
+from . import authentication, availability, blacklist, caching, events, matching, renditions, search
+from .task import generate_profile_renditions
+from .utils import queue_email
 
 
 @receiver(post_save, sender=Notification)
 def send_notification_to_photographer(sender, instance, created, **kwargs):
     if created:
         
-        """ Send an email to the photographer """
+        """ Queue an email to the photographer in the outbox """
         subject = "New Booking Notification"
         message = f"You have a new booking request. Please log in to your account to review and respond."
-     
+        email = User.objects.filter(photographer_profile=instance.photographer_id).values_list('email', flat=True).first()
+        if email:
+            queue_email(email, subject, message)
 
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and not instance.is_read:
+        Photographer.add_unread_notifications({instance.photographer_id: 1})
+
+
+@receiver(post_save, sender=Notification)
+def push_notification(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        events.notifications_created([instance])
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_unread_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        Photographer.objects.filter(pk=instance.photographer_id, unread_notifications__gt=0).update(
+            unread_notifications=F('unread_notifications') - 1
+        )
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Profile)
+@receiver([post_save, post_delete], sender=Staff)
+@receiver([post_save, post_delete], sender=Photographer)
+@receiver([post_save, post_delete], sender=Client)
+@receiver([post_save, post_delete], sender=WorkHistory)
+@receiver([post_save, post_delete], sender=JobPost)
+@receiver([post_save, post_delete], sender=JobApplication)
+@receiver([post_save, post_delete], sender=Bookings)
+@receiver([post_save, post_delete], sender=BookingHistory)
+@receiver([post_save, post_delete], sender=Notification)
+def invalidate_cached_reads(sender, instance, **kwargs):
+    """Bump the table and row versions, so cached payloads and ETags built from them are stale."""
+    caching.bump_versions(*caching.model_namespaces(instance))
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Staff)
+@receiver([post_save, post_delete], sender=Photographer)
+@receiver([post_save, post_delete], sender=Client)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    """Drop the cached user behind CachedJWTAuthentication, which holds its role rows too."""
+    authentication.invalidate_user(instance.pk if sender is User else instance.user_id)
+
+
+@receiver(post_save, sender=JobPost)
+def index_job_post(sender, instance, raw=False, **kwargs):
+    """Keep the job post search index in step; postings are deleted with the post."""
+    if not raw:
+        search.index_job_posts([instance])
+
+
+@receiver([post_save, post_delete], sender=Photographer)
+@receiver([post_save, post_delete], sender=Bookings)
+@receiver([post_save, post_delete], sender=PhotographerCalendar)
+def mark_photographer_match_dirty(sender, instance, **kwargs):
+    photographer_id = instance.photographer_profile_id if sender is Bookings else (
+        instance.pk if sender is Photographer else instance.photographer_id
+    )
+    matching.mark_dirty(photographers=[photographer_id])
+
+
+@receiver(post_save, sender=Profile)
+@receiver([post_save, post_delete], sender=WorkHistory)
+def mark_user_match_dirty(sender, instance, **kwargs):
+    user_id = instance.user_id if sender is Profile else instance.photographer_id
+    if user_id is not None:
+        matching.mark_dirty(users=[user_id])
+
+
+@receiver([post_save, post_delete], sender=JobPost)
+def mark_job_post_match_dirty(sender, instance, **kwargs):
+    matching.mark_dirty(job_posts=[instance.pk])
+
+
+# Registered before update_availability_on_save, which records the new slot as loaded.
 @receiver(post_save, sender=Bookings)
-def create_booking_timer(sender, instance, created, **kwargs):
-    if created:
-        start_booking_timer.delay(instance.id)  # Start the 24-hour timer for the newly created booking
+def push_booking_status(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_loaded_slot', None)
+    if not created and not raw and previous is not None and previous[2] != instance.status:
+        events.booking_statuses_changed([
+            (instance.pk, instance.photographer_profile_id, instance.status, instance.reason_for_denial),
+        ])
 
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """Signal handler to create a Profile instance for every new User created."""
-    if created:
-        if instance.user_type in [2, 3]:  # Photographer or Client
-            Profile.objects.create(user=instance, profile_type=instance.user_type)
\ No newline at end of file
+@receiver(post_save, sender=Bookings)
+def update_availability_on_save(sender, instance, raw=False, **kwargs):
+    """Refresh the calendar days an accepted booking was moved off or onto."""
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_slot', None)
+    current = instance.calendar_slot()
+    if previous != current:
+        for photographer_id, day, booking_status in {previous, current} - {None}:
+            if booking_status == 'Accepted':
+                availability.refresh_day(photographer_id, day)
+    instance._loaded_slot = current
+
+
+@receiver(post_delete, sender=Bookings)
+def update_availability_on_delete(sender, instance, **kwargs):
+    photographer_id, day, booking_status = instance.calendar_slot()
+    if booking_status == 'Accepted':
+        availability.refresh_day(photographer_id, day)
+
+
+STORED_FILE_FIELDS = {Profile: 'image', Photographer: 'portfolio'}
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_save, sender=Photographer)
+def track_stored_file(sender, instance, raw=False, **kwargs):
+    """Move the blob reference to the new file when an image or portfolio is replaced."""
+    name = getattr(instance, STORED_FILE_FIELDS[sender]).name or None
+    loaded = getattr(instance, '_loaded_file', None)
+    if raw or name == loaded:
+        return
+    instance._loaded_file = name
+    StoredBlob.add_references([(loaded, -1), (name, 1)])
+    if sender is Profile:
+        render_profile_image(instance, name)
+
+
+@receiver(post_delete, sender=Profile)
+@receiver(post_delete, sender=Photographer)
+def release_stored_file(sender, instance, **kwargs):
+    StoredBlob.add_references([(getattr(instance, STORED_FILE_FIELDS[sender]).name, -1)])
+
+
+def render_profile_image(profile, image):
+    """Queue the renditions of a newly uploaded image once it is committed."""
+    if image:
+        transaction.on_commit(lambda: generate_profile_renditions.delay(profile.pk, image))
+    elif profile.image_renditions:
+        Profile.objects.filter(pk=profile.pk).update(image_renditions={})
+        profile.image_renditions = {}
+        transaction.on_commit(lambda: renditions.delete_stale(profile.pk, {}))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        blacklist.add([instance.token.jti])
@@ -0,0 +1,108 @@
+"""Content-addressed storage for profile images and portfolios.
+
+The same avatar or portfolio archive is often uploaded many times.
+DeduplicatingStorage keeps one copy of each distinct file, named after its
+SHA-256:
+
+    blobs/3f/2a/3f2a...e9.jpg
+
+The hash is computed while the upload is written to a temporary file, so
+the content is read once. If a blob with that hash exists, the temporary
+file is dropped and the existing name is returned.
+
+Each blob has a StoredBlob row counting the Profile.image and
+Photographer.portfolio values that point at it. Signal handlers keep the
+count as those fields change; see signals.py. Storage.delete() leaves
+blobs alone, since others may share them. The sweep_unreferenced_blobs
+task deletes blobs that have had no references for BLOB_SWEEP_GRACE. The
+grace period covers the moment between a file being stored and the row
+that references it being saved.
+
+The dedupe_media command moves files stored before this layout into it.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+BLOB_DIRECTORY = 'blobs'
+
+
+def blob_name(sha256, original_name):
+    extension = os.path.splitext(original_name)[1].lower()
+    return f'{BLOB_DIRECTORY}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_DIRECTORY}/')
+
+
+class DeduplicatingStorage(FileSystemStorage):
+    """A FileSystemStorage that stores each distinct file once; see the module docstring."""
+
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the blob name in _save, so it never collides.
+        return name
+
+    def _save(self, name, content):
+        temp_directory = self.path(f'{BLOB_DIRECTORY}/tmp')
+        os.makedirs(temp_directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_directory)
+        try:
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            name = blob_name(sha256, name)
+            # The row goes first: while the sweep deletes a blob, this waits on
+            # its lock and then finds the file gone, so writes it again.
+            self._touch(name, sha256, size)
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+    def _touch(self, name, sha256, size):
+        from .models import StoredBlob
+
+        # A fresh updated_at keeps the sweep off a blob that is about to get a reference.
+        if not StoredBlob.objects.filter(name=name).update(updated_at=timezone.now()):
+            try:
+                with transaction.atomic():
+                    StoredBlob.objects.create(name=name, sha256=sha256, size=size)
+            except IntegrityError:
+                pass  # Stored concurrently by another upload of the same file.
+
+    def delete(self, name):
+        if not is_blob(name):
+            super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+
+_storage = None
+
+
+def blob_storage():
+    """The storage of Profile.image and Photographer.portfolio."""
+    global _storage
+    if _storage is None:
+        _storage = DeduplicatingStorage()
+    return _storage
@@ -1,53 +1,319 @@
+import logging
+import smtplib
 from celery import shared_task
 from datetime import timedelta
-from .models import Bookings, Notification, Photographer
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from .models import (
+    Bookings, Notification, Photographer, OutboundEmail, PortfolioUpload, Profile, StoredBlob,
+    NOTIFICATION_RESPONSE_WINDOW,
+)
+from . import blacklist, caching, events, renditions, uploads
+from .storage import blob_storage
 
+logger = logging.getLogger(__name__)
 
-def suspend_photographer(photographer_id):
-    photographer = Photographer.objects.get(id=photographer_id)
-    photographer.is_suspended = True
-    photographer.save()
+BOOKING_REVIEW_WINDOW = getattr(settings, 'BOOKING_REVIEW_WINDOW', timedelta(hours=24))
+EXPIRY_BATCH_SIZE = 500
+
+# A photographer is suspended once a notification goes unanswered this many times.
+SUSPENSION_THRESHOLD = getattr(settings, 'SUSPENSION_THRESHOLD', 3)
+ESCALATION_BATCH_SIZE = 500
+
+# Failed emails are retried with exponential backoff and dead-lettered after EMAIL_MAX_ATTEMPTS.
+EMAIL_BATCH_SIZE = 100
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BACKOFF = timedelta(minutes=1)
+# How long a claimed email stays with the worker sending it.
+EMAIL_LEASE = timedelta(minutes=10)
+
+TOKEN_PURGE_BATCH_SIZE = 1000
+
+UPLOAD_PURGE_BATCH_SIZE = 500
+
+# Unreferenced blobs are kept this long, since a stored file gets its reference only when its row saves.
+BLOB_SWEEP_GRACE = getattr(settings, 'BLOB_SWEEP_GRACE', timedelta(hours=1))
+BLOB_SWEEP_BATCH_SIZE = 500
+
+
+@shared_task
+def escalate_unanswered_notifications(batch_size=ESCALATION_BATCH_SIZE):
+    """ Count another unanswered period on every unread notification that is due,
+        then suspend the photographers who reached the threshold.
+        Each batch is one SELECT of ids and one F() UPDATE, and the suspension is
+        a single aggregate UPDATE, so the query count does not grow with the
+        number of notifications. Returns (escalated, suspended).
+    """
+    now = timezone.now()
+    due = Notification.objects.filter(is_read=False, escalate_at__lte=now)
+
+    escalated = 0
+    while True:
+        batch = list(due.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            break
+        escalated += Notification.objects.filter(id__in=batch, is_read=False).update(
+            unanswered_count=F('unanswered_count') + 1,
+            escalate_at=now + NOTIFICATION_RESPONSE_WINDOW,
+        )
+
+    over_threshold = (
+        Notification.objects
+        .filter(is_read=False)
+        .values('photographer')
+        .annotate(unanswered=Max('unanswered_count'))
+        .filter(unanswered__gte=SUSPENSION_THRESHOLD)
+        .values('photographer')
+    )
+    suspended = Photographer.objects.filter(id__in=over_threshold, is_suspended=False).update(
+        is_suspended=True,
+        suspended_at=now,
+    )
+
+    # The UPDATEs skip the signals that invalidate cached reads.
+    if escalated:
+        caching.bump_versions('notification')
+    if suspended:
+        caching.bump_versions('photographer')
+    logger.info('Escalated %d unanswered notifications, suspended %d photographers', escalated, suspended)
+    return escalated, suspended
+
+
+@shared_task
+def expire_pending_bookings(batch_size=EXPIRY_BATCH_SIZE):
+    """ Decline every pending booking that outlived the review window.
+        Runs periodically from Celery beat and works in bounded batches of
+        set-based UPDATEs, so its cost does not depend on how many bookings
+        were created since the last run. Returns the number of bookings declined.
+    """
+    cutoff = timezone.now() - BOOKING_REVIEW_WINDOW
+    expired = Bookings.objects.filter(status='Pending', created_at__lt=cutoff)
+
+    reason = 'Review period expired'
+    declined = 0
+    while True:
+        batch = dict(expired.order_by('id').values_list('id', 'photographer_profile_id')[:batch_size])
+        if not batch:
+            break
+        # Re-check the status so a booking reviewed meanwhile is left alone.
+        updated = Bookings.objects.filter(id__in=batch, status='Pending').update(
+            status='Denied',
+            reason_for_denial=reason,
+        )
+        if updated < len(batch):
+            batch = dict(
+                Bookings.objects.filter(id__in=batch, status='Denied', reason_for_denial=reason)
+                .values_list('id', 'photographer_profile_id')
+            )
+        declined += updated
+        # The UPDATE skips the signals that invalidate cached reads and push status changes.
+        caching.bump_versions(*(f'bookings:{booking_id}' for booking_id in batch))
+        events.booking_statuses_changed([
+            (booking_id, photographer_id, 'Denied', reason) for booking_id, photographer_id in batch.items()
+        ])
+
+    if declined:
+        caching.bump_versions('bookings')
+    logger.info('Declined %d expired pending bookings', declined)
+    return declined
+
+
+def _deliver_outbox_batch(connection, batch_size):
+    """ Claim one batch of due emails, send it over `connection` and record the outcome.
+        The claim only pushes next_attempt_at past the lease, so no lock is
+        held while talking to the mail server and rows of a worker that dies
+        mid-batch come due again once the lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='Pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in batch]).update(next_attempt_at=now + EMAIL_LEASE)
+
+    for sent, email in enumerate(batch):
+        message = EmailMessage(email.subject, email.body, email.from_email, [email.to_email], connection=connection)
+        try:
+            message.send()
+        except Exception as e:
+            attempts = email.attempts + 1
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                attempts=attempts,
+                last_error=str(e),
+                status='Dead' if attempts >= EMAIL_MAX_ATTEMPTS else 'Pending',
+                next_attempt_at=now + EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1),
+            )
+            if isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                # The server refused this message; the connection is fine.
+                continue
+            try:
+                connection.close()
+                connection.open()
+            except Exception:
+                # Still unreachable: hand the rest back instead of failing each one.
+                logger.exception('Mail server unreachable, releasing %d claimed emails', len(batch) - sent - 1)
+                OutboundEmail.objects.filter(pk__in=[email.pk for email in batch[sent + 1:]]).update(next_attempt_at=now)
+                return sent + 1
+        else:
+            OutboundEmail.objects.filter(pk=email.pk).update(
+                attempts=email.attempts + 1, status='Sent', sent_at=timezone.now(),
+            )
+    return len(batch)
 
 
 @shared_task
-def start_notification_timer(notification_id):
-    notification = Notification.objects.get(id=notification_id)
-    """ Start the 24-hour timer for this notification
-        Use Celery to schedule the task after 24 hours
+def send_outbox_emails(batch_size=EMAIL_BATCH_SIZE):
+    """ Drain the email outbox in batches over one reused mail connection.
+        Triggered after each commit that queues an email and periodically from
+        Celery beat to pick up retries. Returns the number of emails processed.
     """
-    check_response.delay(notification_id)
+    processed = 0
+    with get_connection() as connection:
+        while True:
+            delivered = _deliver_outbox_batch(connection, batch_size)
+            processed += delivered
+            if delivered < batch_size:
+                break
+    return processed
+
+
+@shared_task
+def notify_photographers_of_bookings(booking_ids):
+    """ Email each photographer with new requests among `booking_ids` once.
+        Queued once per bulk booking request instead of once per booking; the
+        emails go through the outbox like every other. Returns the number queued.
+    """
+    requests_by_email = (
+        Bookings.objects
+        .filter(id__in=booking_ids)
+        .values_list('photographer_profile__user__email')
+        .annotate(requests=Count('id'))
+        .order_by()
+    )
+    from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'from@example.com')
+    emails = OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            to_email=email,
+            from_email=from_email,
+            subject="New Booking Notification",
+            body=f"You have {requests} new booking request{'s' if requests > 1 else ''}. "
+                 "Please log in to your account to review and respond.",
+        )
+        for email, requests in requests_by_email
+        if email
+    ])
+    send_outbox_emails()
+    return len(emails)
+
 
 @shared_task
-def check_response(notification_id):
-    notification = Notification.objects.get(id=notification_id)
-    if not notification.is_read:
-        notification.unanswered_count += 1
-        notification.save()
+def purge_expired_tokens(batch_size=TOKEN_PURGE_BATCH_SIZE):
+    """ Delete expired outstanding tokens and their blacklist entries, then
+        rebuild the blacklist filter so it only holds live entries.
+        Expired tokens fail signature checks on their own, so their rows are
+        dead weight. Walks the table once in id order, one bounded batch per
+        DELETE. Returns (outstanding tokens purged, blacklist entries purged).
+    """
+    now = timezone.now()
+    purged = unblacklisted = 0
+    last_id = 0
+    while True:
+        batch = list(
+            OutstandingToken.objects
+            .filter(id__gt=last_id, expires_at__lt=now)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1]
+        with transaction.atomic():
+            unblacklisted += BlacklistedToken.objects.filter(token_id__in=batch).delete()[0]
+            purged += OutstandingToken.objects.filter(id__in=batch).delete()[0]
 
-        if notification.unanswered_count >= 3:
-            """ Call management command to suspend the photographer """
-            suspend_photographer(notification.photographer)
+    if unblacklisted:
+        blacklist.rebuild()
+    logger.info('Purged %d expired tokens and %d blacklist entries; %s', purged, unblacklisted, blacklist.metrics())
+    return purged, unblacklisted
 
 
+@shared_task
+def generate_profile_renditions(profile_id, image_name):
+    """ Render and record the renditions of a newly uploaded profile image.
+        Queued once the upload commits, so the request never waits for Pillow.
+        Does nothing when the profile got another image meanwhile; the task
+        queued for that image renders it. Returns the rendition names.
+    """
+    profile = Profile.objects.filter(pk=profile_id, image=image_name).first()
+    if profile is None:
+        return None
+    names = renditions.generate(profile)
+    if not Profile.objects.filter(pk=profile_id, image=image_name).update(image_renditions=names):
+        return None
+    renditions.delete_stale(profile_id, names)
+    # The UPDATE skips the signals that invalidate cached reads.
+    caching.bump_versions(*caching.model_namespaces(profile))
+    logger.info('Rendered %d images for profile %d', len(names) * len(renditions.FORMATS), profile_id)
+    return names
 
-# Update the suspend_booking function to automatically decline the booking
-def decline_booking(booking_id):
-    booking = Bookings.objects.get(id=booking_id)
-    booking.status = 'Denied'
-    booking.reason_for_denial = '24-hour review period expired'
-    booking.save()
 
 @shared_task
-def start_booking_timer(booking_id):
-    booking = Bookings.objects.get(id=booking_id)
-    """ Start the 24-hour timer for this booking
-        Use Celery to schedule the task after 24 hours
+def purge_abandoned_portfolio_uploads(batch_size=UPLOAD_PURGE_BATCH_SIZE):
+    """ Delete the portfolio uploads nobody wrote to for PORTFOLIO_UPLOAD_TTL,
+        with their part files. Returns the number of uploads deleted.
     """
-    check_booking_response.delay(booking_id)
+    cutoff = timezone.now() - uploads.UPLOAD_TTL
+    abandoned = PortfolioUpload.objects.filter(status='Uploading', updated_at__lt=cutoff)
+
+    purged = 0
+    while True:
+        batch = list(abandoned.order_by('updated_at').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            break
+        # Rows go first; a part file without its row is never written again.
+        # Re-check the age so an upload resumed meanwhile is left alone.
+        purged += PortfolioUpload.objects.filter(id__in=batch, updated_at__lt=cutoff).delete()[0]
+        remaining = set(PortfolioUpload.objects.filter(id__in=batch).values_list('id', flat=True))
+        for upload_id in set(batch) - remaining:
+            uploads.delete_part_file(upload_id)
+        if remaining == set(batch):
+            break
+
+    logger.info('Purged %d abandoned portfolio uploads', purged)
+    return purged
+
 
 @shared_task
-def check_booking_response(booking_id):
-    booking = Bookings.objects.get(id=booking_id)
-    if booking.status == 'Pending' and not booking.is_within_24_hours():
-        """ Automatically decline the booking if no response within 24 hours """
-        decline_booking(booking_id)
+def sweep_unreferenced_blobs(batch_size=BLOB_SWEEP_BATCH_SIZE):
+    """ Delete the stored blobs nothing referenced for BLOB_SWEEP_GRACE,
+        with their files. Returns the number of blobs deleted.
+    """
+    cutoff = timezone.now() - BLOB_SWEEP_GRACE
+    unreferenced = StoredBlob.objects.filter(references__lte=0, updated_at__lt=cutoff)
+    storage = blob_storage()
+
+    swept = 0
+    while True:
+        batch = dict(unreferenced.order_by('updated_at').values_list('id', 'name')[:batch_size])
+        if not batch:
+            break
+        # The files go inside the transaction: a concurrent upload of the same
+        # content waits on the deleted rows, then stores the file afresh.
+        # Re-check the conditions so a blob stored or referenced meanwhile is left alone.
+        with transaction.atomic():
+            swept += StoredBlob.objects.filter(id__in=batch, references__lte=0, updated_at__lt=cutoff).delete()[0]
+            remaining = set(StoredBlob.objects.filter(id__in=batch).values_list('id', flat=True))
+            for blob_id in batch.keys() - remaining:
+                storage.delete_blob(batch[blob_id])
+        if remaining == batch.keys():
+            break
+
+    logger.info('Swept %d unreferenced blobs', swept)
+    return swept
@@ -1,2 +1,1598 @@
+import hashlib
+import io
+import json
+import os
+import resource
+import smtplib
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlparse
+from unittest import mock, skipUnless
 
+import numpy as np
+from asgiref.sync import sync_to_async
+from PIL import Image
 
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from Django.celery import app as celery_app
+
+from . import authentication, availability, blacklist, caching, events, matching, uploads
+from .storage import blob_storage, is_blob
+from .models import (
+    User, Staff, Photographer, Client, Profile, WorkHistory, Bookings, BookingHistory, Notification, JobPost,
+    OutboundEmail, ProfileSwitch, JobPostSearchTerm, JobApplication, PhotographerCalendar, PortfolioUpload, StoredBlob,
+)
+from .pagination import KeysetPagination
+from .task import (
+    EMAIL_MAX_ATTEMPTS, escalate_unanswered_notifications, expire_pending_bookings,
+    generate_profile_renditions, notify_photographers_of_bookings, purge_abandoned_portfolio_uploads,
+    purge_expired_tokens, send_outbox_emails, sweep_unreferenced_blobs,
+)
+from .utils import queue_email, tokens_for_user
+
+# A scratch Redis database for the tests of the Redis-backed code paths, e.g. redis://localhost:6379/15.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+
+def seed_users(total, user_type):
+    """Bring the number of users of `user_type` up to `total`.
+
+    Rows are bulk inserted, so User.save() is bypassed and the Staff,
+    Photographer or Client rows and the Profile rows are created here.
+    """
+    existing = User.objects.filter(user_type=user_type).count()
+    start = User.objects.count()
+    users = User.objects.bulk_create([
+        User(
+            email=f'seed{start + i}@example.com',
+            username=f'seed{start + i}',
+            password='!',
+            user_type=user_type,
+        )
+        for i in range(total - existing)
+    ])
+    users = list(User.objects.filter(username__in=[user.username for user in users]))
+    if user_type == 1:
+        Staff.objects.bulk_create([Staff(user=user) for user in users])
+        return users
+    Profile.objects.bulk_create([Profile(user=user, profile_type=user_type) for user in users])
+    if user_type == 2:
+        Photographer.objects.bulk_create([Photographer(user=user) for user in users])
+    elif user_type == 3:
+        Client.objects.bulk_create([Client(user=user) for user in users])
+    return users
+
+
+def seed_photographers(total):
+    users = seed_users(total, 2)
+    WorkHistory.objects.bulk_create([
+        WorkHistory(photographer=user, position=position)
+        for user in users
+        for position in ('Assistant', 'Lead')
+    ])
+
+
+def seed_clients(total):
+    users = seed_users(total, 3)
+    if not users:
+        return
+    if not Photographer.objects.exists():
+        seed_users(1, 2)
+    photographer = Photographer.objects.select_related('user').first()
+    bookings = Bookings.objects.bulk_create([
+        Bookings(
+            client=user,
+            client_profile=user.client_profile,
+            photographer=photographer.user,
+            photographer_profile=photographer,
+            event_date='2030-01-01',
+            location='Lagos',
+            description='Wedding',
+        )
+        for user in User.objects.filter(pk__in=[user.pk for user in users]).select_related('client_profile')
+    ])
+    bookings = Bookings.objects.filter(client__in=users)
+    BookingHistory.objects.bulk_create([BookingHistory(client_id=booking.client_id, booking=booking) for booking in bookings])
+
+
+class QueryBudgetMixin:
+    """Fail when an endpoint runs more queries than its declared budget.
+
+    The endpoint is requested at every size in `row_counts`, each time with
+    the largest page the paginator allows, so an N+1 in the serializer shows
+    up as a budget overrun long before it reaches production. The cache is
+    cleared first so the budget always measures the database path.
+    """
+    row_counts = (10, 100, 1000)
+
+    def assertQueryBudget(self, url, budget, seed):
+        for rows in self.row_counts:
+            seed(rows)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {'page_size': KeysetPagination.max_page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(
+                len(queries), budget,
+                f'{url} ran {len(queries)} queries at {rows} rows (budget {budget}):\n'
+                + '\n'.join(query['sql'] for query in queries.captured_queries),
+            )
+
+
+class ListQueryBudgetTests(QueryBudgetMixin, APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='staff@example.com', username='staff', password='password123')
+        self.client.force_authenticate(self.user)
+
+    def test_get_all_users(self):
+        self.assertQueryBudget(reverse('get_all_users'), 3, lambda rows: seed_users(rows, 1))
+
+    def test_get_all_photographers(self):
+        self.assertQueryBudget(reverse('get_all_photographers'), 2, seed_photographers)
+
+    def test_get_all_clients(self):
+        self.assertQueryBudget(reverse('get_all_clients'), 3, seed_clients)
+
+    def test_photographer_detail(self):
+        seed_photographers(1)
+        photographer = User.objects.filter(user_type=2).first()
+        url = reverse('photographer_detail', args=[photographer.pk])
+        self.assertQueryBudget(url, 3, seed_photographers)
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        seed_clients(1)
+        client = Client.objects.select_related('user').first()
+        self.client.force_authenticate(client.user)
+        # Identical dates everywhere, so only the id tells the posts apart.
+        JobPost.objects.bulk_create([
+            JobPost(
+                client=client.user, client_profile=client, title='Wedding', description='Wedding',
+                location='Lagos', event_date=date(2030, 1, 1),
+            )
+            for _ in range(5)
+        ])
+        JobPost.objects.update(created_at=timezone.now())
+        self.ids = list(JobPost.objects.order_by('-id').values_list('id', flat=True))
+
+    def page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'next', 'previous', 'results'})
+        return [row['id'] for row in response.data['results']], response.data['next'], response.data['previous']
+
+    def test_cursors_walk_forward_and_back_newest_first(self):
+        first, next_url, previous_url = self.page(reverse('all_job_posts'), {'page_size': 2})
+        self.assertIsNone(previous_url)
+        second, next_url, _ = self.page(next_url)
+        third, last_next, previous_url = self.page(next_url)
+        self.assertIsNone(last_next)
+        # Every post once, in id order despite the tied dates.
+        self.assertEqual(first + second + third, self.ids)
+
+        back, _, previous_url = self.page(previous_url)
+        self.assertEqual(back, second)
+        self.assertEqual(self.page(previous_url)[0], first)
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 3):
+            results, next_url, _ = self.page(reverse('all_job_posts'), {'page_size': 1000})
+        self.assertEqual(results, self.ids[:3])
+        self.assertIsNotNone(next_url)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReadThroughCacheTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='photo@example.com', username='photo', password='password123', user_type=2)
+        self.client.force_authenticate(self.user)
+
+    def test_profile_detail_is_served_from_cache_until_saved(self):
+        profile = Profile.objects.get(user=self.user)
+        url = reverse('profile_detail', args=[profile.pk])
+        self.assertEqual(self.client.get(url).data['location'], None)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(len(queries), 0)
+
+        profile.location = 'Abuja'
+        profile.save()
+        self.assertEqual(self.client.get(url).data['location'], 'Abuja')
+
+    def test_photographer_directory_is_invalidated_by_work_history(self):
+        url = reverse('get_all_photographers')
+        self.assertEqual(self.client.get(url).data['results'][0]['work_history'], [])
+
+        WorkHistory.objects.create(photographer=self.user, position='Lead')
+        self.assertEqual(len(self.client.get(url).data['results'][0]['work_history']), 1)
+
+    def test_waiters_reuse_the_lock_holders_result(self):
+        entry = caching.entry_key(['profile'], 'stampede')
+        cache.add(f'{entry}:lock', 1)
+
+        # Another worker holds the lock and stores its result while we wait.
+        with mock.patch.object(caching.time, 'sleep', lambda seconds: cache.set(entry, 'built elsewhere')):
+            value = caching.read_through(['profile'], 'stampede', mock.Mock(side_effect=AssertionError))
+        self.assertEqual(value, 'built elsewhere')
+
+
+class AccessPatternIndexTests(APITestCase):
+    """The planner should pick the composite indexes from 0002 for the real access patterns."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_photographers(20)
+        seed_clients(20)
+        cls.photographer = Photographer.objects.select_related('user').first()
+        client = Client.objects.first()
+        bookings = Bookings.objects.bulk_create([
+            Bookings(
+                client=client.user,
+                client_profile=client,
+                photographer=photographer.user,
+                photographer_profile=photographer,
+                event_date=date(2030, 1, 1) + timedelta(days=day),
+                location='Lagos',
+                description='Shoot',
+                status=status,
+            )
+            for photographer in Photographer.objects.select_related('user')
+            for day, status in enumerate(['Pending', 'Accepted', 'Denied'] * 5)
+        ])
+        bookings = list(Bookings.objects.all())
+        Notification.objects.bulk_create([
+            Notification(photographer_id=booking.photographer_profile_id, booking=booking, is_read=booking.pk % 2 == 0)
+            for booking in bookings
+        ])
+        JobPost.objects.bulk_create([
+            JobPost(
+                client=client.user,
+                client_profile=client,
+                title=f'Job {i}',
+                description='Event',
+                location='Lagos',
+                event_date=date(2030, 1, 1) + timedelta(days=i % 365),
+            )
+            for i in range(500)
+        ])
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_pending_bookings_by_date(self):
+        queryset = Bookings.objects.filter(photographer_profile=self.photographer, status='Pending').order_by('event_date')
+        self.assertUsesIndex(queryset, 'booking_photog_status_date')
+
+    def test_unread_notifications_newest_first(self):
+        # is_read=False compiles to `NOT is_read` on SQLite, which it cannot seek on.
+        # MySQL compiles it to `is_read = 0`; __in gives the same predicate everywhere.
+        queryset = Notification.objects.filter(photographer=self.photographer, is_read__in=[False]).order_by('-created_at')
+        self.assertUsesIndex(queryset, 'notif_photog_read_created')
+
+    def test_upcoming_job_posts(self):
+        queryset = JobPost.objects.filter(event_date__gte=date(2030, 12, 1)).order_by('event_date', 'created_at')
+        self.assertUsesIndex(queryset, 'jobpost_event_created')
+
+    def test_work_history_by_start_date(self):
+        queryset = WorkHistory.objects.filter(photographer=self.photographer.user).order_by('start_date')
+        self.assertUsesIndex(queryset, 'workhistory_photog_start')
+
+
+class CeleryBeatTests(SimpleTestCase):
+
+    def test_scheduled_tasks_are_discovered(self):
+        celery_app.loader.import_default_modules()
+        self.assertIn('myaccounts.task', celery_app.loader.task_modules)
+        for entry in celery_app.conf.beat_schedule.values():
+            self.assertIn(entry['task'], celery_app.tasks)
+
+
+class ExpirePendingBookingsTests(APITestCase):
+
+    def test_declines_only_pending_bookings_past_the_review_window(self):
+        seed_clients(3)
+        client = Client.objects.select_related('user').first()
+        photographer = Photographer.objects.select_related('user').first()
+        Bookings.objects.all().delete()
+        old, fresh, accepted = Bookings.objects.bulk_create([
+            Bookings(
+                client=client.user,
+                client_profile=client,
+                photographer=photographer.user,
+                photographer_profile=photographer,
+                event_date=date(2030, 1, 1),
+                location='Lagos',
+                description='Shoot',
+                status=status,
+            )
+            for status in ('Pending', 'Pending', 'Accepted')
+        ])
+        Bookings.objects.exclude(pk=fresh.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(expire_pending_bookings(batch_size=1), 1)
+        self.assertEqual(
+            dict(Bookings.objects.values_list('pk', 'status')),
+            {old.pk: 'Denied', fresh.pk: 'Pending', accepted.pk: 'Accepted'},
+        )
+
+
+class EscalateUnansweredNotificationsTests(APITestCase):
+
+    def test_escalates_due_notifications_and_suspends_in_bulk(self):
+        seed_clients(2)
+        seed_photographers(3)
+        client = Client.objects.select_related('user').first()
+        photographers = list(Photographer.objects.select_related('user')[:3])
+        Notification.objects.bulk_create([
+            Notification(
+                photographer=photographer,
+                booking=Bookings.objects.create(
+                    client=client.user,
+                    client_profile=client,
+                    photographer=photographer.user,
+                    photographer_profile=photographer,
+                    event_date=date(2030, 1, 1),
+                    location='Lagos',
+                    description='Shoot',
+                ),
+                is_read=is_read,
+                unanswered_count=2,
+                escalate_at=timezone.now() - timedelta(minutes=1),
+            )
+            for photographer, is_read in zip(photographers, (False, True, False))
+        ])
+        Notification.objects.filter(photographer=photographers[2]).update(escalate_at=timezone.now() + timedelta(hours=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(escalate_unanswered_notifications(), (1, 1))
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(
+            list(Photographer.objects.filter(is_suspended=True).values_list('pk', flat=True)),
+            [photographers[0].pk],
+        )
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxTests(APITestCase):
+
+    def test_queued_emails_are_sent_in_one_batch_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for i in range(3):
+                queue_email(f'user{i}@example.com', 'Hello', 'Body')
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(send_outbox_emails(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutboundEmail.objects.filter(status='Sent').count(), 3)
+        self.assertEqual(send_outbox_emails(), 0)
+
+    def test_failed_emails_back_off_and_are_dead_lettered(self):
+        email = queue_email('user@example.com', 'Hello', 'Body')
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            for attempt in range(1, EMAIL_MAX_ATTEMPTS + 1):
+                OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+                send_outbox_emails()
+                email.refresh_from_db()
+                self.assertEqual(email.attempts, attempt)
+
+        self.assertEqual(email.status, 'Dead')
+        self.assertEqual(email.last_error, 'down')
+        self.assertEqual(mail.outbox, [])
+
+    def test_emails_are_sent_outside_the_claiming_transaction(self):
+        for i in range(3):
+            queue_email(f'user{i}@example.com', 'Hello', 'Body')
+        # APITestCase runs each test in a transaction; a claim still open would add a savepoint.
+        outside = list(connection.savepoint_ids)
+        savepoints = []
+        claimable = []
+
+        def send_messages(messages):
+            savepoints.append(list(connection.savepoint_ids))
+            claimable.append(OutboundEmail.objects.filter(next_attempt_at__lte=timezone.now()).count())
+            return len(messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=send_messages):
+            self.assertEqual(send_outbox_emails(), 3)
+        self.assertEqual(savepoints, [outside] * 3)
+        # The whole batch is leased before the first one goes out.
+        self.assertEqual(claimable, [0, 0, 0])
+        self.assertEqual(OutboundEmail.objects.filter(status='Sent', attempts=1).count(), 3)
+
+    def test_a_dropped_connection_is_reopened(self):
+        emails = [queue_email(f'user{i}@example.com', 'Hello', 'Body') for i in range(3)]
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=[smtplib.SMTPServerDisconnected('gone'), 1, 1]), \
+                mock.patch('django.core.mail.backends.locmem.EmailBackend.open') as open_connection:
+            self.assertEqual(send_outbox_emails(), 3)
+        self.assertEqual(open_connection.call_count, 2)
+        self.assertEqual(
+            list(OutboundEmail.objects.order_by('pk').values_list('status', 'attempts')),
+            [('Pending', 1), ('Sent', 1), ('Sent', 1)],
+        )
+        self.assertEqual(emails[0].pk, OutboundEmail.objects.filter(status='Pending').get().pk)
+
+    def test_an_unreachable_server_releases_the_rest_of_the_batch(self):
+        for i in range(3):
+            queue_email(f'user{i}@example.com', 'Hello', 'Body')
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=smtplib.SMTPServerDisconnected('gone')), \
+                mock.patch('django.core.mail.backends.locmem.EmailBackend.open',
+                           side_effect=[None, ConnectionRefusedError()]):
+            self.assertEqual(send_outbox_emails(), 1)
+        self.assertEqual(
+            list(OutboundEmail.objects.order_by('pk').values_list('attempts', flat=True)), [1, 0, 0],
+        )
+        self.assertEqual(OutboundEmail.objects.filter(next_attempt_at__lte=timezone.now()).count(), 2)
+
+    def switch_profile(self, user):
+        self.client.force_authenticate(user)
+        with mock.patch('myaccounts.views.generate_verification_token', return_value='token'):
+            return self.client.post(reverse('profile-switch'), {'selected_profile': 'client'})
+
+    def test_profile_switch_email_commits_with_the_switch_row(self):
+        user = User.objects.create_user(email='photo@example.com', username='photo', password='password123', user_type=2)
+        profile = Profile.objects.get(user=user)
+        ProfileSwitch.objects.create(user=user, current_profile=profile, intended_profile=profile)
+
+        self.assertEqual(self.switch_profile(user).status_code, 200)
+        self.assertTrue(OutboundEmail.objects.filter(to_email='photo@example.com').exists())
+        self.assertEqual(ProfileSwitch.objects.get(user=user).email_validation_token, 'token')
+
+    def test_profile_switch_email_is_not_queued_when_the_switch_write_fails(self):
+        # Without profiles, creating the ProfileSwitch row violates NOT NULL.
+        user = User.objects.create_user(email='photo@example.com', username='photo', password='password123', user_type=2)
+        self.assertEqual(self.switch_profile(user).status_code, 400)
+        self.assertFalse(OutboundEmail.objects.filter(to_email='photo@example.com').exists())
+        self.assertFalse(ProfileSwitch.objects.filter(user=user).exists())
+
+        # Nor is the token kept when queueing the email fails.
+        profile = Profile.objects.get(user=user)
+        ProfileSwitch.objects.create(user=user, current_profile=profile, intended_profile=profile)
+        with mock.patch('myaccounts.views.send_verification_email', side_effect=DatabaseError('outbox down')):
+            self.assertEqual(self.switch_profile(user).status_code, 400)
+        self.assertIsNone(ProfileSwitch.objects.get(user=user).email_validation_token)
+
+
+def double_rows(model, target):
+    """Grow `model`'s table to at least `target` rows by re-inserting it into itself."""
+    table = model._meta.db_table
+    columns = ', '.join(
+        connection.ops.quote_name(field.column)
+        for field in model._meta.concrete_fields
+        if not field.primary_key
+    )
+    with connection.cursor() as cursor:
+        while model.objects.count() < target:
+            cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}')
+
+
+@tag('slow')
+class StreamingExportTests(APITestCase):
+    """Exports a million seeded bookings; skip with `manage.py test --exclude-tag slow`."""
+    rows = 1_000_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(email='staff@example.com', username='staff', password='password123')
+        seed_clients(1)
+        double_rows(Bookings, cls.rows)
+
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+
+    def export(self, params):
+        """Request and read a whole export, returning (response, line count, growth of peak RSS in bytes)."""
+        lines = 0
+        peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        response = self.client.get(reverse('export_bookings'), params)
+        for chunk in response.streaming_content:
+            lines += chunk.count(b'\n')
+        peak_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return response, lines, (peak_after - peak_before) * 1024  # ru_maxrss is in KiB on Linux
+
+    def test_memory_stays_bounded_over_a_million_rows(self):
+        response, lines, growth = self.export({'fmt': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(lines, Bookings.objects.count() + 1)
+        self.assertGreaterEqual(lines, self.rows)
+        # Building the full export in memory would add well over 100 MB.
+        self.assertLess(growth, 32 * 1024 * 1024)
+
+
+class ExportFilterTests(APITestCase):
+
+    def setUp(self):
+        self.staff = User.objects.create_user(email='staff@example.com', username='staff', password='password123')
+        self.client.force_authenticate(self.staff)
+        seed_clients(3)
+
+    def test_filters_by_status_and_date_range(self):
+        booking = Bookings.objects.first()
+        Bookings.objects.filter(pk=booking.pk).update(status='Accepted', event_date=date(2031, 6, 1))
+
+        response = self.client.get(reverse('export_bookings'), {'status': 'Accepted', 'start': '2031-01-01', 'end': '2031-12-31'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [booking.pk])
+
+    def test_only_staff_can_export(self):
+        self.client.force_authenticate(User.objects.filter(user_type=3).first())
+        self.assertEqual(self.client.get(reverse('export_bookings')).status_code, 403)
+
+
+class JobPostSearchTests(APITestCase):
+
+    def setUp(self):
+        seed_clients(1)
+        self.client_profile = Client.objects.select_related('user').first()
+        self.client.force_authenticate(self.client_profile.user)
+
+    def post(self, title, description, location):
+        return JobPost.objects.create(
+            client=self.client_profile.user,
+            client_profile=self.client_profile,
+            title=title,
+            description=description,
+            location=location,
+            event_date=date(2030, 1, 1),
+        )
+
+    def search(self, **params):
+        response = self.client.get(reverse('search_job_posts'), params)
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.data]
+
+    def test_ranks_title_matches_above_description_matches(self):
+        in_description = self.post('Birthday party', 'Outdoor wedding style shoot', 'Lagos')
+        in_title = self.post('Wedding photographer', 'Full day coverage', 'Abuja')
+        self.post('Corporate headshots', 'Studio session', 'Lagos')
+
+        self.assertEqual(self.search(q='wedding'), [in_title.pk, in_description.pk])
+        self.assertEqual(self.search(q='wedding coverage'), [in_title.pk])
+        # A limit below 1 returns one result rather than slicing from the end.
+        self.assertEqual(self.search(q='wedding', limit=-1), [in_title.pk])
+
+    def test_location_prefix(self):
+        lagos = self.post('Wedding', 'Church ceremony', 'Lekki, Lagos')
+        self.post('Wedding', 'Beach ceremony', 'Port Harcourt')
+
+        self.assertEqual(self.search(q='wedding', location='lag'), [lagos.pk])
+        self.assertEqual(self.search(location='lek'), [lagos.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        job_post = self.post('Wedding', 'Church ceremony', 'Lagos')
+        job_post.title = 'Graduation'
+        job_post.save()
+        self.assertEqual(self.search(q='wedding'), [])
+        self.assertEqual(self.search(q='graduation'), [job_post.pk])
+
+        job_post.delete()
+        self.assertEqual(self.search(q='graduation'), [])
+        self.assertFalse(JobPostSearchTerm.objects.exists())
+
+
+class AvailabilityTests(APITestCase):
+
+    def setUp(self):
+        seed_clients(1)
+        seed_photographers(4)
+        self.client_profile = Client.objects.select_related('user').first()
+        self.photographers = list(Photographer.objects.select_related('user').order_by('id'))
+        self.client.force_authenticate(self.client_profile.user)
+
+    def book(self, photographer, day):
+        return Bookings.objects.create(
+            client=self.client_profile.user,
+            client_profile=self.client_profile,
+            photographer=photographer.user,
+            photographer_profile=photographer,
+            event_date=day,
+            location='Lagos',
+            description='Shoot',
+        )
+
+    def available(self, **params):
+        response = self.client.get(reverse('available_photographers'), params)
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.data['results']], response.data['next']
+
+    def test_calendar_follows_review_and_rescheduling(self):
+        day = date(2030, 6, 1)
+        booking = self.book(self.photographers[0], day)
+        self.assertIn(self.photographers[0].pk, self.available(date=day)[0])
+
+        booking.review_booking('Accepted')
+        self.assertNotIn(self.photographers[0].pk, self.available(date=day)[0])
+
+        booking = Bookings.objects.get(pk=booking.pk)
+        booking.event_date = date(2030, 6, 2)
+        booking.save()
+        self.assertIn(self.photographers[0].pk, self.available(date=day)[0])
+        self.assertNotIn(self.photographers[0].pk, self.available(start='2030-05-30', end='2030-06-03')[0])
+
+        booking.delete()
+        self.assertIn(self.photographers[0].pk, self.available(start='2030-05-30', end='2030-06-03')[0])
+
+    def test_cursor_pages_through_free_photographers(self):
+        day = date(2030, 6, 1)
+        self.book(self.photographers[1], day).review_booking('Accepted')
+
+        first, next_url = self.available(date=day, limit=2)
+        second = self.client.get(next_url).data['results']
+        free = first + [result['id'] for result in second]
+        self.assertEqual(free, [p.pk for p in self.photographers if p != self.photographers[1]])
+
+        # A limit below 1 still advances the cursor.
+        page, next_url = self.available(date=day, limit=0)
+        self.assertEqual(page, first[:1])
+        self.assertEqual(self.client.get(next_url).data['results'][0]['id'], first[1])
+
+    def test_bookings_are_read_under_the_calendar_lock(self):
+        day = date(2030, 6, 1)
+        with CaptureQueriesContext(connection) as queries:
+            availability.refresh_day(self.photographers[0].pk, day)
+        tables = [
+            table for query in queries.captured_queries
+            for table in (PhotographerCalendar._meta.db_table, Bookings._meta.db_table)
+            if query['sql'].startswith('SELECT') and f'FROM {connection.ops.quote_name(table)}' in query['sql']
+        ]
+        self.assertEqual(tables[:2], [PhotographerCalendar._meta.db_table, Bookings._meta.db_table])
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.book(self.photographers[0], date(2030, 1, 1)).review_booking('Accepted')
+        self.book(self.photographers[2], date(2031, 12, 31)).review_booking('Accepted')
+        incremental = {
+            (calendar.photographer_id, calendar.year): bytes(calendar.booked_days)
+            for calendar in PhotographerCalendar.objects.all()
+        }
+        PhotographerCalendar.objects.all().delete()
+
+        call_command('rebuild_availability_index', stdout=io.StringIO())
+        rebuilt = {
+            (calendar.photographer_id, calendar.year): bytes(calendar.booked_days)
+            for calendar in PhotographerCalendar.objects.all()
+        }
+        self.assertEqual(rebuilt, incremental)
+
+
+class BulkBookingTests(APITestCase):
+
+    def setUp(self):
+        seed_clients(1)
+        seed_photographers(3)
+        self.client_profile = Client.objects.select_related('user').first()
+        self.photographers = list(Photographer.objects.order_by('id'))
+        self.client.force_authenticate(self.client_profile.user, token=tokens_for_user(self.client_profile.user).access_token)
+
+    def item(self, photographer_id, **overrides):
+        return dict(
+            {'photographer_profile': photographer_id, 'event_date': '2030-06-01', 'location': 'Lagos', 'description': 'Shoot'},
+            **overrides,
+        )
+
+    def test_valid_items_are_created_and_invalid_ones_reported(self):
+        suspended = self.photographers[2]
+        suspended.is_suspended = True
+        suspended.save()
+        items = [
+            self.item(self.photographers[0].pk),
+            self.item(self.photographers[0].pk, event_date='not a date'),
+            self.item(self.photographers[1].pk),
+            self.item(suspended.pk),
+            self.item(999999),
+        ]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('bulk_create_bookings'), items, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 400, 201, 400, 400])
+        self.assertIn('event_date', response.data['results'][1]['errors'])
+        self.assertIn('photographer_profile', response.data['results'][4]['errors'])
+
+        bookings = Bookings.objects.filter(id__in=[
+            result['booking']['id'] for result in response.data['results'] if result['status'] == 201
+        ]).order_by('id')
+        self.assertEqual([booking.photographer_profile_id for booking in bookings], [p.pk for p in self.photographers[:2]])
+        self.assertEqual(
+            set(Notification.objects.values_list('booking', flat=True)),
+            set(bookings.values_list('id', flat=True)),
+        )
+        # The cache version bump, the pushed events and one follow-up task for
+        # the whole batch, which sends one email per photographer.
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(notify_photographers_of_bookings(list(bookings.values_list('id', flat=True))), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        items = [self.item(self.photographers[i % 2].pk) for i in range(40)]
+        # Photographers, then a savepoint around the bookings, the notifications
+        # and one UPDATE of the photographers' unread counters.
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('bulk_create_bookings'), items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Notification.objects.count(), 40)
+
+    def test_only_clients_can_bulk_book(self):
+        self.client.force_authenticate(self.photographers[0].user)
+        response = self.client.post(reverse('bulk_create_bookings'), [self.item(self.photographers[1].pk)], format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class SignupTests(APITestCase):
+
+    def signup(self, **overrides):
+        data = dict({
+            'email': 'new@example.com',
+            'username': 'new',
+            'password': 'password123',
+            'first_name': 'New',
+            'last_name': 'User',
+            'user_type': 2,
+        }, **overrides)
+        return self.client.post(reverse('signup'), data, format='json')
+
+    def test_signup_writes_each_row_once(self):
+        # Savepoint, then user, profile and photographer inserts, release, the
+        # outstanding refresh token insert and the read of its role claims.
+        with self.assertNumQueries(7):
+            response = self.signup()
+        self.assertEqual(response.status_code, 201)
+
+        user = User.objects.get(email='new@example.com')
+        self.assertTrue(user.check_password('password123'))
+        self.assertEqual(user.photographer_profile.profile, user.profile)
+
+    def test_duplicate_signup_is_rejected_by_the_unique_index(self):
+        self.signup()
+        with self.assertNumQueries(4):  # Savepoint, the failing user insert, rollback and release.
+            response = self.signup(username='other')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.filter(email='new@example.com').count(), 1)
+
+
+class ImportUsersTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'users.ndjson')
+        with open(self.path, 'w') as f:
+            for i in range(7):
+                f.write(json.dumps({
+                    'email': f'import{i}@example.com',
+                    'username': f'import{i}',
+                    'password': 'password123',
+                    'user_type': ['staff', 'photographer', 'client'][i % 3],
+                }) + '\n')
+            f.write(json.dumps({'email': 'bad@example.com', 'username': 'bad', 'password': 'short', 'user_type': 2}) + '\n')
+
+    def import_users(self, **options):
+        call_command('import_users', self.path, batch_size=3, workers=2, stdout=io.StringIO(), stderr=io.StringIO(), **options)
+
+    def test_imports_users_with_role_and_profile_rows(self):
+        self.import_users()
+
+        users = User.objects.filter(email__startswith='import')
+        self.assertEqual(users.count(), 7)
+        self.assertTrue(users.get(username='import1').check_password('password123'))
+        self.assertEqual(Staff.objects.filter(user__in=users).count(), 3)
+        self.assertEqual(Photographer.objects.filter(user__in=users, profile__user=F('user')).count(), 2)
+        self.assertEqual(Client.objects.filter(user__in=users, profile__user=F('user')).count(), 2)
+        self.assertFalse(User.objects.filter(email='bad@example.com').exists())
+
+    def test_resumes_after_the_last_committed_batch(self):
+        # The first batch was checkpointed; the second committed but crashed before its checkpoint.
+        with open(f'{self.path}.checkpoint', 'w') as f:
+            f.write('3')
+        User.objects.create_user(email='import3@example.com', username='import3', password='password123', user_type=1)
+
+        self.import_users()
+
+        imported = User.objects.filter(email__startswith='import').order_by('username')
+        self.assertEqual([user.username for user in imported], [f'import{i}' for i in range(3, 7)])
+        with open(f'{self.path}.checkpoint') as f:
+            self.assertEqual(f.read(), '8')
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        seed_clients(1)
+        self.user = User.objects.filter(user_type=2).first()
+        self.token = f'Bearer {AccessToken.for_user(self.user)}'
+        self.auth = {'headers': {'Authorization': self.token}}
+        authentication._local.clear()
+        client = Client.objects.select_related('user').first()
+        JobPost.objects.bulk_create([
+            JobPost(client=client.user, client_profile=client, title=f'Post {i}', description='Shoot',
+                    location='Lagos', event_date='2030-01-01')
+            for i in range(5)
+        ])
+        cache.clear()
+
+    def add_notifications(self, count):
+        photographer = Photographer.objects.get(user=self.user)
+        client = Client.objects.select_related('user').first()
+        Notification.objects.bulk_create([
+            Notification(photographer=photographer, booking=Bookings.objects.create(
+                client=client.user, client_profile=client, photographer=self.user,
+                photographer_profile=photographer, event_date=date(2030, 1, 1), location='Lagos',
+                description='Shoot',
+            ))
+            for _ in range(count)
+        ])
+
+    async def test_detail_matches_the_sync_view(self):
+        kwargs = {'id': self.user.pk}
+        response = await self.async_client.get(reverse('async_photographer_detail', kwargs=kwargs), **self.auth)
+        self.assertEqual(response.status_code, 200)
+        sync_response = await sync_to_async(self.client.get)(
+            reverse('photographer_detail', kwargs=kwargs), HTTP_AUTHORIZATION=self.token,
+        )
+        self.assertEqual(response.json(), sync_response.json())
+
+        response = await self.async_client.get(reverse('async_profile_detail', kwargs={'id': 999999}), **self.auth)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_list_pages_by_cursor(self):
+        response = await self.async_client.get(reverse('async_job_post_list'), {'page_size': 3}, **self.auth)
+        first = response.json()
+        response = await self.async_client.get(first['next'], **self.auth)
+        second = response.json()
+
+        ids = [post['id'] for post in first['results'] + second['results']]
+        expected = [pk async for pk in JobPost.objects.order_by('-id').values_list('id', flat=True)]
+        self.assertEqual(ids, expected)
+        self.assertIsNone(second['next'])
+
+    async def test_lists_match_the_sync_views(self):
+        await sync_to_async(self.add_notifications)(5)
+        # Role claims in the token, as issued at login.
+        token = f'Bearer {(await sync_to_async(tokens_for_user)(self.user)).access_token}'
+
+        for sync_name, async_name in (
+            ('job_post_list', 'async_job_post_list'),
+            ('notification-list', 'async_notification_list'),
+        ):
+            sync_url, async_url = reverse(sync_name), reverse(async_name)
+            query, pages = {'page_size': 2}, 0
+            while True:
+                pages += 1
+                response = await sync_to_async(self.client.get)(sync_url, query, HTTP_AUTHORIZATION=token)
+                expected = response.json()
+                response = await self.async_client.get(async_url, query, headers={'Authorization': token})
+                page = response.json()
+                self.assertEqual(page['results'], expected['results'])
+                for link in ('next', 'previous'):
+                    self.assertEqual(
+                        page[link] and page[link].replace(async_url, sync_url), expected[link],
+                    )
+                if expected['next'] is None:
+                    break
+                query = parse_qs(urlparse(expected['next']).query)
+            self.assertEqual(pages, 3)
+
+    async def test_notifications_are_scoped_by_the_role_claims(self):
+        client = await Client.objects.select_related('user').afirst()
+        token = f'Bearer {AccessToken.for_user(client.user)}'
+        response = await self.async_client.get(reverse('async_notification_list'), headers={'Authorization': token})
+        self.assertEqual(response.status_code, 403)
+
+    async def test_requires_a_valid_token(self):
+        response = await self.async_client.get(reverse('async_notification_list'))
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(reverse('async_notification_list'), headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(response.status_code, 401)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        authentication._local.clear()
+        self.user = User.objects.create_user(email='auth@example.com', username='auth', password='password123', user_type=2)
+        self.factory = RequestFactory()
+
+    def authenticate(self, token=None):
+        token = token or AccessToken.for_user(self.user)
+        request = self.factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = authentication.CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_warm_requests_make_no_queries(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual(user.photographer_profile.user_id, self.user.pk)
+
+        # Other processes find it in the shared cache.
+        authentication._local.clear()
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+    def test_saves_and_password_changes_invalidate_the_cached_user(self):
+        token = AccessToken.for_user(self.user)
+        self.authenticate(token)
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+        self.user.is_active = True
+        self.user.set_password('another-password')
+        self.user.save()
+        self.assertTrue(self.authenticate(token).check_password('another-password'))
+
+        photographer = self.user.photographer_profile
+        photographer.is_suspended = True
+        photographer.save()
+        self.assertTrue(self.authenticate(token).photographer_profile.is_suspended)
+
+
+class RoleClaimTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='role@example.com', username='role', password='password123', user_type=3)
+
+    def test_login_tokens_carry_role_claims(self):
+        response = self.client.post(reverse('login'), {'email': 'role@example.com', 'password': 'password123'})
+        token = AccessToken(response.data['access_token'])
+        self.assertEqual(token['user_type'], 3)
+        self.assertEqual(token['client_id'], self.user.client_profile.pk)
+        self.assertIsNone(token['photographer_id'])
+
+        response = self.client.post(reverse('token_obtain_pair'), {'email': 'role@example.com', 'password': 'password123'})
+        self.assertEqual(AccessToken(response.data['access'])['client_id'], self.user.client_profile.pk)
+
+    def test_views_read_permissions_from_the_claims(self):
+        # A photographer whose stale token still says client is treated as a client until it is rotated.
+        token = tokens_for_user(self.user).access_token
+        User.objects.filter(pk=self.user.pk).update(user_type=2)
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk), token=token)
+        with self.assertNumQueries(1):  # The job post; no user or role lookups.
+            response = self.client.get(reverse('job_post_detail', kwargs={'id': 999999}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_confirming_a_switch_changes_role_and_rotates_tokens(self):
+        old = tokens_for_user(self.user)
+        ProfileSwitch.objects.bulk_create([ProfileSwitch(
+            user=self.user, current_profile=self.user.profile, intended_profile=self.user.profile,
+            email_validation_token='token',
+        )])
+        self.client.force_authenticate(self.user, token=old.access_token)
+
+        response = self.client.get(reverse('confirm_switch_profile', args=['photographer', 'token']))
+
+        self.assertEqual(response.status_code, 200)
+        token = AccessToken(response.data['access_token'])
+        self.assertEqual(token['user_type'], 2)
+        self.assertEqual(token['photographer_id'], Photographer.objects.get(user=self.user).pk)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=old['jti']).exists())
+
+
+class TokenBlacklistTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        blacklist._filter = None
+        blacklist._counters = blacklist._Counters()
+        self.user = User.objects.create_user(email='bl@example.com', username='bl', password='password123', user_type=3)
+
+    def refresh(self, token):
+        return self.client.post(reverse('token_refresh'), {'refresh': str(token)})
+
+    def test_refresh_skips_the_blacklist_query_unless_the_filter_matches(self):
+        self.refresh(tokens_for_user(self.user))  # Loads the filter.
+        token = tokens_for_user(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('blacklistedtoken' in query['sql'] for query in queries.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_authenticate(self.user)
+            self.client.post(reverse('logout'), {'refresh_token': str(token)})
+        self.client.force_authenticate(None)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(blacklist.metrics()['confirmed'], 1)
+
+    def test_checks_are_counted_locally_and_flushed(self):
+        token = tokens_for_user(self.user)
+        with mock.patch.object(cache, 'incr') as incr:
+            for _ in range(3):
+                blacklist.is_blacklisted(token['jti'])
+        incr.assert_not_called()
+        self.assertEqual(blacklist.metrics()['checks'], 3)
+
+        with mock.patch.object(blacklist, 'METRICS_FLUSH_INTERVAL', 0):
+            blacklist.is_blacklisted(token['jti'])
+        self.assertEqual(cache.get(f'{blacklist.KEY_PREFIX}:checks'), 4)
+
+    def test_purge_drops_expired_tokens_and_rebuilds_the_filter(self):
+        expired = tokens_for_user(self.user)
+        live = tokens_for_user(self.user)
+        for token in (expired, live):
+            token.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(purge_expired_tokens(batch_size=1), (1, 1))
+
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertTrue(blacklist.get_filter().might_contain(live['jti']))
+        self.assertFalse(blacklist.get_filter().might_contain(expired['jti']))
+        self.assertEqual(blacklist.metrics()['blacklisted_tokens'], 1)
+
+    def test_local_filter_picks_up_rows_that_commit_out_of_id_order(self):
+        early, late = tokens_for_user(self.user), tokens_for_user(self.user)
+        later_id = (BlacklistedToken.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 2
+        bloom = blacklist.LocalFilter()
+        BlacklistedToken.objects.create(id=later_id, token=OutstandingToken.objects.get(jti=late['jti']))
+        bloom.add([late['jti']])
+        self.assertTrue(bloom.might_contain(late['jti']))
+
+        # The lower id commits after the higher one was loaded.
+        BlacklistedToken.objects.create(id=later_id - 1, token=OutstandingToken.objects.get(jti=early['jti']))
+        caching.bump_versions('blacklist')  # As add() does in the process that committed it.
+        self.assertTrue(bloom.might_contain(early['jti']))
+
+
+@skipUnless(REDIS_URL, 'Set REDIS_URL to run the Redis filter tests against a scratch database')
+class RedisBlacklistFilterTests(TestCase):
+
+    def setUp(self):
+        import redis
+
+        self.redis = redis.Redis.from_url(REDIS_URL)
+        self.filter = blacklist.RedisFilter(self.redis)
+        keys = [self.filter.key, self.filter.next_key, self.filter.build_key, self.filter.lock_key]
+        self.redis.delete(*keys)
+        self.addCleanup(self.redis.delete, *keys)
+        self.user = User.objects.create_user(email='bl@example.com', username='bl', password='password123', user_type=3)
+
+    def test_entries_survive_a_lost_bitmap(self):
+        token = tokens_for_user(self.user)
+        token.blacklist()
+        self.filter.rebuild()
+        self.assertTrue(self.filter.might_contain(token['jti']))
+
+        # Evicted; a new entry must not start a bitmap that holds only itself.
+        self.redis.delete(self.filter.key)
+        other = tokens_for_user(self.user)
+        other.blacklist()
+        self.filter.add([other['jti']])
+        self.assertTrue(self.filter.might_contain(token['jti']))
+        self.assertTrue(self.filter.might_contain(other['jti']))
+        self.assertTrue(self.redis.exists(self.filter.key))
+        self.assertFalse(self.filter.might_contain(tokens_for_user(self.user)['jti']))
+
+
+class SparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='staff@example.com', username='staff', password='password123')
+        self.client.force_authenticate(self.user)
+
+    def test_fields_load_and_render_only_the_requested_columns(self):
+        seed_users(5, 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('get_all_users'), {'fields': 'id,username'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'username'})
+        # No groups or permissions prefetch, and no unrequested columns.
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('password', queries.captured_queries[0]['sql'])
+
+    def test_exclude_drops_the_prefetches_of_excluded_fields(self):
+        seed_clients(3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('get_all_clients'), {'exclude': 'bookings,booking_history'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('bookings', response.data['results'][0])
+        self.assertIn('user', response.data['results'][0])
+        self.assertEqual(len(queries), 1)
+
+    def test_detail_caches_each_field_selection_separately(self):
+        seed_photographers(1)
+        photographer = User.objects.filter(user_type=2).first()
+        url = reverse('photographer_detail', args=[photographer.pk])
+        self.assertIn('email', self.client.get(url).data)
+        self.assertEqual(set(self.client.get(url, {'fields': 'id,email'}).data), {'id', 'email'})
+        self.assertIn('username', self.client.get(url).data)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='photo@example.com', username='photo', password='password123', user_type=2)
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_list_is_not_modified_without_queries(self):
+        url = reverse('notification-list')
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        seed_clients(1)
+        booking = Bookings.objects.first()
+        Notification.objects.create(photographer=booking.photographer_profile, booking=booking)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_etag_follows_its_row(self):
+        profile = Profile.objects.get(user=self.user)
+        url = reverse('profile_detail', args=[profile.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Other query strings are other payloads.
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        profile.location = 'Abuja'
+        profile.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_bulk_updates_change_the_etag(self):
+        seed_clients(1)
+        Bookings.objects.update(created_at=timezone.now() - timedelta(days=2))
+        url = reverse('booking_list')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            expire_pending_bookings()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class NotificationFeedTests(APITestCase):
+
+    def setUp(self):
+        seed_clients(1)
+        seed_photographers(2)
+        self.client_user = Client.objects.select_related('user').first().user
+        self.photographer, self.other = Photographer.objects.select_related('user').order_by('id')[:2]
+        self.client.force_authenticate(self.photographer.user, token=tokens_for_user(self.photographer.user).access_token)
+
+    def book(self, photographer, count):
+        bookings = [
+            Bookings(
+                client=self.client_user, client_profile=self.client_user.client_profile,
+                photographer=photographer.user, photographer_profile=photographer,
+                event_date='2030-06-01', location='Lagos', description='Shoot',
+            )
+            for _ in range(count)
+        ]
+        return Bookings.bulk_create_and_notify_photographers(bookings)
+
+    def unread(self):
+        return self.client.get(reverse('notification_unread_count')).data['unread']
+
+    def test_feed_is_scoped_to_the_photographer_newest_first(self):
+        self.book(self.photographer, 3)
+        self.book(self.other, 2)
+        Notification.objects.create(photographer=self.photographer, booking=Bookings.objects.first())
+
+        results = self.client.get(reverse('notification-list'), {'page_size': 2}).data
+        ids = [notification['id'] for notification in results['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        page = self.client.get(results['next']).data
+        ids += [notification['id'] for notification in page['results']]
+        self.assertEqual(set(ids), set(Notification.objects.filter(photographer=self.photographer).values_list('id', flat=True)))
+        self.assertEqual(len(ids), 4)
+
+    def test_counters_follow_creates_bulk_creates_and_mark_read(self):
+        self.book(self.photographer, 3)
+        self.book(self.other, 2)
+        Notification.objects.create(photographer=self.photographer, booking=Bookings.objects.first())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.unread(), 4)
+
+        first = Notification.objects.filter(photographer=self.photographer).order_by('id').first()
+        response = self.client.post(reverse('mark_notifications_read'), {'ids': [first.pk]}, format='json')
+        self.assertEqual(response.data['marked'], 1)
+        # Marking the same notification again changes nothing.
+        self.client.post(reverse('mark_notifications_read'), {'ids': [first.pk]}, format='json')
+        self.assertEqual(self.unread(), 3)
+
+        with self.assertNumQueries(4):  # The notifications and counter UPDATEs, inside a savepoint.
+            response = self.client.post(reverse('mark_notifications_read'), {}, format='json')
+        self.assertEqual(response.data['marked'], 3)
+        self.assertEqual(self.unread(), 0)
+        self.assertEqual(Photographer.objects.get(pk=self.other.pk).unread_notifications, 2)
+
+    def test_counter_is_left_out_of_the_photographer_directory(self):
+        self.book(self.other, 2)
+        photographers = self.client.get(reverse('get_all_photographers')).data['results']
+        self.assertTrue(photographers)
+        self.assertFalse(any('unread_notifications' in photographer for photographer in photographers))
+
+    def test_clients_have_no_feed(self):
+        self.client.force_authenticate(self.client_user, token=tokens_for_user(self.client_user).access_token)
+        self.assertEqual(self.client.get(reverse('notification-list')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('notification_unread_count')).status_code, 403)
+
+
+class EventStreamTests(TestCase):
+
+    def setUp(self):
+        seed_clients(1)
+        self.photographer = Photographer.objects.select_related('user').first()
+        self.token = str(AccessToken.for_user(self.photographer.user))
+        authentication._local.clear()
+        cache.clear()
+        events._broker = self.broker = events.LocalBroker()
+
+    def tearDown(self):
+        events._broker = None
+
+    def published(self):
+        return [event['event'] for event in self.broker.history[self.photographer.pk]]
+
+    @mock.patch('myaccounts.utils.send_outbox_emails')
+    def test_notifications_and_status_changes_are_published_on_commit(self, send_outbox_emails):
+        booking = Bookings.objects.get(photographer_profile=self.photographer)
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(photographer=self.photographer, booking=booking)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.review_booking('Accepted')
+        self.assertEqual(self.published(), ['notification', 'booking_status'])
+
+        Bookings.objects.filter(pk=booking.pk).update(status='Pending', created_at=timezone.now() - timedelta(days=2))
+        with self.captureOnCommitCallbacks(execute=True):
+            expire_pending_bookings()
+        self.assertEqual(self.broker.history[self.photographer.pk][-1]['data']['status'], 'Denied')
+
+    async def test_stream_resumes_after_the_last_event_id(self):
+        for i in range(3):
+            self.broker.publish([(self.photographer.pk, {'event': 'notification', 'data': {'id': i}})])
+
+        response = await self.async_client.get(
+            reverse('event_stream'), {'access_token': self.token}, headers={'Last-Event-ID': '1'},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        self.assertTrue((await anext(chunks)).startswith(b'id: 2\n'))
+        self.assertTrue((await anext(chunks)).startswith(b'id: 3\n'))
+
+        # Events published on another thread while connected arrive live.
+        await sync_to_async(self.broker.publish)([(self.photographer.pk, {'event': 'notification', 'data': {'id': 3}})])
+        self.assertEqual(await anext(chunks), b'id: 4\nevent: notification\ndata: {"id": 3}\n\n')
+        await chunks.aclose()
+
+    async def test_stream_is_for_photographers_only(self):
+        response = await self.async_client.get(reverse('event_stream'))
+        self.assertEqual(response.status_code, 401)
+        client = await Client.objects.select_related('user').afirst()
+        response = await self.async_client.get(reverse('event_stream'), {'access_token': str(AccessToken.for_user(client.user))})
+        self.assertEqual(response.status_code, 403)
+
+
+class ProfileImageRenditionTests(APITestCase):
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings = override_settings(MEDIA_ROOT=self.media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        self.user = User.objects.create_user(email='photo@example.com', username='photo', password='password123', user_type=2)
+        self.profile = Profile.objects.get(user=self.user)
+
+    def upload(self, color='red'):
+        # A 400x300 photo taken with the camera turned, with a GPS tag.
+        image = Image.new('RGB', (400, 300), color)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x8825] = {1: 'N'}
+        output = io.BytesIO()
+        image.save(output, 'JPEG', exif=exif)
+        self.profile.image = SimpleUploadedFile('photo.jpg', output.getvalue(), content_type='image/jpeg')
+        with mock.patch('myaccounts.signals.generate_profile_renditions') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.profile.save()
+        task.delay.assert_called_once_with(self.profile.pk, self.profile.image.name)
+        return generate_profile_renditions(self.profile.pk, self.profile.image.name)
+
+    def test_renditions_are_resized_oriented_and_stripped(self):
+        names = self.upload()
+        self.assertEqual(set(names), {'small', 'medium', 'large'})
+        with default_storage.open(names['small']['webp']) as f, Image.open(f) as small:
+            self.assertEqual((small.format, small.size), ('WEBP', (128, 128)))
+        with default_storage.open(names['large']['jpeg']) as f, Image.open(f) as large:
+            # Turned upright, so taller than wide, and without EXIF.
+            self.assertEqual(large.size, (300, 400))
+            self.assertEqual(len(large.getexif()), 0)
+
+    def test_renditions_are_exposed_and_served_with_long_lived_cache_headers(self):
+        self.upload()
+        self.client.force_authenticate(self.user)
+        data = self.client.get(reverse('profile_detail', args=[self.profile.pk])).data
+        url = data['image_renditions']['medium']['webp']
+
+        self.client.force_authenticate(None)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(reverse('profile_image_rendition', args=['profile_images/IMG_0971.JPG'])).status_code, 404)
+
+    def test_a_replaced_image_drops_the_old_renditions(self):
+        old = self.upload()
+        self.profile.refresh_from_db()
+        new = self.upload('blue')
+        self.assertNotEqual(old, new)
+        self.assertFalse(default_storage.exists(old['small']['jpeg']))
+        # The task of the replaced image does nothing.
+        self.assertIsNone(generate_profile_renditions(self.profile.pk, 'profile_images/gone.jpg'))
+
+
+class PortfolioUploadTests(APITestCase):
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings = override_settings(MEDIA_ROOT=self.media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        seed_photographers(1)
+        self.photographer = Photographer.objects.select_related('user').first()
+        self.client.force_authenticate(self.photographer.user, token=tokens_for_user(self.photographer.user).access_token)
+        self.content = os.urandom(300 * 1024)
+
+    def start(self, **overrides):
+        data = dict({'filename': 'portfolio.zip', 'size': len(self.content)}, **overrides)
+        response = self.client.post(reverse('portfolio_upload_list'), data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def send(self, upload_id, offset, chunk, checksum=None):
+        return self.client.patch(
+            reverse('portfolio_upload_detail', args=[upload_id]),
+            {'chunk': SimpleUploadedFile('chunk', chunk)},
+            format='multipart',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_UPLOAD_CHECKSUM=checksum or hashlib.sha256(chunk).hexdigest(),
+        )
+
+    def test_chunks_resume_after_a_bad_chunk_and_finalize_into_the_portfolio(self):
+        upload_id = self.start(sha256=hashlib.sha256(self.content).hexdigest())
+        first, second = self.content[:200 * 1024], self.content[200 * 1024:]
+        self.assertEqual(self.send(upload_id, 0, first).data['offset'], len(first))
+
+        # A chunk corrupted on the way is refused and the offset stays put.
+        response = self.send(upload_id, len(first), second[:-1] + b'x', hashlib.sha256(second).hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('portfolio_upload_detail', args=[upload_id])).data['offset'], len(first))
+        # So does a chunk sent for the wrong offset.
+        self.assertEqual(self.send(upload_id, 0, first).status_code, 409)
+
+        self.assertEqual(self.send(upload_id, len(first), second).data['offset'], len(self.content))
+        response = self.client.post(reverse('finalize_portfolio_upload', args=[upload_id]))
+        self.assertEqual(response.status_code, 200)
+
+        self.photographer.refresh_from_db()
+        with self.photographer.portfolio.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(os.path.exists(uploads.part_path(upload_id)))
+
+    def test_chunks_past_the_declared_size_are_refused(self):
+        upload_id = self.start(size=1024)
+        self.assertEqual(self.send(upload_id, 0, self.content[:2048]).status_code, 413)
+        self.assertEqual(self.client.post(reverse('finalize_portfolio_upload', args=[upload_id])).status_code, 409)
+
+    def test_abandoned_uploads_are_purged(self):
+        stale, fresh = self.start(), self.start()
+        PortfolioUpload.objects.filter(pk=stale).update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_abandoned_portfolio_uploads(), 1)
+        self.assertEqual(list(PortfolioUpload.objects.values_list('id', flat=True)), [uuid.UUID(fresh)])
+        self.assertFalse(os.path.exists(uploads.part_path(stale)))
+        self.assertTrue(os.path.exists(uploads.part_path(fresh)))
+
+
+@mock.patch('myaccounts.signals.generate_profile_renditions')
+class DeduplicatingStorageTests(APITestCase):
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings = override_settings(MEDIA_ROOT=self.media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        seed_photographers(2)
+        self.profiles = list(Profile.objects.filter(user__user_type=2))
+
+    def upload(self, profile, content):
+        profile.image = SimpleUploadedFile('avatar.png', content, content_type='image/png')
+        profile.save()
+        return profile.image.name
+
+    def references(self, name):
+        return StoredBlob.objects.get(name=name).references
+
+    def test_identical_uploads_share_one_blob(self, task):
+        first, second = (self.upload(profile, b'same avatar') for profile in self.profiles)
+        self.assertEqual(first, second)
+        self.assertTrue(is_blob(first))
+        self.assertEqual(self.references(first), 2)
+        self.assertEqual(StoredBlob.objects.count(), 1)
+
+        # Replacing one moves its reference; the shared file stays.
+        other = self.upload(Profile.objects.get(pk=self.profiles[0].pk), b'another avatar')
+        self.assertEqual((self.references(first), self.references(other)), (1, 1))
+        # Deleting the image drops the reference and leaves the file to the sweep.
+        Profile.objects.get(pk=self.profiles[0].pk).image.delete()
+        self.assertEqual(self.references(other), 0)
+        self.assertTrue(blob_storage().exists(other))
+
+    def test_sweep_deletes_blobs_unreferenced_past_the_grace_period(self, task):
+        kept = self.upload(self.profiles[0], b'kept')
+        dropped = self.upload(self.profiles[1], b'dropped')
+        fresh = blob_storage().save('portfolio.zip', SimpleUploadedFile('portfolio.zip', b'not saved yet'))
+        profile = Profile.objects.get(pk=self.profiles[1].pk)
+        profile.image = None
+        profile.save()
+        StoredBlob.objects.exclude(name=fresh).update(updated_at=timezone.now() - timedelta(hours=2))
+
+        self.assertEqual(sweep_unreferenced_blobs(), 1)
+        self.assertEqual(set(StoredBlob.objects.values_list('name', flat=True)), {kept, fresh})
+        self.assertFalse(blob_storage().exists(dropped))
+        self.assertTrue(blob_storage().exists(kept))
+
+    def test_dedupe_media_moves_existing_files_into_blobs(self, task):
+        names = [default_storage.save('profile_images/legacy.png', SimpleUploadedFile('legacy.png', b'legacy')) for _ in self.profiles]
+        for profile, name in zip(self.profiles, names):
+            Profile.objects.filter(pk=profile.pk).update(image=name)
+
+        call_command('dedupe_media', '--delete-originals', stdout=io.StringIO())
+        images = set(Profile.objects.filter(pk__in=[profile.pk for profile in self.profiles]).values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+        blob = images.pop()
+        self.assertTrue(is_blob(blob))
+        self.assertEqual(self.references(blob), 2)
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MatchingTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        matching._index = None
+        self.addCleanup(setattr, matching, '_index', None)
+        client = User.objects.create_user(email='client@example.com', username='client', password='password123', user_type=3)
+        self.client_profile = client.client_profile
+        self.client_user = client
+        self.lagos, self.abuja, self.booked, self.suspended = (
+            self.photographer(name, location, years)
+            for name, location, years in (
+                ('lagos', 'Lagos', 5), ('abuja', 'Abuja', 10), ('booked', 'Lagos Island', 0), ('suspended', 'Lagos Island', 0),
+            )
+        )
+        Photographer.objects.filter(pk=self.suspended.pk).update(is_suspended=True)
+        self.job_post = self.post('Lagos Island', date(2030, 6, 1))
+        Bookings.objects.create(
+            client=client, client_profile=self.client_profile, photographer=self.booked.user,
+            photographer_profile=self.booked, event_date=date(2030, 6, 1), location='Lagos', description='Wedding',
+            status='Accepted',
+        )
+
+    def photographer(self, name, location, years):
+        user = User.objects.create_user(email=f'{name}@example.com', username=name, password='password123', user_type=2)
+        Profile.objects.filter(user=user).update(location=location)
+        if years:
+            WorkHistory.objects.create(photographer=user, start_date=date.today() - timedelta(days=round(years * 365.25)))
+        return user.photographer_profile
+
+    def post(self, location, event_date):
+        return JobPost.objects.create(
+            client=self.client_user, client_profile=self.client_profile, title='Wedding', description='Wedding',
+            location=location, event_date=event_date,
+        )
+
+    def suggested_photographers(self, job_post=None):
+        url = reverse('suggested_photographers', args=[(job_post or self.job_post).pk])
+        self.client.force_authenticate(self.client_user, token=tokens_for_user(self.client_user).access_token)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [(row['id'], row['score']) for row in response.data]
+
+    def test_photographers_are_ranked_and_booked_or_suspended_ones_left_out(self):
+        # Lagos matches one of the two words; Abuja has more experience but no location match.
+        (first, first_score), (second, second_score) = self.suggested_photographers()
+        self.assertEqual((first, second), (self.lagos.pk, self.abuja.pk))
+        self.assertGreater(first_score, second_score)
+        response = self.client.get(reverse('suggested_photographers', args=[self.job_post.pk]), {'limit': -1})
+        self.assertEqual([row['id'] for row in response.data], [self.lagos.pk])
+
+        other = User.objects.create_user(email='other@example.com', username='other', password='password123', user_type=3)
+        self.client.force_authenticate(other, token=tokens_for_user(other).access_token)
+        self.assertEqual(self.client.get(reverse('suggested_photographers', args=[self.job_post.pk])).status_code, 403)
+
+    def test_changes_are_picked_up_from_the_dirty_log_without_a_rebuild(self):
+        self.suggested_photographers()
+        built_at = matching.get_index().built_at
+
+        profile = Profile.objects.get(user=self.abuja.user)
+        profile.location = 'Lagos Island'
+        with mock.patch('myaccounts.signals.generate_profile_renditions'), self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertEqual([pk for pk, _ in self.suggested_photographers()], [self.abuja.pk, self.lagos.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            job_post = self.post('Abuja', date(2030, 6, 2))
+        self.assertEqual(matching.suggest_job_posts(self.abuja.pk)[0][0], self.job_post.pk)
+        self.assertIn(job_post.pk, [pk for pk, _ in matching.suggest_job_posts(self.abuja.pk)])
+        self.assertEqual(matching.get_index().built_at, built_at)
+
+    def test_job_posts_are_suggested_to_photographers(self):
+        nearby = self.post('Lagos', date(2030, 7, 1))
+        applied = self.post('Lagos', date(2030, 7, 2))
+        self.post('Lagos', date.today() - timedelta(days=1))
+        JobApplication.objects.create(job_post=applied, photographer=self.lagos, client=self.client_profile, message='Hi')
+
+        self.client.force_authenticate(self.lagos.user, token=tokens_for_user(self.lagos.user).access_token)
+        response = self.client.get(reverse('suggested_job_posts'))
+        self.assertEqual([row['id'] for row in response.data], [nearby.pk, self.job_post.pk])
+        # The booked photographer is busy on the first job's date.
+        self.assertNotIn(self.job_post.pk, [pk for pk, _ in matching.suggest_job_posts(self.booked.pk)])
+
+        self.client.force_authenticate(self.client_user, token=tokens_for_user(self.client_user).access_token)
+        self.assertEqual(self.client.get(reverse('suggested_job_posts')).status_code, 403)
+
+    def test_a_job_post_is_scored_against_100k_photographers_in_milliseconds(self):
+        rows = 100_000
+        rng = np.random.default_rng(0)
+        index = matching.MatchIndex()
+        index.photographers = matching.PhotographerRows()
+        index.photographers.update(list(range(1, rows + 1)), {
+            'active': rng.random(rows) > 0.05,
+            'location': rng.integers(0, 500, (rows, matching.LOCATION_TERMS)),
+            'experience': rng.random(rows),
+            'acceptance': rng.random(rows),
+        })
+        index.photographers.calendars[2030] = rng.integers(0, 256, (rows, 46), dtype=np.uint8)
+        job_post = JobPost(location='Lagos Island', event_date=date(2030, 6, 1))
+
+        timings = []
+        for _ in range(5):
+            started = time.perf_counter()
+            matches = index.suggest_photographers(job_post, 20)
+            timings.append(time.perf_counter() - started)
+        self.assertEqual(len(matches), 20)
+        self.assertEqual([score for _, score in matches], sorted((score for _, score in matches), reverse=True))
+        self.assertLess(min(timings), 0.05)
@@ -0,0 +1,117 @@
+"""Resumable, chunked uploads of photographer portfolios.
+
+A portfolio can be hundreds of megabytes, too much for one request over a
+flaky connection. Clients upload it instead as a PortfolioUpload:
+
+1. POST portfolio-uploads/ with the filename, the size and optionally the
+   SHA-256 of the whole file. The response carries the upload id.
+2. PATCH portfolio-uploads/<id>/ once per chunk, as the multipart file
+   field ``chunk``, with the Upload-Offset header set to the byte offset of
+   the chunk and Upload-Checksum to its SHA-256. ChunkUploadHandler writes
+   the chunk straight into the upload's part file while Django parses the
+   request, so nothing is buffered in memory or spooled to a temporary
+   file. The offset moves only when the checksum matches, so a chunk cut
+   off or corrupted on the way is simply sent again.
+3. After a dropped connection, GET portfolio-uploads/<id>/ returns the
+   offset to resume from.
+4. POST portfolio-uploads/<id>/finalize/ once every byte arrived, which
+   moves the part file into Photographer.portfolio.
+
+Part files live on local disk under PORTFOLIO_UPLOAD_DIR (by default
+MEDIA_ROOT/portfolio_uploads), since chunks are written at an offset.
+Uploads left unfinished for PORTFOLIO_UPLOAD_TTL are deleted by the
+purge_abandoned_portfolio_uploads task.
+"""
+import hashlib
+import os
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+
+MAX_SIZE = getattr(settings, 'PORTFOLIO_MAX_SIZE', 2 * 1024 ** 3)
+MAX_CHUNK_SIZE = getattr(settings, 'PORTFOLIO_MAX_CHUNK_SIZE', 16 * 1024 ** 2)
+UPLOAD_TTL = getattr(settings, 'PORTFOLIO_UPLOAD_TTL', timedelta(hours=24))
+# How long one PATCH may hold an upload before another may write to it.
+LOCK_TIMEOUT = 10 * 60
+
+WrittenChunk = namedtuple('WrittenChunk', ['size', 'sha256'])
+
+
+def upload_dir():
+    return getattr(settings, 'PORTFOLIO_UPLOAD_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'portfolio_uploads')
+
+
+def part_path(upload_id):
+    return os.path.join(upload_dir(), f'{upload_id}.part')
+
+
+def create_part_file(upload_id):
+    os.makedirs(upload_dir(), exist_ok=True)
+    open(part_path(upload_id), 'wb').close()
+
+
+def delete_part_file(upload_id):
+    try:
+        os.remove(part_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkUploadHandler(FileUploadHandler):
+    """Write the ``chunk`` file of a multipart request into a part file at `offset`.
+
+    At most `limit` bytes are accepted; a longer chunk stops the upload
+    and sets too_large. After parsing, `chunk` holds the WrittenChunk with
+    the size and SHA-256 of what was written, or None.
+    """
+    chunk_size = 256 * 1024
+
+    def __init__(self, path, offset, limit, request=None):
+        super().__init__(request)
+        self.path = path
+        self.offset = offset
+        self.limit = limit
+        self.file = None
+        self.chunk = None
+        self.too_large = False
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name != 'chunk' or self.chunk is not None or self.file is not None:
+            raise SkipFile()
+        self.file = open(self.path, 'r+b')
+        self.file.seek(self.offset)
+        self.digest = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.limit:
+            self.too_large = True
+            self.upload_interrupted()
+            raise StopUpload(connection_reset=True)
+        self.file.write(raw_data)
+        self.digest.update(raw_data)
+
+    def file_complete(self, file_size):
+        if self.file is None:
+            return None
+        self.file.close()
+        self.file = None
+        self.chunk = WrittenChunk(file_size, self.digest.hexdigest())
+        return self.chunk
+
+    def upload_interrupted(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
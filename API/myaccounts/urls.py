@@ -3,15 +3,21 @@ from .views import (
     signup, 
     login_user,  
     logout_user,
+    token_blacklist_metrics,
     get_all_users,
     all_job_posts,
+    search_job_posts,
+    suggested_photographers,
+    suggested_job_posts,
     get_all_photographers,
+    available_photographers,
     get_all_clients,
     get_all_staff,
     staff_detail,
     photographer_detail,
     client_detail,  
     booking_list,
+    bulk_create_bookings,
     booking_detail,
     booking_history_list,
     booking_history_detail,
@@ -22,10 +28,19 @@ from .views import (
     work_history_list,
     work_history_detail,
     notification_list,
+    notification_unread_count,
+    mark_notifications_read,
     profile_list, 
     profile_detail,
+    profile_image_rendition,
+    portfolio_upload_list,
+    portfolio_upload_detail,
+    finalize_portfolio_upload,
     profile_switch,
-    confirm_switch_profile
+    confirm_switch_profile,
+    export_bookings,
+    export_job_posts,
+    export_booking_history,
 )
 
 from rest_framework_simplejwt.views import (
@@ -33,6 +48,8 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
     TokenVerifyView
 )
+from . import async_views
+from .serializers import FilteredTokenRefreshSerializer, RoleTokenObtainPairSerializer
 
 urlpatterns = [
     # Authentication endpoints
@@ -41,8 +58,9 @@ urlpatterns = [
     path('logout/', logout_user, name='logout'),
     
     # JWT token authentication endpoints
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/', TokenObtainPairView.as_view(serializer_class=RoleTokenObtainPairSerializer), name='token_obtain_pair'),
+    path('api/token/refresh/', TokenRefreshView.as_view(serializer_class=FilteredTokenRefreshSerializer), name='token_refresh'),
+    path('api/token/blacklist/metrics/', token_blacklist_metrics, name='token_blacklist_metrics'),
     path('api/verify/', TokenVerifyView.as_view(), name="token_verify"),
 
      # User-related endpoints
@@ -53,12 +71,16 @@ urlpatterns = [
 
     # get specific User-related endpoints
     path('photographers/', get_all_photographers, name='get_all_photographers'),
+    path('photographers/available/', available_photographers, name='available_photographers'),
     path('clients/', get_all_clients, name='get_all_clients'),
     path('staff/', get_all_staff, name='get_all_staff'),
      path('job-posts/', all_job_posts, name='all_job_posts'),
+    path('job-posts/search/', search_job_posts, name='search_job_posts'),
+    path('job-posts/suggested/', suggested_job_posts, name='suggested_job_posts'),
 
     # Booking-related endpoints
     path('bookings/', booking_list, name='booking_list'),
+    path('bookings/bulk/', bulk_create_bookings, name='bulk_create_bookings'),
     path('bookings/<int:id>/', booking_detail, name='booking_detail'),
 
     # Booking history endpoints
@@ -67,10 +89,18 @@ urlpatterns = [
 
     # Notification endpoints
     path('notifications/', notification_list, name='notification-list'),
+    path('notifications/unread-count/', notification_unread_count, name='notification_unread_count'),
+    path('notifications/mark-read/', mark_notifications_read, name='mark_notifications_read'),
 
     # profiles endpoints
     path('profiles/', profile_list, name='profile-list'),
     path('profiles/<int:id>/', profile_detail, name='profile_detail'),
+    path('media/<path:name>', profile_image_rendition, name='profile_image_rendition'),
+
+    # Resumable portfolio uploads
+    path('portfolio-uploads/', portfolio_upload_list, name='portfolio_upload_list'),
+    path('portfolio-uploads/<uuid:id>/', portfolio_upload_detail, name='portfolio_upload_detail'),
+    path('portfolio-uploads/<uuid:id>/finalize/', finalize_portfolio_upload, name='finalize_portfolio_upload'),
 
     # profileswitch endpoints
     path('profile-switch/', profile_switch, name='profile-switch'),
@@ -81,6 +111,7 @@ urlpatterns = [
     # Job Post endpoints
     path('job-post/', job_post_list, name='job_post_list'),
     path('job-post/<int:id>/', job_post_detail, name='job_post_detail'),
+    path('job-post/<int:id>/suggested-photographers/', suggested_photographers, name='suggested_photographers'),
 
     # Job Application endpoints
     path('job-application/', apply_for_job, name='job_apply_list'),
@@ -89,4 +120,16 @@ urlpatterns = [
     # Work history endpoints
     path('work-history/', work_history_list, name='work_history_list'),
     path('work-history/<int:id>/', work_history_detail, name='work_history_detail'),
+
+    # Reporting export endpoints
+    path('exports/bookings/', export_bookings, name='export_bookings'),
+    path('exports/job-posts/', export_job_posts, name='export_job_posts'),
+    path('exports/booking-history/', export_booking_history, name='export_booking_history'),
+
+    # Async read endpoints, served natively on the event loop under ASGI
+    path('async/users/photographer/<int:id>/', async_views.photographer_detail, name='async_photographer_detail'),
+    path('async/profiles/<int:id>/', async_views.profile_detail, name='async_profile_detail'),
+    path('async/notifications/', async_views.notification_list, name='async_notification_list'),
+    path('async/job-posts/', async_views.job_post_list, name='async_job_post_list'),
+    path('events/', async_views.event_stream, name='event_stream'),
 ]
@@ -1,15 +1,41 @@
 import jwt
 from datetime import datetime, timedelta
+from asgiref.sync import sync_to_async
 from django.urls import reverse
-from django.core.mail import send_mail
 from django.conf import settings
-from rest_framework.response import Response
-from rest_framework import status
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import OutboundEmail, User
+from . import blacklist
+from .task import send_outbox_emails
+
+# Signed role claims carried by every token we issue, so views can check
+# permissions and assign foreign keys without loading the user's role rows.
+ROLE_CLAIMS = ('user_type', 'photographer_id', 'client_id')
+
+
+def queue_email(to_email, subject, message):
+    """Write an email to the outbox and have it sent once the transaction commits.
+       The row belongs to the caller's transaction, so the email only exists
+       if the change that triggered it was committed.
+    """
+    email = OutboundEmail.objects.create(
+        to_email=to_email,
+        from_email=getattr(settings, 'DEFAULT_FROM_EMAIL', 'from@example.com'),
+        subject=subject,
+        body=message,
+    )
+    transaction.on_commit(send_outbox_emails.delay)
+    return email
 
 
 def send_verification_email(email, selected_profile, token):
-    """Construct the verification URL and send it in the email
-       Uses Django's send_mail() function, include the verification URL in the email body 
+    """Construct the verification URL and queue the email in the outbox
+       The send_outbox_emails task delivers it after the surrounding transaction commits
     """
     verification_url = reverse('confirm_switch_profile', args=[selected_profile, token])
     subject = 'Confirmation for Profile Switch'
@@ -19,18 +45,7 @@ def send_verification_email(email, selected_profile, token):
     If you did not initiate this request, please ignore this email.
     \n\nBest regards,\nPictoria Photography Team'''
 
-
-    try:
-        send_mail(
-            subject,
-            message,
-            'from@example.com',  # Sender's email address
-            [email],  # Recipient's email address, can be a list for multiple recipients
-            fail_silently=False,  # Set it to True to suppress errors when sending fails
-            )
-        return Response({'message': 'Email sent successfully'}, status=status.HTTP_200_OK)
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return queue_email(email, subject, message)
 
 
 def generate_verification_token(user, selected_profile):
@@ -48,4 +63,66 @@ def verify_verification_token(token):
     except jwt.ExpiredSignatureError:
         return 'Token expired'
     except jwt.InvalidTokenError:
-        return 'Invalid token' 
\ No newline at end of file
+        return 'Invalid token' 
+
+class FilteredRefreshToken(RefreshToken):
+    """A RefreshToken whose blacklist check goes through the Bloom filter in blacklist.py."""
+
+    def check_blacklist(self):
+        if blacklist.is_blacklisted(self.payload[jwt_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+
+def add_role_claims(token, user):
+    """Add the user's type and Photographer and Client ids to `token`; access tokens inherit them."""
+    photographer_id, client_id = (
+        User.objects.filter(pk=user.pk)
+        .values_list('photographer_profile__id', 'client_profile__id')
+        .first()
+    ) or (None, None)
+    token['user_type'] = user.user_type
+    token['photographer_id'] = photographer_id
+    token['client_id'] = client_id
+    return token
+
+
+def tokens_for_user(user):
+    """RefreshToken.for_user with the role claims added."""
+    return add_role_claims(RefreshToken.for_user(user), user)
+
+
+def rotate_tokens(user):
+    """Blacklist the user's live refresh tokens and issue a new pair carrying the current role claims."""
+    outstanding = list(OutstandingToken.objects.filter(
+        user=user,
+        expires_at__gt=timezone.now(),
+        blacklistedtoken__isnull=True,
+    ))
+    BlacklistedToken.objects.bulk_create(
+        [BlacklistedToken(token=token) for token in outstanding],
+        ignore_conflicts=True,
+    )
+    blacklist.add(token.jti for token in outstanding)
+    return tokens_for_user(user)
+
+
+def role_claims(request):
+    """(user_type, photographer id, client id) of the request's user, read from its access token.
+
+    Tokens issued before the role claims existed, and forced authentication
+    in tests, fall back to the user and one query for the ids.
+    """
+    token = request.auth
+    if token is not None and all(claim in token for claim in ROLE_CLAIMS):
+        return tuple(token[claim] for claim in ROLE_CLAIMS)
+    token = add_role_claims({}, request.user)
+    return tuple(token[claim] for claim in ROLE_CLAIMS)
+
+
+async def arole_claims(request):
+    """role_claims for the async views, which keep the validated token on request.auth."""
+    token = request.auth
+    if token is not None and all(claim in token for claim in ROLE_CLAIMS):
+        return tuple(token[claim] for claim in ROLE_CLAIMS)
+    token = await sync_to_async(add_role_claims)({}, request.user)
+    return tuple(token[claim] for claim in ROLE_CLAIMS)
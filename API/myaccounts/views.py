@@ -12,7 +12,9 @@ from .models import (
     WorkHistory,
     Notification,
     Profile,
-    ProfileSwitch
+    ProfileSwitch,
+    PortfolioUpload,
+    BULK_BOOKING_LIMIT
 )
 from .serializers import (
     UserSerializer, 
@@ -20,27 +22,42 @@ from .serializers import (
     ClientSerializer, 
     StaffSerializer,
     BookingSerializer, 
+    BulkBookingItemSerializer,
     BookingHistorySerializer, 
     JobPostSerializer,
     JobApplicationSerializer,
     WorkHistorySerializer,
     NotificationSerializer,
     ProfileSerializer,
-    ProfileSwitchSerializer
+    ProfileSwitchSerializer,
+    PortfolioUploadSerializer,
+    RoleTokenObtainPairSerializer
 )
 from rest_framework import status
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse
+from django.utils.dateparse import parse_date
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.pagination import PageNumberPagination
-from .utils import generate_verification_token, send_verification_email, verify_verification_token 
-from .signals import send_notification_to_photographer, create_booking_timer, create_user_profile
+from . import availability, blacklist, caching, exports, matching, querysets, renditions, search, uploads
+from .pagination import decode_cursor, paginated_response
+from .utils import (
+    generate_verification_token, send_verification_email, verify_verification_token,
+    FilteredRefreshToken, role_claims, rotate_tokens, tokens_for_user
+)
+from .task import notify_photographers_of_bookings
+from .signals import send_notification_to_photographer
 
 
 
 # CustomToken 
 class CustomTokenObtainPairView(TokenObtainPairView):
+    serializer_class = RoleTokenObtainPairSerializer
+
     def post(self, request, *args, **kwargs):
         response = super().post(request, *args, **kwargs)
         if response.status_code == 200:
@@ -65,7 +82,7 @@ def signup(request):
         user = serializer.save(user_type=user_type)
 
         # Generate JWT tokens upon successful registration
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
         return Response({
             'access_token': str(refresh.access_token),
             'refresh_token': str(refresh),
@@ -87,7 +104,7 @@ def login_user(request):
     user = authenticate(request, email=email, password=password)
 
     if user is not None:
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for_user(user)
         return Response({'message': 'Login Successful', 'access_token': str(refresh.access_token)}, status=status.HTTP_200_OK)
     else:
         return Response({'message': 'Invalid email or password'}, status=status.HTTP_401_UNAUTHORIZED)
@@ -98,7 +115,7 @@ def login_user(request):
 def logout_user(request):
     try:
         refresh_token = request.data["refresh_token"]
-        token = RefreshToken(refresh_token)
+        token = FilteredRefreshToken(refresh_token)
         token.blacklist()  # Blacklist or invalidate the token
         return Response({'message': 'Logged out successfully'}, status=status.HTTP_200_OK)
     except Exception as e:
@@ -109,56 +126,161 @@ def logout_user(request):
 # Retrieve all users
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('user')
 def get_all_users(request):
-    users = User.objects.all()
-    serializer = UserSerializer(users, many=True)
-    return Response(serializer.data)
+    users = querysets.users()
+    return paginated_response(request, users, UserSerializer)
 
 # Retrieve all photographers
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])  
+@caching.conditional('photographer', 'user', 'workhistory')
 def get_all_photographers(request):
-    photographers = Photographer.objects.all()
-    serializer = PhotographerSerializer(photographers, many=True)
-    return Response(serializer.data)
+    photographers = querysets.photographers()
+    data = caching.read_through(
+        ['photographer', 'user', 'workhistory'],
+        f'photographers:{request.get_full_path()}',
+        lambda: paginated_response(request, photographers, PhotographerSerializer).data,
+    )
+    return Response(data)
+
+# Photographers free on a date or over a date range
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def available_photographers(request):
+    params = request.query_params
+    try:
+        start = parse_date(params.get('date') or params.get('start') or '')
+        end = parse_date(params.get('date') or params.get('end') or '') or start
+    except ValueError:
+        start = None
+    if start is None or end < start:
+        return Response({'message': 'Pass date, or start and end, as YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    if (end - start).days >= 366:
+        return Response({'message': 'The date range can span at most one year'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = max(1, min(int(params.get('limit', 20)), 100))
+        after_id = decode_cursor(params['cursor']) if 'cursor' in params else 0
+    except ValueError as e:
+        return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    photographer_ids, cursor = availability.free_photographers(start, end, limit, after_id)
+    photographers = querysets.photographers().in_bulk(photographer_ids)
+    serializer = PhotographerSerializer([photographers[pk] for pk in photographer_ids if pk in photographers], many=True)
+    next_url = None
+    if cursor:
+        query = params.copy()
+        query['cursor'] = cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+    return Response({'next': next_url, 'results': serializer.data})
 
 # Retrieve all clients
 @api_view(['GET'])
 @permission_classes([IsAuthenticated]) 
+@caching.conditional('client', 'user', 'bookings', 'bookinghistory')
 def get_all_clients(request):
-    clients = Client.objects.all()
-    serializer = ClientSerializer(clients, many=True)
-    return Response(serializer.data)
+    clients = querysets.clients()
+    return paginated_response(request, clients, ClientSerializer)
 
 # Retrieve all staffs
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])  
+@caching.conditional('staff')
 def get_all_staff(request):
     staff = Staff.objects.all()
-    serializer = StaffSerializer(staff, many=True)
-    return Response(serializer.data)
+    return paginated_response(request, staff, StaffSerializer)
 
 # # Retrieve all job posts
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('jobpost')
 def all_job_posts(request):
     job_posts = JobPost.objects.all()
-    serializer = JobPostSerializer(job_posts, many=True)
-    return Response(serializer.data)
+    return paginated_response(request, job_posts, JobPostSerializer)
+
+
+# Search job posts
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_job_posts(request):
+    query = request.query_params.get('q', '')
+    location = request.query_params.get('location', '')
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+    matches = search.search_job_posts(query, location, limit)
+    job_posts = JobPost.objects.in_bulk([job_post_id for job_post_id, score in matches])
+    results = []
+    for job_post_id, score in matches:
+        if job_post_id in job_posts:
+            results.append(dict(JobPostSerializer(job_posts[job_post_id]).data, score=score))
+    return Response(results)
+
+
+
+# Photographers suggested for a job post, best match first
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def suggested_photographers(request, id):
+    _, _, client_id = role_claims(request)
+    try:
+        job_post = JobPost.objects.get(pk=id)
+    except JobPost.DoesNotExist:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    if client_id is None or job_post.client_profile_id != client_id:
+        return Response({'message': 'Only the client who posted the job can see suggestions'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+    matches = matching.suggest_photographers(job_post, limit)
+    photographers = querysets.photographers().in_bulk([photographer_id for photographer_id, score in matches])
+    results = []
+    for photographer_id, score in matches:
+        if photographer_id in photographers:
+            results.append(dict(PhotographerSerializer(photographers[photographer_id]).data, score=score))
+    return Response(results)
+
+
+# Upcoming job posts suggested for the photographer, best match first
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def suggested_job_posts(request):
+    _, photographer_id, _ = role_claims(request)
+    if photographer_id is None:
+        return Response({'message': 'Only photographers get job suggestions'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        return Response({'message': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+    applied = JobApplication.objects.filter(photographer_id=photographer_id).values_list('job_post_id', flat=True)
+    matches = matching.suggest_job_posts(photographer_id, limit, exclude=set(applied))
+    job_posts = JobPost.objects.in_bulk([job_post_id for job_post_id, score in matches])
+    results = []
+    for job_post_id, score in matches:
+        if job_post_id in job_posts:
+            results.append(dict(JobPostSerializer(job_posts[job_post_id]).data, score=score))
+    return Response(results)
 
 
 # Create Bookings
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('bookings')
 def booking_list(request):
     if request.method == 'GET':
         bookings = Bookings.objects.all()
-        serializer = BookingSerializer(bookings, many=True)
-        return Response(serializer.data)
+        return paginated_response(request, bookings, BookingSerializer)
 
     elif request.method == 'POST':
         user = request.user
-        if user.user_type == 3:
+        user_type, _, _ = role_claims(request)
+        if user_type == 3:
             serializer = BookingSerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save(client=user)
@@ -166,14 +288,71 @@ def booking_list(request):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
  
+# Create many bookings at once
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_create_bookings(request):
+    user = request.user
+    user_type, _, client_id = role_claims(request)
+    if user_type != 3:
+        return Response({'message': 'Only clients can create bookings'}, status=status.HTTP_403_FORBIDDEN)
+
+    items = request.data
+    if not isinstance(items, list) or not items:
+        return Response({'message': 'Send a non-empty list of bookings'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > BULK_BOOKING_LIMIT:
+        return Response({'message': f'At most {BULK_BOOKING_LIMIT} bookings per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if client_id is None:
+        return Response({'message': 'Client profile not found'}, status=status.HTTP_400_BAD_REQUEST)
+
+    photographer_ids = set()
+    for item in items:
+        try:
+            photographer_ids.add(int(item.get('photographer_profile')))
+        except (AttributeError, TypeError, ValueError):
+            pass  # Reported by the item's serializer below.
+    photographers = Photographer.objects.in_bulk(photographer_ids)
+
+    results = []
+    bookings = []
+    for index, item in enumerate(items):
+        serializer = BulkBookingItemSerializer(data=item, context={'photographers': photographers})
+        if serializer.is_valid():
+            photographer = serializer.validated_data['photographer_profile']
+            bookings.append(Bookings(
+                **serializer.validated_data,
+                photographer_id=photographer.user_id,
+                client=user,
+                client_profile_id=client_id,
+            ))
+            results.append({'index': index, 'status': status.HTTP_201_CREATED})
+        else:
+            results.append({'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors})
+
+    if not bookings:
+        return Response({'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+    Bookings.bulk_create_and_notify_photographers(bookings)
+    booking_ids = [booking.pk for booking in bookings]
+    transaction.on_commit(lambda: notify_photographers_of_bookings.delay(booking_ids))
+
+    created = iter(BookingSerializer(bookings, many=True).data)
+    for result in results:
+        if result['status'] == status.HTTP_201_CREATED:
+            result['booking'] = next(created)
+    response_status = status.HTTP_201_CREATED if len(bookings) == len(items) else status.HTTP_207_MULTI_STATUS
+    return Response({'results': results}, status=response_status)
+
+
 # Create Booking history
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('bookinghistory')
 def booking_history_list(request):
     if request.method == 'GET':
         booking_history = BookingHistory.objects.all()
-        serializer = BookingHistorySerializer(booking_history, many=True)
-        return Response(serializer.data)
+        return paginated_response(request, booking_history, BookingHistorySerializer)
 
     elif request.method == 'POST':
         serializer = BookingHistorySerializer(data=request.data)
@@ -186,18 +365,19 @@ def booking_history_list(request):
 # Create Job Post
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('jobpost')
 def job_post_list(request):
     if request.method == 'GET':
         job_posts = JobPost.objects.all()
-        serializer = JobPostSerializer(job_posts, many=True)
-        return Response(serializer.data)
+        return paginated_response(request, job_posts, JobPostSerializer)
 
     elif request.method == 'POST':
         user = request.user
-        if user.user_type == 3:
+        user_type, _, client_id = role_claims(request)
+        if user_type == 3:
             serializer = JobPostSerializer(data=request.data)
             if serializer.is_valid():
-                serializer.save(client=user.client_profile)
+                serializer.save(client=user, client_profile_id=client_id)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -211,13 +391,11 @@ def apply_for_job(request, job_post_id):
     except JobPost.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
     
-    user = request.user
-    if user.user_type == 2:
+    user_type, photographer_id, _ = role_claims(request)
+    if user_type == 2:
         serializer = JobApplicationSerializer(data=request.data)
         if serializer.is_valid():
-            photographer = user.photographer_profile 
-            client = job_post.client  
-            serializer.save(job_post=job_post, photographer=photographer, client=client)
+            serializer.save(job_post=job_post, photographer_id=photographer_id, client_id=job_post.client_profile_id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -225,11 +403,11 @@ def apply_for_job(request, job_post_id):
 # Create work history 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('workhistory')
 def work_history_list(request):
     if request.method == 'GET':
         work_history = WorkHistory.objects.all()
-        serializer = WorkHistorySerializer(work_history, many=True)
-        return Response(serializer.data)
+        return paginated_response(request, work_history, WorkHistorySerializer)
 
     elif request.method == 'POST':
         serializer = WorkHistorySerializer(data=request.data)
@@ -242,9 +420,10 @@ def work_history_list(request):
 #Retrieve, update, Delete Staff by ID
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('user:{id}')
 def staff_detail(request, id):
     try:
-        staff = User.objects.get(pk=id, user_type=1) # user_type 3 is for clients
+        staff = querysets.users().get(pk=id, user_type=1) # user_type 3 is for clients
     except User.DoesNotExist:
         return Response(status.HTTP_404_NOT_FOUND)
 
@@ -266,9 +445,22 @@ def staff_detail(request, id):
 # Retrieve, Update, Delete Photographer by ID
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('user:{id}')
 def photographer_detail(request, id):
+    if request.method == 'GET':
+        fields = UserSerializer.requested_fields(request)
+        try:
+            data = caching.read_through(
+                [f'user:{id}'],
+                caching.fields_key(f'photographer_detail:{id}', fields),
+                lambda: UserSerializer(querysets.users(fields).get(pk=id, user_type=2), fields=fields).data,
+            )
+        except User.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
     try:
-        photographer = User.objects.get(pk=id, user_type=2)  # user_type 2 is for photographers
+        photographer = querysets.users().get(pk=id, user_type=2)  # user_type 2 is for photographers
     except User.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -289,9 +481,10 @@ def photographer_detail(request, id):
 # Retrieve, Update, Delete Client by ID
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('user:{id}')
 def client_detail(request, id):
     try:
-        client = User.objects.get(pk=id, user_type=3)  # user_type 3 is for clients
+        client = querysets.users().get(pk=id, user_type=3)  # user_type 3 is for clients
     except User.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -312,14 +505,15 @@ def client_detail(request, id):
 # Retrieve, Update, Delete Booking by ID
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('bookings:{id}')
 def booking_detail(request, id):
     try:
         booking = Bookings.objects.get(pk=id)
     except Bookings.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    user = request.user
-    if user.user_type == 3:  # Allowing only clients to access this endpoint
+    user_type, _, _ = role_claims(request)
+    if user_type == 3:  # Allowing only clients to access this endpoint
         if request.method == 'GET':
             serializer = BookingSerializer(booking)
             return Response(serializer.data)
@@ -340,6 +534,7 @@ def booking_detail(request, id):
 # Retrieve Booking history by ID
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('bookinghistory:{id}')
 def booking_history_detail(request, id):
     try:
         booking_history = BookingHistory.objects.get(pk=id)
@@ -353,14 +548,27 @@ def booking_history_detail(request, id):
 # Retrieve, Update, Delete Job Post by ID
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('jobpost:{id}')
 def job_post_detail(request, id):
+    user_type, _, _ = role_claims(request)
+    if request.method == 'GET' and user_type == 3:
+        fields = JobPostSerializer.requested_fields(request)
+        try:
+            data = caching.read_through(
+                [f'jobpost:{id}'],
+                caching.fields_key(f'job_post_detail:{id}', fields),
+                lambda: JobPostSerializer(querysets.narrow(JobPost.objects.all(), fields).get(pk=id), fields=fields).data,
+            )
+        except JobPost.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
     try:
         job_post = JobPost.objects.get(pk=id)
     except JobPost.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    user = request.user
-    if user.user_type == 3:  # Allowing only clients to access this endpoint
+    if user_type == 3:  # Allowing only clients to access this endpoint
         if request.method == 'GET':
             serializer = JobPostSerializer(job_post)
             return Response(serializer.data)
@@ -387,8 +595,8 @@ def job_application_detail(request, application_id):
     except JobApplication.DoesNotExist:
         return Response({'message': 'Job application not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    user = request.user
-    if user.user_type == 2:  # Assuming user_type 2 is for photographers
+    user_type, _, _ = role_claims(request)
+    if user_type == 2:  # Assuming user_type 2 is for photographers
         if request.method == 'GET':
             serializer = JobApplicationSerializer(job_application)
             return Response(serializer.data)
@@ -409,6 +617,7 @@ def job_application_detail(request, application_id):
 # Retrieve Work history by ID
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('workhistory:{id}')
 def work_history_detail(request, id):
     try:
         work_history = WorkHistory.objects.get(pk=id)
@@ -422,25 +631,65 @@ def work_history_detail(request, id):
 #Notification
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('notification')
 def notification_list(request):
-    if request.method == 'GET':
-        notifications = Notification.objects.all()
-        serializer = NotificationSerializer(notifications, many=True)
-        return Response(serializer.data)
+    _, photographer_id, _ = role_claims(request)
+    if photographer_id is None:
+        return Response({'message': 'Only photographers have notifications'}, status=status.HTTP_403_FORBIDDEN)
+    # Newest first, one keyset page at a time.
+    notifications = Notification.objects.filter(photographer_id=photographer_id)
+    return paginated_response(request, notifications, NotificationSerializer)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def notification_unread_count(request):
+    _, photographer_id, _ = role_claims(request)
+    if photographer_id is None:
+        return Response({'message': 'Only photographers have notifications'}, status=status.HTTP_403_FORBIDDEN)
+    unread = Photographer.objects.filter(pk=photographer_id).values_list('unread_notifications', flat=True).first()
+    return Response({'unread': unread or 0})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_notifications_read(request):
+    _, photographer_id, _ = role_claims(request)
+    if photographer_id is None:
+        return Response({'message': 'Only photographers have notifications'}, status=status.HTTP_403_FORBIDDEN)
+    ids = request.data.get('ids') if isinstance(request.data, dict) else None
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return Response({'message': 'ids must be a list of notification ids'}, status=status.HTTP_400_BAD_REQUEST)
+    marked = Notification.mark_read(photographer_id, ids)
+    return Response({'marked': marked})
 
 
 #Profile
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('profile')
 def profile_list(request):
     if request.method == 'GET':
         profiles = Profile.objects.all()
-        serializer = ProfileSerializer(profiles, many=True)
-        return Response(serializer.data)
+        return paginated_response(request, profiles, ProfileSerializer)
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@caching.conditional('profile:{id}')
 def profile_detail(request, id):
+    if request.method == 'GET':
+        fields = ProfileSerializer.requested_fields(request)
+        try:
+            data = caching.read_through(
+                [f'profile:{id}'],
+                caching.fields_key(f'profile_detail:{id}', fields),
+                lambda: ProfileSerializer(querysets.narrow(Profile.objects.all(), fields).get(pk=id), fields=fields).data,
+            )
+        except Profile.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
     try:
         profile = Profile.objects.get(pk=id)
     except Profile.DoesNotExist:
@@ -460,6 +709,22 @@ def profile_detail(request, id):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+# Profile image renditions. File names embed a digest of their content, so
+# they can be cached for good; <img> tags send no token, so this is public.
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def profile_image_rendition(request, name):
+    content_type = renditions.content_type(name)
+    if content_type is None or not name.startswith(f'{renditions.DIRECTORY}/') or '..' in name.split('/'):
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    try:
+        response = FileResponse(default_storage.open(name), content_type=content_type)
+    except FileNotFoundError:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    response['Cache-Control'] = f'public, max-age={renditions.CACHE_MAX_AGE}, immutable'
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def profile_switch(request):
@@ -468,16 +733,17 @@ def profile_switch(request):
         user = request.user
 
         try:
-            """ Generate verification token and send email using the user's email """
-            verification_token = generate_verification_token(user, selected_profile)
-            send_verification_email(user.email, selected_profile, verification_token)
-
-            """ Update the ProfileSwitch model to indicate the verification email has been sent 
-                Store the verification token in ProfileSwitch model for future confirmation
-            """
-            profile_switch, created = ProfileSwitch.objects.get_or_create(user=user)
-            profile_switch.email_validation_token = verification_token
-            profile_switch.save()
+            with transaction.atomic():
+                """ Store the verification token in ProfileSwitch model for future confirmation
+                    and queue the verification email to the user's email in the same transaction,
+                    so the email is only sent if the token was saved
+                """
+                verification_token = generate_verification_token(user, selected_profile)
+                profile_switch, created = ProfileSwitch.objects.get_or_create(user=user)
+                profile_switch.email_validation_token = verification_token
+                profile_switch.save()
+
+                send_verification_email(user.email, selected_profile, verification_token)
 
             return Response({'message': 'Verification email sent'}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -502,20 +768,188 @@ def confirm_switch_profile(request, selected_profile, token):
     if verification_token == profile_switch.email_validation_token:
         
         """ Perform the profile switch once the token is validated """
-        try:
-            profile = user.profile
-            if selected_profile == 'client' or selected_profile == 'photographer':
-                profile.profile_type = selected_profile
-            else:
-                return Response({'message': 'Invalid profile selection'}, status=status.HTTP_400_BAD_REQUEST)
+        user_type = {'photographer': 2, 'client': 3}.get(selected_profile)
+        if user_type is None:
+            return Response({'message': 'Invalid profile selection'}, status=status.HTTP_400_BAD_REQUEST)
 
-
-            profile_switch.is_verified = True
-            profile_switch.save()
-
-            profile.save()
-            return Response({'message': 'Profile switched successfully'}, status=status.HTTP_200_OK)
+        try:
+            with transaction.atomic():
+                profile = user.profile
+                profile.profile_type = user_type
+                profile.save()
+
+                role_model = Photographer if user_type == 2 else Client
+                role_model.objects.get_or_create(user=user, defaults={'profile': profile})
+                user.user_type = user_type
+                user.save(update_fields=['user_type'])
+
+                profile_switch.is_verified = True
+                profile_switch.save()
+
+                """ The old tokens carry the old role claims, so replace them """
+                refresh = rotate_tokens(user)
+            return Response({
+                'message': 'Profile switched successfully',
+                'access_token': str(refresh.access_token),
+                'refresh_token': str(refresh),
+            }, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({'error_message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     else:
         return Response({'message': 'Invalid verification token'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# Resumable portfolio uploads; see uploads.py
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def portfolio_upload_list(request):
+    _, photographer_id, _ = role_claims(request)
+    if photographer_id is None:
+        return Response({'message': 'Only photographers can upload a portfolio'}, status=status.HTTP_403_FORBIDDEN)
+    serializer = PortfolioUploadSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    upload = serializer.save(photographer_id=photographer_id)
+    uploads.create_part_file(upload.pk)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def portfolio_upload_detail(request, id):
+    _, photographer_id, _ = role_claims(request)
+    try:
+        upload = PortfolioUpload.objects.get(pk=id, photographer_id=photographer_id)
+    except PortfolioUpload.DoesNotExist:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        return Response(PortfolioUploadSerializer(upload).data)
+    elif request.method == 'DELETE':
+        upload.delete()
+        uploads.delete_part_file(upload.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    if upload.status != 'Uploading':
+        return Response({'message': 'This upload is finalized'}, status=status.HTTP_409_CONFLICT)
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        checksum = request.headers['Upload-Checksum'].lower()
+    except (KeyError, ValueError):
+        return Response({'message': 'Send the Upload-Offset and Upload-Checksum headers'}, status=status.HTTP_400_BAD_REQUEST)
+    if offset != upload.offset:
+        return Response({'message': 'Resume from the current offset', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+
+    # One writer per upload, so two retries of a chunk cannot interleave in the part file.
+    lock = f'portfolio-upload:{upload.pk}:lock'
+    if not cache.add(lock, 1, uploads.LOCK_TIMEOUT):
+        return Response({'message': 'Another chunk of this upload is being written'}, status=status.HTTP_409_CONFLICT)
+    try:
+        handler = uploads.ChunkUploadHandler(
+            uploads.part_path(upload.pk), offset, min(uploads.MAX_CHUNK_SIZE, upload.size - offset), request,
+        )
+        request._request.upload_handlers = [handler]
+        request.data  # Parsing the body writes the chunk.
+        if handler.too_large:
+            return Response({'message': 'The chunk is larger than allowed or than the rest of the file'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if handler.chunk is None:
+            return Response({'message': 'Send the chunk as the "chunk" file field'}, status=status.HTTP_400_BAD_REQUEST)
+        if handler.chunk.sha256 != checksum:
+            return Response({'message': 'Checksum mismatch; send the chunk again', 'offset': offset},
+                            status=status.HTTP_400_BAD_REQUEST)
+        upload.offset = offset + handler.chunk.size
+        upload.save(update_fields=['offset', 'updated_at'])
+    finally:
+        cache.delete(lock)
+    return Response({'offset': upload.offset, 'size': upload.size})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finalize_portfolio_upload(request, id):
+    _, photographer_id, _ = role_claims(request)
+    try:
+        upload = PortfolioUpload.objects.get(pk=id, photographer_id=photographer_id, status='Uploading')
+    except PortfolioUpload.DoesNotExist:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    if upload.offset != upload.size:
+        return Response({'message': 'The upload is incomplete', 'offset': upload.offset}, status=status.HTTP_409_CONFLICT)
+
+    path = uploads.part_path(upload.pk)
+    if upload.sha256 and uploads.file_sha256(path) != upload.sha256:
+        return Response({'message': 'The file does not match its SHA-256'}, status=status.HTTP_400_BAD_REQUEST)
+
+    photographer = Photographer.objects.get(pk=photographer_id)
+    with open(path, 'rb') as f:
+        photographer.portfolio.save(upload.filename, File(f), save=False)
+    with transaction.atomic():
+        photographer.save(update_fields=['portfolio'])
+        upload.status = 'Complete'
+        upload.save(update_fields=['status', 'updated_at'])
+    uploads.delete_part_file(upload.pk)
+    return Response({'portfolio': photographer.portfolio.url})
+
+
+# Token blacklist size and filter accuracy
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def token_blacklist_metrics(request):
+    user_type, _, _ = role_claims(request)
+    if user_type != 1:  # Allowing only staff to read metrics
+        return Response({'message': 'Only staff can read token metrics'}, status=status.HTTP_403_FORBIDDEN)
+    return Response(blacklist.metrics())
+
+
+# Reporting exports
+def export_report(request, queryset, fields, date_field, status_field, filename):
+    """Filter `queryset` by the date range (and status, when it has one) in the query string and stream it."""
+    user_type, _, _ = role_claims(request)
+    if user_type != 1:  # Allowing only staff to export reports
+        return Response({'message': 'Only staff can export reports'}, status=status.HTTP_403_FORBIDDEN)
+
+    fmt = request.query_params.get('fmt', 'ndjson')
+    if fmt not in exports.FORMATS:
+        return Response({'message': f'fmt must be one of {", ".join(exports.FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    for param, lookup in (('start', 'gte'), ('end', 'lte')):
+        value = request.query_params.get(param)
+        if value is None:
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            return Response({'message': f'{param} must be a YYYY-MM-DD date'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = queryset.filter(**{f'{date_field}__{lookup}': day})
+
+    booking_status = request.query_params.get('status')
+    if booking_status and status_field:
+        queryset = queryset.filter(**{status_field: booking_status})
+
+    return exports.streaming_export(queryset, fields, fmt, filename)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_bookings(request):
+    fields = [
+        'id', 'client_id', 'photographer_id', 'client_profile_id', 'photographer_profile_id',
+        'event_date', 'location', 'status', 'is_confirmed', 'reason_for_denial', 'created_at',
+    ]
+    return export_report(request, Bookings.objects.all(), fields, 'event_date', 'status', 'bookings')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_job_posts(request):
+    fields = ['id', 'client_id', 'client_profile_id', 'title', 'location', 'event_date', 'created_at']
+    return export_report(request, JobPost.objects.all(), fields, 'event_date', None, 'job_posts')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_booking_history(request):
+    fields = ['id', 'client_id', 'booking_id', 'booking__status', 'booking__event_date', 'created_at', 'updated_at']
+    return export_report(request, BookingHistory.objects.all(), fields, 'created_at__date', 'booking__status', 'booking_history')